@@ -0,0 +1,98 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Benchmark :func:`wrapitup.catch_signals`. See run.py for how to run them."""
+
+import contextlib
+import logging
+import os
+import signal
+import threading
+import time
+import typing
+
+from wrapitup import catch_signals, requested, sleep
+from wrapitup._catch_signals import _two_pos_args
+
+
+# Keep the INFO message on entry from dominating the measurements.
+logging.getLogger('wrapitup').setLevel(logging.WARNING)
+
+if os.name == 'posix':
+	SIGNALS = (signal.SIGUSR1, signal.SIGUSR2)
+else:
+	SIGNALS = (signal.SIGINT, signal.SIGBREAK)
+
+
+def callback(signum: signal.Signals, stack_frame: object) -> None:
+	pass
+
+
+def bench_construct_default_callback() -> typing.Callable[[], object]:
+	return lambda: catch_signals(SIGNALS)
+
+
+def bench_construct_custom_callback() -> typing.Callable[[], object]:
+	return lambda: catch_signals(SIGNALS, callback)
+
+
+def bench_two_pos_args() -> typing.Callable[[], object]:
+	return lambda: _two_pos_args(callback)
+
+
+def _nested(depth: int) -> typing.Callable[[], object]:
+	catch = catch_signals(SIGNALS)
+
+	def enter_exit() -> None:
+		with contextlib.ExitStack() as stack:
+			for _ in range(depth):
+				stack.enter_context(catch)
+	return enter_exit
+
+
+def bench_enter_exit_depth_1() -> typing.Callable[[], object]:
+	return _nested(1)
+
+
+def bench_enter_exit_depth_4() -> typing.Callable[[], object]:
+	return _nested(4)
+
+
+def bench_enter_exit_depth_16() -> typing.Callable[[], object]:
+	return _nested(16)
+
+
+if hasattr(signal, 'pthread_kill'):  # pragma: no branch
+	def track_signal_to_requested_latency() -> typing.List[float]:
+		"""Time from sending a signal to the main thread seeing requested()."""
+		samples = []
+		main = threading.main_thread().ident
+		catch = catch_signals(SIGNALS, callback)
+		for _ in range(200):
+			# The handlers uninstall themselves after one signal, so reenter.
+			with catch:
+				start = time.perf_counter()
+				signal.pthread_kill(main, SIGNALS[0])
+				while not requested():
+					pass
+				samples.append(time.perf_counter() - start)
+		return samples
+
+	def track_signal_from_thread_to_sleep_wakeup() -> typing.List[float]:
+		"""Time from another thread sending a signal to wrapitup.sleep waking."""
+		samples = []
+		main = threading.main_thread().ident
+		catch = catch_signals(SIGNALS, callback)
+		for _ in range(50):
+			with catch:
+				sent = []
+
+				def send() -> None:
+					time.sleep(0.001)
+					sent.append(time.perf_counter())
+					signal.pthread_kill(main, SIGNALS[0])
+				thread = threading.Thread(target=send)
+				thread.start()
+				sleep(10)
+				samples.append(time.perf_counter() - sent[0])
+				thread.join()
+		return samples
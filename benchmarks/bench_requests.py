@@ -0,0 +1,66 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Benchmark the request API. See run.py for how to run benchmarks."""
+
+import typing
+
+from wrapitup import request, reset, requested, iterate, chunked, Token
+
+
+def bench_requested() -> typing.Callable[[], object]:
+	reset()
+	return requested
+
+
+def bench_request_reset() -> typing.Callable[[], object]:
+	def request_reset() -> None:
+		request()
+		reset()
+	return request_reset
+
+
+_keep_alive = []  # type: typing.List[Token]
+
+
+def _token_at_depth(depth: int) -> Token:
+	token = Token()
+	for _ in range(depth - 1):
+		token = Token(token)
+	return token
+
+
+def bench_token_requested_depth_1() -> typing.Callable[[], object]:
+	return _token_at_depth(1).requested
+
+
+def bench_token_requested_depth_100() -> typing.Callable[[], object]:
+	return _token_at_depth(100).requested
+
+
+def bench_token_request_reset_100_children() -> typing.Callable[[], object]:
+	parent = Token()
+	# Parents hold their children weakly.
+	_keep_alive.extend(Token(parent) for _ in range(100))
+
+	def request_reset() -> None:
+		parent.request()
+		parent.reset()
+	return request_reset
+
+
+def bench_iterate_1000_items() -> typing.Callable[[], object]:
+	data = range(1000)
+
+	def consume() -> None:
+		for _ in iterate(data, check_every=100):
+			pass
+	return consume
+
+
+def bench_chunked_1000_items() -> typing.Callable[[], object]:
+	data = list(range(1000))
+
+	def consume() -> None:
+		for _ in chunked(data, initial_size=100):
+			pass
+	return consume
@@ -0,0 +1,59 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Benchmark :class:`wrapitup.Timer`. See run.py for how to run benchmarks."""
+
+import typing
+
+from wrapitup import Timer, TimerArray
+
+
+def bench_construct() -> typing.Callable[[], object]:
+	return Timer
+
+
+def bench_remaining() -> typing.Callable[[], object]:
+	return Timer().remaining
+
+
+def bench_expired() -> typing.Callable[[], object]:
+	return Timer().expired
+
+
+def bench_expired_poll_every_10() -> typing.Callable[[], object]:
+	return Timer(poll_every=10).expired
+
+
+def bench_expired_poll_every_100() -> typing.Callable[[], object]:
+	return Timer(poll_every=100).expired
+
+
+def bench_expired_poll_every_1000() -> typing.Callable[[], object]:
+	return Timer(poll_every=1000).expired
+
+
+def bench_start_stop() -> typing.Callable[[], object]:
+	timer = Timer()
+
+	def start_stop() -> None:
+		timer.start()
+		timer.stop()
+	return start_stop
+
+
+def bench_stopped_expired() -> typing.Callable[[], object]:
+	timer = Timer()
+	timer.stop()
+	return timer.expired
+
+
+def bench_timer_array_expired_10000() -> typing.Callable[[], object]:
+	return TimerArray([1e9] * 10000).expired
+
+
+def bench_timer_array_remaining_10000() -> typing.Callable[[], object]:
+	return TimerArray([1e9] * 10000).remaining
+
+
+def bench_timers_expired_10000() -> typing.Callable[[], object]:
+	timers = [Timer(1e9) for _ in range(10000)]
+	return lambda: [timer.expired() for timer in timers]
@@ -0,0 +1,150 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Run WrapItUp's benchmarks and compare the results across commits.
+
+With WrapItUp installed (see README.md), run from the root directory of the
+source repository with::
+
+	$ python benchmarks/run.py --output before.json
+	$ git checkout my-branch
+	$ python benchmarks/run.py --output after.json --compare before.json
+
+Each ``benchmarks/bench_*.py`` module defines two kinds of benchmarks:
+
+``bench_*`` functions
+	take no arguments and return a callable that also takes no arguments.
+	The runner calls the callable many times and reports the fastest of several
+	repeats, in nanoseconds per call.
+
+``track_*`` functions
+	take no arguments and measure something themselves, returning a list of
+	durations in seconds. The runner reports their median in nanoseconds.
+
+Results are keyed by ``module.function``. With ``--compare``, the runner
+prints each result's ratio to the earlier run and exits with status 1 if any
+ratio exceeds ``--threshold``.
+"""
+
+import argparse
+import glob
+import importlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def time_callable(
+	func: typing.Callable[[], object],
+	min_time: float,
+	repeat: int,
+) -> float:
+	"""Return the fastest nanoseconds per call of ``func`` in ``repeat`` runs."""
+	number = 1
+	while True:
+		elapsed = _loop(func, number)
+		if elapsed >= min_time / repeat or number >= 10 ** 8:
+			break
+		number *= 10
+	best = elapsed
+	for _ in range(repeat - 1):
+		best = min(best, _loop(func, number))
+	return best / number * 1e9
+
+
+def _loop(func: typing.Callable[[], object], number: int) -> float:
+	start = time.perf_counter()
+	for _ in range(number):
+		func()
+	return time.perf_counter() - start
+
+
+def collect(
+	pattern: typing.Optional[str],
+) -> typing.List[typing.Tuple[str, typing.Callable[[], typing.Any]]]:
+	"""Return ``(name, function)`` for every benchmark matching ``pattern``."""
+	sys.path.insert(0, HERE)
+	found = []
+	for path in sorted(glob.glob(os.path.join(HERE, 'bench_*.py'))):
+		module_name = os.path.splitext(os.path.basename(path))[0]
+		module = importlib.import_module(module_name)
+		for attr in sorted(vars(module)):
+			if not attr.startswith(('bench_', 'track_')):
+				continue
+			name = '%s.%s' % (module_name, attr)
+			if pattern is None or pattern in name:
+				found.append((name, getattr(module, attr)))
+	return found
+
+
+def git_commit() -> typing.Optional[str]:
+	"""Return the current commit's hash, or :const:`None` outside of git."""
+	try:
+		out = subprocess.check_output(
+			['git', 'rev-parse', 'HEAD'], cwd=HERE, stderr=subprocess.DEVNULL)
+	except (OSError, subprocess.CalledProcessError):
+		return None
+	return out.decode('ascii').strip()
+
+
+def main(argv: typing.Optional[typing.List[str]] = None) -> int:
+	"""Run the benchmarks and return the process's exit status."""
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument(
+		'-k', dest='pattern', help='run only benchmarks whose names contain this')
+	parser.add_argument('--output', help='write results to this JSON file')
+	parser.add_argument('--compare', help='compare with this JSON results file')
+	parser.add_argument(
+		'--threshold', type=float, default=1.2,
+		help='slowdown ratio that counts as a regression (default: %(default)s)')
+	parser.add_argument(
+		'--min-time', type=float, default=0.5,
+		help='seconds to spend per bench_* benchmark (default: %(default)s)')
+	parser.add_argument(
+		'--repeat', type=int, default=5,
+		help='repeats per bench_* benchmark (default: %(default)s)')
+	args = parser.parse_args(argv)
+
+	baseline = {}  # type: typing.Dict[str, float]
+	if args.compare:
+		with open(args.compare) as file:
+			baseline = json.load(file)['results']
+
+	results = {}  # type: typing.Dict[str, float]
+	regressions = []
+	for name, function in collect(args.pattern):
+		if name.split('.')[1].startswith('bench_'):
+			value = time_callable(function(), args.min_time, args.repeat)
+		else:
+			value = statistics.median(function()) * 1e9
+		results[name] = value
+		line = '%-60s %12.1f ns' % (name, value)
+		if name in baseline:
+			ratio = value / baseline[name]
+			line += '  %5.2fx' % ratio
+			if ratio > args.threshold:
+				line += '  REGRESSION'
+				regressions.append(name)
+		print(line, flush=True)
+
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump({
+				'commit': git_commit(),
+				'python': '%s %s' % (
+					platform.python_implementation(), platform.python_version()),
+				'machine': platform.platform(),
+				'results': results,
+			}, file, indent=1, sort_keys=True)
+	return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
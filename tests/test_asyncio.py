@@ -0,0 +1,281 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import asyncio
+import os
+import signal
+import threading
+import unittest
+
+from wrapitup import (
+	request, reset, requested, wait_requested, catch_signals,
+	catch_signals_async, deadline, Timer, Token)
+from wrapitup import _requests
+
+
+class TestWaitRequested(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.loop = asyncio.new_event_loop()
+		self.addCleanup(self.loop.close)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def run_coro(self, coro):
+		return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+	def test_already_requested(self):
+		request()
+		self.run_coro(wait_requested())
+
+	def test_request_from_coroutine(self):
+		async def requester():
+			await asyncio.sleep(0)
+			request()
+		self.loop.call_soon(lambda: self.loop.create_task(requester()))
+		self.run_coro(wait_requested())
+		self.assertTrue(requested())
+
+	def test_request_from_thread(self):
+		self.loop.call_later(0.01, threading.Thread(target=request).start)
+		self.run_coro(wait_requested())
+		self.assertTrue(requested())
+
+	def test_token(self):
+		token = Token()
+		self.loop.call_later(0.01, token.request)
+		self.run_coro(wait_requested(token))
+		self.assertFalse(requested())
+		self.loop.call_later(0.01, request)
+		self.run_coro(wait_requested(Token()))
+
+	def test_cancel(self):
+		async def waiter():
+			task = self.loop.create_task(wait_requested())
+			await asyncio.sleep(0)
+			task.cancel()
+			with self.assertRaises(asyncio.CancelledError):
+				await task
+		self.run_coro(waiter())
+		self.assertEqual(_requests._callbacks, [])
+
+
+class TestDeadline(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.loop = asyncio.new_event_loop()
+		self.addCleanup(self.loop.close)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def run_coro(self, coro):
+		return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+	def test_expires(self):
+		async def main():
+			async with deadline(Timer(0.01)) as scope:
+				await asyncio.sleep(10)
+			return scope
+		scope = self.run_coro(main())
+		self.assertTrue(scope.expired)
+		self.assertEqual(_requests._callbacks, [])
+
+	def test_finishes_in_time(self):
+		async def main():
+			async with deadline(Timer(10)) as scope:
+				await asyncio.sleep(0)
+			# The scope's loop timer no longer fires.
+			await asyncio.sleep(0.02)
+			return scope
+		self.assertFalse(self.run_coro(main()).expired)
+		self.assertEqual(_requests._callbacks, [])
+
+	def test_no_polling(self):
+		async def main():
+			async with deadline(Timer(10)):
+				self.assertEqual(len(self.loop._scheduled), 2)  # With wait_for.
+		self.run_coro(main())
+
+	def test_already_expired_without_await(self):
+		async def main():
+			async with deadline(Timer(0)) as scope:
+				pass
+			# No cancellation leaks out of the block.
+			await asyncio.sleep(0)
+			await asyncio.sleep(0.01)
+			return scope
+		self.assertFalse(self.run_coro(main()).expired)
+
+	def test_request(self):
+		async def main():
+			async with deadline(Timer()) as scope:
+				self.loop.call_later(0.01, request)
+				await asyncio.sleep(10)
+			self.assertTrue(requested())
+			return scope
+		self.assertTrue(self.run_coro(main()).expired)
+
+	def test_request_from_thread(self):
+		async def main():
+			async with deadline(Timer()) as scope:
+				threading.Timer(0.01, request).start()
+				await asyncio.sleep(10)
+			return scope
+		self.assertTrue(self.run_coro(main()).expired)
+
+	def test_already_requested(self):
+		request()
+
+		async def main():
+			async with deadline(Timer()) as scope:
+				await asyncio.sleep(10)
+			return scope
+		self.assertTrue(self.run_coro(main()).expired)
+
+	def test_token(self):
+		token = Token()
+
+		async def main():
+			async with deadline(Timer(token=token)) as scope:
+				self.loop.call_later(0.01, token.request)
+				await asyncio.sleep(10)
+			return scope
+		self.assertTrue(self.run_coro(main()).expired)
+		self.assertEqual(token._callbacks, [])
+
+	def test_not_listening(self):
+		async def main():
+			async with deadline(Timer(0.05, listen=False)) as scope:
+				self.loop.call_soon(request)
+				await asyncio.sleep(0.01)
+			self.assertFalse(scope.expired)
+			async with scope:
+				await asyncio.sleep(10)
+			return scope
+		self.assertTrue(self.run_coro(main()).expired)
+
+	def test_other_cancellation_propagates(self):
+		async def main():
+			async with deadline(Timer(10)):
+				await asyncio.sleep(10)
+
+		async def canceller():
+			task = asyncio.ensure_future(main())
+			await asyncio.sleep(0.01)
+			task.cancel()
+			await task
+		self.assertRaises(
+			asyncio.CancelledError, self.run_coro, canceller())
+
+	def test_outside_task(self):
+		asyncio.set_event_loop(self.loop)
+		self.addCleanup(asyncio.set_event_loop, None)
+		coro = deadline(Timer()).__aenter__()
+		self.assertRaisesRegex(RuntimeError, 'inside a task', coro.send, None)
+
+
+@unittest.skipIf(os.name != 'posix', 'Requires loop.add_signal_handler')
+class TestCatchSignalsAsync(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.loop = asyncio.new_event_loop()
+		self.addCleanup(self.loop.close)
+		self.handler_called = False
+		signal.signal(signal.SIGUSR1, self.handler)
+		self.addCleanup(signal.signal, signal.SIGUSR1, signal.SIG_DFL)
+		self.addCleanup(signal.signal, signal.SIGUSR2, signal.SIG_DFL)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def handler(self, signum, stack_frame):
+		self.handler_called = True
+
+	def catch_signals(self, callback=None):
+		return catch_signals_async(
+			signals=(signal.SIGUSR1, signal.SIGUSR2), callback=callback,
+			loop=self.loop)
+
+	def run_coro(self, coro):
+		return self.loop.run_until_complete(asyncio.wait_for(coro, 10))
+
+	async def kill(self, signum):
+		os.kill(os.getpid(), signum)
+		# The loop runs the handler on a later iteration.
+		for _ in range(10):
+			await asyncio.sleep(0.001)
+
+	def test_signal_requests_and_restores(self):
+		callback_args = []
+
+		async def main():
+			async with self.catch_signals(lambda *a: callback_args.append(a)):
+				self.assertNotEqual(signal.getsignal(signal.SIGUSR1), self.handler)
+				await asyncio.gather(wait_requested(), self.kill(signal.SIGUSR2))
+				self.assertTrue(requested())
+				self.assertEqual(signal.getsignal(signal.SIGUSR1), self.handler)
+			self.assertFalse(requested())
+		with self.assertLogs('wrapitup'):
+			self.run_coro(main())
+		self.assertEqual(callback_args, [(signal.SIGUSR2, None)])
+		self.assertEqual(signal.getsignal(signal.SIGUSR1), self.handler)
+		self.assertEqual(signal.getsignal(signal.SIGUSR2), signal.SIG_DFL)
+
+	def test_default_callback(self):
+		async def main():
+			with self.catch_signals():
+				await self.kill(signal.SIGUSR1)
+				self.assertTrue(requested())
+				self.assertFalse(self.handler_called)
+		with self.assertLogs('wrapitup') as logcm:
+			self.run_coro(main())
+		self.assertRegex(logcm.output[1], r'WARNING:wrapitup:Commencing shut down')
+
+	def test_nested(self):
+		async def main():
+			outer, inner = self.catch_signals(), self.catch_signals()
+			with outer:
+				with inner:
+					await self.kill(signal.SIGUSR1)
+					self.assertTrue(requested())
+				self.assertFalse(requested())
+				# The outer scope's loop handler is back in place.
+				await self.kill(signal.SIGUSR1)
+				self.assertTrue(requested())
+				self.assertFalse(self.handler_called)
+			await self.kill(signal.SIGUSR1)
+			self.assertTrue(self.handler_called)
+		with self.assertLogs('wrapitup'):
+			self.run_coro(main())
+
+	def test_nested_in_catch_signals(self):
+		async def main():
+			with self.catch_signals():
+				pass
+			self.assertEqual(signal.getsignal(signal.SIGUSR2), sync_handler)
+		with self.assertLogs('wrapitup'):
+			with catch_signals(signals=[signal.SIGUSR2]):
+				sync_handler = signal.getsignal(signal.SIGUSR2)
+				self.run_coro(main())
+		self.assertEqual(signal.getsignal(signal.SIGUSR2), signal.SIG_DFL)
+
+	def test_not_main_thread(self):
+		errors = []
+
+		def subthread():
+			try:
+				with self.catch_signals():
+					pass  # pragma: no cover
+			except (RuntimeError, ValueError) as e:
+				errors.append(e)
+		thread = threading.Thread(target=subthread)
+		thread.start()
+		thread.join()
+		self.assertEqual(len(errors), 1)
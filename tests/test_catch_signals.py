@@ -2,10 +2,12 @@
 
 import os
 import signal
-from threading import Event, Thread
+import sys
+from threading import current_thread, main_thread, Event, Thread
 import time
 import types
 import unittest
+from unittest import mock
 
 from wrapitup import request, reset, requested, catch_signals
 
@@ -375,3 +377,141 @@ class TestCatchSignals(unittest.TestCase):
 			r'WARNING:wrapitup:Commencing shut down. \(Signal [A-Z1-9]{6,7},'
 			r' process \d+.\). Press Ctrl\+C again to exit immediately.'
 		))
+
+	def test_nested_scopes_make_no_system_calls(self):
+		outer, inner = self.catch_signals(), self.catch_signals()
+		with self.assertLogs('wrapitup'), outer:
+			with mock.patch('signal.signal', wraps=signal.signal) as signal_mock:
+				for _ in range(3):
+					with inner, outer:
+						pass
+			signal_mock.assert_not_called()
+		self.assertEqual(signal.getsignal(SIG1), self.handler)
+		self.assertEqual(signal.getsignal(SIG2), signal.SIG_DFL)
+
+	def test_outer_scope_restored_after_inner_block_replaces_handler(self):
+		calls = []
+		outer = catch_signals(
+			signals=(SIG1, SIG2), callback=lambda *a: calls.append('outer'))
+		inner = catch_signals(
+			signals=(SIG1,), callback=lambda *a: calls.append('inner'))
+		with self.assertLogs('wrapitup'), outer:
+			with inner:
+				signal.signal(SIG1, signal.SIG_IGN)
+			self.suicide(KILL1)
+			self.assertEqual(calls, ['outer'])
+		self.assertEqual(signal.getsignal(SIG1), self.handler)
+
+	def test_inner_scope_handles_signal_first(self):
+		calls = []
+		outer = catch_signals(
+			signals=(SIG1, SIG2), callback=lambda *a: calls.append('outer'))
+		inner = catch_signals(
+			signals=(SIG1,), callback=lambda *a: calls.append('inner'))
+		with self.assertLogs('wrapitup'), outer:
+			with inner:
+				self.suicide(KILL1)
+				self.assertEqual(calls, ['inner'])
+				self.suicide(KILL1)
+				self.assertEqual(calls, ['inner', 'outer'])
+				self.assertFalse(self.handler_called)
+				self.suicide(KILL1)
+				self.assertTrue(self.handler_called)
+		self.assertEqual(signal.getsignal(SIG1), self.handler)
+
+	def test_outer_scope_exits_first(self):
+		calls = []
+		outer = catch_signals(
+			signals=(SIG1, SIG2), callback=lambda *a: calls.append('outer'))
+		inner = catch_signals(
+			signals=(SIG1,), callback=lambda *a: calls.append('inner'))
+		with self.assertLogs('wrapitup'), outer:
+			with inner:
+				# Catching SIG2 uninstalls the outer scope's SIG1 handler, too.
+				self.suicide(KILL2)
+				self.assertEqual(calls, ['outer'])
+				self.suicide(KILL1)
+				self.assertEqual(calls, ['outer', 'inner'])
+				self.assertFalse(self.handler_called)
+				self.suicide(KILL1)
+				self.assertTrue(self.handler_called)
+		self.assertEqual(signal.getsignal(SIG1), self.handler)
+		self.assertEqual(signal.getsignal(SIG2), signal.SIG_DFL)
+
+	def test_dispatch_thread(self):
+		called = Event()
+		calls = []
+
+		def callback(signum, stack_frame):
+			calls.append((signum, current_thread()))
+			called.set()
+		catcher = catch_signals(
+			signals=(SIG1, SIG2), callback=callback, dispatch_thread=True)
+		with self.assertLogs('wrapitup'):
+			with catcher:
+				self.suicide(KILL1)
+				self.assertTrue(requested())
+				self.assertEqual(signal.getsignal(SIG1), self.handler)
+				self.assertTrue(called.wait(10))
+		(signum, thread), = calls
+		self.assertEqual(signum, SIG1)
+		self.assertIsNot(thread, main_thread())
+		self.assertEqual(thread.name, 'wrapitup.catch_signals')
+
+	def test_dispatch_thread_default_callback(self):
+		with self.assertLogs('wrapitup') as logcm:
+			with catch_signals(signals=(SIG1, SIG2), dispatch_thread=True):
+				self.suicide(KILL2)
+			# Exiting the block waited for the callback.
+			self.assert_logging(logcm.output)
+
+	def test_dispatch_thread_callback_error(self):
+		def callback(signum, stack_frame):
+			raise KeyError(signum)
+		catcher = catch_signals(
+			signals=(SIG1, SIG2), callback=callback, dispatch_thread=True)
+		with self.assertLogs('wrapitup') as logcm:
+			with catcher:
+				self.suicide(KILL1)
+				self.assertTrue(requested())
+		self.assertRegex(logcm.output[-1], r'ERROR:wrapitup:Signal callback')
+		self.assertIn('KeyError', logcm.output[-1])
+
+	def test_dispatch_thread_callback_exit(self):
+		def callback(signum, stack_frame):
+			sys.exit(3)
+		catcher = catch_signals(
+			signals=(SIG1, SIG2), callback=callback, dispatch_thread=True)
+		with self.assertLogs('wrapitup'):
+			with self.assertRaises(SystemExit) as cm:
+				with catcher:
+					self.suicide(KILL1)
+		self.assertEqual(cm.exception.code, 3)
+		self.assertFalse(requested())
+		# The dispatcher survived to run the next block's callbacks.
+		with self.assertLogs('wrapitup') as logcm:
+			with catch_signals(signals=(SIG1, SIG2), dispatch_thread=True):
+				self.suicide(KILL2)
+		self.assert_logging(logcm.output)
+
+	def test_dispatch_thread_callback_exit_stays_in_block(self):
+		exited, flushed = Event(), Event()
+
+		def callback(signum, stack_frame):
+			exited.set()
+			sys.exit(3)
+		catcher = catch_signals(
+			signals=(SIG1, SIG2), callback=callback, dispatch_thread=True)
+		other = catch_signals(signals=(SIG2,), dispatch_thread=True)
+		with self.assertLogs('wrapitup'):
+			with self.assertRaises(SystemExit):
+				with catcher:
+					with other:
+						pass
+					self.suicide(KILL1)
+					self.assertTrue(exited.wait(10))
+					# Another block flushing the dispatcher does not raise it.
+					with other:
+						pass
+					flushed.set()
+		self.assertTrue(flushed.is_set())
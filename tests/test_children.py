@@ -0,0 +1,138 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import os
+import signal
+import subprocess
+import sys
+import threading
+import unittest
+from unittest import mock
+
+from wrapitup import catch_signals, reset, ChildExit, ChildProcesses, Timer
+from wrapitup import _catch_signals, _children
+
+
+_SLEEPER = '''
+import signal, sys, time
+if sys.argv[1] == 'ignore':
+	signal.signal(signal.SIGTERM, signal.SIG_IGN)
+print('ready', flush=True)
+time.sleep(60)
+'''
+
+
+@unittest.skipIf(os.name != 'posix', 'Requires Unix signals')
+class TestChildProcesses(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.children = ChildProcesses(kill_timeout=10)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def spawn(self, mode='default', **kwargs):
+		popen = subprocess.Popen(
+			[sys.executable, '-c', _SLEEPER, mode],
+			stdout=subprocess.PIPE, **kwargs)
+
+		def stop():
+			if popen.poll() is None:
+				popen.kill()
+				popen.wait()
+			popen.stdout.close()
+		self.addCleanup(stop)
+		self.assertEqual(popen.stdout.readline(), b'ready\n')
+		return popen
+
+	def test_bad_kill_timeout(self):
+		self.assertRaises(ValueError, ChildProcesses, kill_timeout=-1)
+
+	def test_register(self):
+		popen = self.spawn()
+		self.children.register(popen)
+		self.assertRaises(ValueError, self.children.register, popen.pid)
+		self.children.unregister(popen.pid)
+		self.assertRaises(KeyError, self.children.unregister, popen)
+		self.assertEqual(self.children.drain(), [])
+
+	def test_install(self):
+		with self.children:
+			self.assertIn(self.children.send_signal, _catch_signals._signal_hooks)
+			self.assertRaises(RuntimeError, self.children.install)
+		self.assertNotIn(
+			self.children.send_signal, _catch_signals._signal_hooks)
+		self.assertRaises(RuntimeError, self.children.uninstall)
+
+	def test_forwards_caught_signals(self):
+		popens = [self.spawn() for _ in range(3)]
+		for popen in popens:
+			self.children.register(popen)
+		with self.assertLogs('wrapitup'):
+			with self.children, catch_signals(signals=[signal.SIGUSR1]):
+				os.kill(os.getpid(), signal.SIGUSR1)
+		exits = self.children.drain(10)
+		expected = [
+			ChildExit(
+				pid=p.pid, returncode=-signal.SIGUSR1, latency=mock.ANY, killed=False)
+			for p in popens]
+		self.assertEqual(
+			sorted(exits, key=lambda e: e.pid),
+			sorted(expected, key=lambda e: e.pid))
+		self.assertTrue(all(0 <= e.latency < 10 for e in exits))
+		self.assertEqual(self.children.drain(), [])
+
+	def test_kills_stragglers(self):
+		polite, stubborn = self.spawn(), self.spawn('ignore')
+		self.children.register(polite)
+		self.children.register(stubborn)
+		with self.assertLogs('wrapitup') as logs:
+			exits = self.children.drain(
+				Timer(0.2, listen=False), signum=signal.SIGTERM)
+		self.assertRegex(logs.output[0], r'Killing 1 child processes')
+		self.assertEqual([(e.pid, e.returncode, e.killed) for e in exits], [
+			(polite.pid, -signal.SIGTERM, False),
+			(stubborn.pid, -signal.SIGKILL, True)])
+		self.assertGreaterEqual(exits[1].latency, 0.2)
+
+	def test_pid_and_group(self):
+		leader = self.spawn(start_new_session=True)
+		self.children.register(leader.pid, group=True)
+		exits = self.children.drain(signum=signal.SIGTERM)
+		self.assertEqual(
+			[(e.pid, e.returncode) for e in exits],
+			[(leader.pid, -signal.SIGTERM)])
+
+	def test_group_of_own(self):
+		popen = self.spawn()
+		self.assertRaises(
+			ValueError, self.children.register, popen, group=True)
+		self.assertEqual(self.children.drain(), [])
+
+	def test_timeout_longer_than_poll_allows(self):
+		popen = self.spawn()
+		self.children.register(popen)
+		with mock.patch.object(_children, '_MAX_TIMEOUT', 0.01):
+			exits = self.children.drain(
+				threading.TIMEOUT_MAX, signum=signal.SIGTERM)
+		self.assertEqual(
+			[(e.pid, e.returncode) for e in exits], [(popen.pid, -signal.SIGTERM)])
+
+	def test_already_exited(self):
+		popen = self.spawn()
+		self.children.register(popen)
+		popen.kill()
+		popen.wait()
+		child_exit, = self.children.drain(0)
+		self.assertEqual(child_exit.returncode, -signal.SIGKILL)
+		self.assertFalse(child_exit.killed)
+
+
+class TestChildProcessesWithoutPidfd(TestChildProcesses):
+
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch.object(_children, '_pidfd_open', None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
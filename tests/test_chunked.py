@@ -0,0 +1,70 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import time
+import unittest
+
+from wrapitup import chunked, request, reset, Timer
+
+
+class TestChunked(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_bad_arguments(self):
+		self.assertRaises(ValueError, chunked, [], initial_size=0)
+		self.assertRaises(ValueError, chunked, [], max_size=0)
+		self.assertRaises(ValueError, chunked, [], safety=0)
+		self.assertRaises(ValueError, chunked, [], safety=1.5)
+		self.assertRaises(ValueError, chunked, [], safety=float('nan'))
+
+	def test_no_time_limit_doubles_up_to_max_size(self):
+		chunks = chunked(list(range(100)), initial_size=2, max_size=16)
+		sizes = [len(chunk) for chunk in chunks]
+		self.assertEqual(sizes[:5], [2, 4, 8, 16, 16])
+		self.assertEqual(sum(sizes), 100)
+		self.assertEqual(chunks.count, 100)
+		self.assertFalse(chunks.stopped)
+
+	def test_chunks_are_slices(self):
+		data = tuple(range(10))
+		self.assertEqual(
+			[c for c in chunked(data, initial_size=3)],
+			[(0, 1, 2), (3, 4, 5, 6, 7, 8), (9,)])
+
+	def test_fits_deadline(self):
+		per_item = 0.001
+		timer = Timer(0.05)
+		chunks = chunked(range(10000), timer, initial_size=2)
+		sizes = []
+		for chunk in chunks:
+			sizes.append(len(chunk))
+			time.sleep(per_item * len(chunk))
+		self.assertTrue(chunks.stopped)
+		self.assertLess(chunks.count, 10000)
+		self.assertGreater(max(sizes), 2)
+		self.assertGreater(chunks.seconds_per_item, 0)
+		# Shrinking the last chunks keeps the overrun well below a full chunk.
+		self.assertGreater(timer.remaining(), -max(sizes) * per_item)
+
+	def test_request(self):
+		chunks = chunked(list(range(10)))
+		for chunk in chunks:
+			request()
+		self.assertEqual(chunks.count, 1)
+		self.assertTrue(chunks.stopped)
+
+	def test_timer_clock(self):
+		# Time per item is measured in the timer's clock, not in real time.
+		now = [0.0]
+		timer = Timer(100, clock=lambda: now[0])
+		chunks = chunked(range(1000), timer, initial_size=10)
+		sizes = []
+		for chunk in chunks:
+			sizes.append(len(chunk))
+			now[0] += len(chunk)
+		self.assertEqual(chunks.seconds_per_item, 1)
+		self.assertTrue(chunks.stopped)
+		self.assertEqual(sizes[0], 10)
+		self.assertLessEqual(sum(sizes), 100)
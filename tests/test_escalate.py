@@ -0,0 +1,146 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import os
+import signal
+import threading
+import time
+import unittest
+from unittest import mock
+
+from wrapitup import (
+	request, reset, requested, catch_signals_escalating, Phase, Token)
+
+
+@unittest.skipUnless(os.name == 'posix', 'sends signals with os.kill')
+class TestCatchSignalsEscalating(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.entered = []
+		self.exited = threading.Event()
+		patcher = mock.patch('os._exit', side_effect=self.exit)
+		self.exit_mock = patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def exit(self, code):
+		self.exited.set()
+
+	def action(self, name):
+		return lambda: self.entered.append(name)
+
+	def escalation(self, limits=(10, 10, 10)):
+		names = ('drain', 'abort', 'exit')
+		return catch_signals_escalating(
+			[
+				Phase(name, limit, self.action(name))
+				for name, limit in zip(names, limits)],
+			signals=(signal.SIGUSR1,), exit_code=3)
+
+	def test_validation(self):
+		self.assertRaises(ValueError, catch_signals_escalating, [])
+		self.assertRaises(
+			ValueError, catch_signals_escalating, [('a', 1), ('a', 2)])
+		self.assertEqual(
+			catch_signals_escalating([('a', 1)])._phases, (Phase('a', 1, None),))
+
+	def test_each_signal_escalates(self):
+		with self.assertLogs('wrapitup') as logs:
+			with self.escalation() as escalation:
+				self.assertIsNone(escalation.phase)
+				self.assertIsNone(escalation.timer)
+				self.assertFalse(escalation.reached('drain'))
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertTrue(requested())
+				self.assertEqual(escalation.phase.name, 'drain')
+				self.assertTrue(escalation.reached('drain'))
+				self.assertFalse(escalation.reached('abort'))
+				self.assertGreater(escalation.timer.remaining(), 5)
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertTrue(escalation.reached('abort'))
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertEqual(escalation.phase.name, 'exit')
+				self.exit_mock.assert_not_called()
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.exit_mock.assert_called_once_with(3)
+				self.assertRaises(KeyError, escalation.reached, 'nonexistent')
+			self.assertFalse(requested())
+		self.assertEqual(self.entered, ['drain', 'abort', 'exit'])
+		self.assertEqual(
+			sum('Commencing shut down phase' in line for line in logs.output), 3)
+		self.assertIn('CRITICAL', logs.output[-1])
+
+	def test_deadlines_escalate(self):
+		with self.assertLogs('wrapitup'):
+			with self.escalation((0.01, 0.01, 0.01)):
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertTrue(self.exited.wait(10))
+		self.assertEqual(self.entered, ['drain', 'abort', 'exit'])
+		self.exit_mock.assert_called_once_with(3)
+
+	def wait_for_phase(self, escalation):
+		for _ in range(1000):
+			if escalation.phase is not None:
+				return escalation.phase.name
+			time.sleep(0.01)
+		self.fail('No phase began')  # pragma: no cover
+
+	def test_request_starts_first_phase(self):
+		with self.assertLogs('wrapitup'):
+			with self.escalation() as escalation:
+				request()
+				self.assertEqual(self.wait_for_phase(escalation), 'drain')
+				request()
+				time.sleep(0.01)
+				self.assertEqual(escalation.phase.name, 'drain')
+		self.assertEqual(self.entered, ['drain'])
+		self.assertFalse(requested())
+
+	def test_request_before_entrance_starts_first_phase(self):
+		request()
+		with self.assertLogs('wrapitup'):
+			with self.escalation() as escalation:
+				self.assertEqual(self.wait_for_phase(escalation), 'drain')
+		self.assertEqual(self.entered, ['drain'])
+		self.assertTrue(requested())
+
+	def test_action_runs_outside_request(self):
+		# The action's helper thread needs the lock that request() holds.
+		done = threading.Event()
+
+		def action():
+			helper = threading.Thread(target=Token)
+			helper.start()
+			helper.join(10)
+			if not helper.is_alive():
+				done.set()
+
+		with self.assertLogs('wrapitup'):
+			with catch_signals_escalating(
+				[Phase('drain', 10, action)], signals=(signal.SIGUSR1,)
+			):
+				request()
+				self.assertTrue(done.wait(10))
+
+	def test_stops_escalating_on_exit(self):
+		with self.assertLogs('wrapitup'):
+			with self.escalation((0.05, 10, 10)):
+				os.kill(os.getpid(), signal.SIGUSR1)
+			self.assertFalse(self.exited.wait(0.1))
+		self.assertEqual(self.entered, ['drain'])
+		self.assertEqual(signal.getsignal(signal.SIGUSR1), signal.SIG_DFL)
+
+	def test_reusable_not_reentrant(self):
+		escalation = self.escalation()
+		with self.assertLogs('wrapitup'):
+			with escalation:
+				with self.assertRaises(RuntimeError):
+					with escalation:
+						pass  # pragma: no cover
+				os.kill(os.getpid(), signal.SIGUSR1)
+			with escalation:
+				self.assertIsNone(escalation.phase)
+		self.assertEqual(self.entered, ['drain'])
@@ -0,0 +1,104 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+import unittest
+
+from wrapitup import (
+	request, reset, ShutdownAwareExecutor, Timer, Token, DrainReport)
+
+
+class TestShutdownAwareExecutor(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.release = threading.Event()
+		self.started = threading.Semaphore(0)
+		self.executor = ShutdownAwareExecutor(ThreadPoolExecutor(2))
+		self.addCleanup(self.executor.shutdown)
+		self.addCleanup(self.release.set)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def block(self, value):
+		self.started.release()
+		self.release.wait(10)
+		return value
+
+	def start_jobs(self, n):
+		jobs = [self.executor.submit(self.block, i) for i in range(n)]
+		for _ in range(2):
+			self.assertTrue(self.started.acquire(timeout=10))
+		return jobs
+
+	def test_runs_work(self):
+		self.release.set()
+		results = self.executor.map(self.block, range(5))
+		self.assertEqual(list(results), list(range(5)))
+
+	@unittest.skipIf(
+		sys.version_info < (3, 8), 'ThreadPoolExecutor.submit takes fn by name')
+	def test_fn_keyword(self):
+		future = self.executor.submit(dict, fn=1)
+		self.assertEqual(future.result(10), {'fn': 1})
+
+	def test_request_cancels_pending(self):
+		jobs = self.start_jobs(5)
+		request()
+		self.assertFalse(any(job.cancelled() for job in jobs[:2]))
+		self.assertTrue(all(job.cancelled() for job in jobs[2:]))
+		self.assertRaisesRegex(
+			RuntimeError, 'shut down', self.executor.submit, self.block, 0)
+		reset()
+		# Stopped for good.
+		self.assertRaises(RuntimeError, self.executor.submit, self.block, 0)
+		self.release.set()
+		report = self.executor.drain()
+		self.assertIsInstance(report, DrainReport)
+		self.assertCountEqual(report.cancelled, jobs[2:])
+		self.assertCountEqual(report.completed, jobs[:2])
+		self.assertEqual(report.abandoned, [])
+
+	def test_drain_abandons_after_time_limit(self):
+		jobs = self.start_jobs(3)
+		report = self.executor.drain(0.01)
+		self.assertCountEqual(report.cancelled, jobs[2:])
+		self.assertEqual(report.completed, [])
+		self.assertCountEqual(report.abandoned, jobs[:2])
+		self.assertRaises(RuntimeError, self.executor.submit, self.block, 0)
+
+	def test_drain_unlimited_timer(self):
+		jobs = self.start_jobs(2)
+		self.release.set()
+		report = self.executor.drain(Timer(listen=False))
+		self.assertCountEqual(report.completed, jobs)
+		self.assertEqual(report.abandoned, [])
+
+	def test_drain_seconds_after_request(self):
+		# The time limit does not run out because a shut down was requested.
+		jobs = self.start_jobs(2)
+		request()
+		self.release.set()
+		report = self.executor.drain(10)
+		self.assertCountEqual(report.completed, jobs)
+		self.assertEqual(report.abandoned, [])
+
+	def test_token(self):
+		token = Token()
+		executor = ShutdownAwareExecutor(ThreadPoolExecutor(1), token)
+		self.addCleanup(executor.shutdown)
+		request_other = Token()
+		request_other.request()
+		executor.submit(int).result(10)
+		token.request()
+		self.assertRaises(RuntimeError, executor.submit, int)
+
+	def test_shutdown_stops_listening(self):
+		executor = ShutdownAwareExecutor(ThreadPoolExecutor(1))
+		with executor:
+			executor.submit(int)
+		self.assertRaises(RuntimeError, executor.submit, int)
+		request()
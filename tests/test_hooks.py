@@ -0,0 +1,144 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import math
+import sys
+import threading
+from time import monotonic
+import unittest
+
+from wrapitup import HookResult, ShutdownHooks, Timer
+
+
+class TestShutdownHooks(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.hooks = ShutdownHooks()
+		self.lock = threading.Lock()
+		self.started = []
+		self.finished = []
+
+	def hook(self, name, seconds=0.0, after=(), priority=0):
+		event = threading.Event()
+
+		def hook(timer):
+			with self.lock:
+				self.started.append(name)
+			event.wait(seconds)
+			with self.lock:
+				self.finished.append((name, timer.remaining()))
+		self.hooks.register(hook, name=name, after=after, priority=priority)
+		return event
+
+	def test_register(self):
+		@self.hooks.register
+		def plain(timer):
+			pass
+
+		@self.hooks.register(name='named', after=['plain'])
+		def decorated(timer):
+			pass
+		self.assertTrue(callable(plain))
+		self.assertTrue(callable(decorated))
+		self.assertRaisesRegex(
+			ValueError, 'already registered', self.hooks.register, plain)
+		results = self.hooks.run()
+		self.assertEqual([r.name for r in results], ['plain', 'named'])
+		for result in results:
+			self.assertIsInstance(result, HookResult)
+			self.assertEqual(result.budget, math.inf)
+			self.assertFalse(result.overran)
+			self.assertIsNone(result.error)
+
+	def test_dependency_order_and_concurrency(self):
+		barrier = threading.Barrier(2, timeout=10)
+		# a and b wait for each other, so they must run concurrently.
+		self.hooks.register(lambda timer: barrier.wait(), name='a')
+		self.hooks.register(lambda timer: barrier.wait(), name='b')
+		self.hook('c', after=['a', 'b'])
+		self.hook('d', after=['c'])
+		results = self.hooks.run(100)
+		self.assertEqual(self.started, ['c', 'd'])
+		self.assertTrue(all(r.error is None for r in results))
+		budgets = {r.name: r.budget for r in results}
+		self.assertAlmostEqual(budgets['a'], 100 / 3, delta=1)
+		self.assertAlmostEqual(budgets['b'], 100 / 3, delta=1)
+		self.assertAlmostEqual(budgets['c'], 100 / 2, delta=1)
+		self.assertAlmostEqual(budgets['d'], 100, delta=1)
+
+	def test_priority(self):
+		self.hooks = ShutdownHooks(max_workers=1)
+		self.hook('low', priority=-1)
+		self.hook('middle')
+		self.hook('high', priority=1)
+		self.hooks.run()
+		self.assertEqual(self.started, ['high', 'middle', 'low'])
+
+	def test_overrun_and_expiry(self):
+		self.hook('slow', 0.15)
+		self.hook('later', after=['slow'])
+		self.addCleanup(self.hook('stuck', 10).set)
+		self.hook('never', after=['stuck'])
+		start = monotonic()
+		with self.assertLogs('wrapitup') as logs:
+			slow, later, stuck, never = self.hooks.run(Timer(0.3, listen=False))
+		self.assertLess(monotonic() - start, 5)
+		self.assertLessEqual(slow.budget, 0.15)
+		self.assertGreaterEqual(slow.duration, 0.15)
+		self.assertTrue(slow.overran)
+		self.assertFalse(later.overran)
+		self.assertLessEqual(stuck.budget, 0.15)
+		self.assertIsNone(stuck.duration)
+		self.assertTrue(stuck.overran)
+		self.assertEqual(never, HookResult(
+			name='never', budget=None, duration=None, overran=False, error=None))
+		self.assertRegex(logs.output[-1], r'overran their budgets: slow, stuck\.')
+
+	def test_errors(self):
+		def broken(timer):
+			raise KeyError('boom')
+		self.hooks.register(broken)
+		self.hook('after', after=['broken'])
+		with self.assertLogs('wrapitup') as logs:
+			broken_result, after_result = self.hooks.run()
+		self.assertIsInstance(broken_result.error, KeyError)
+		self.assertIsNone(after_result.error)
+		self.assertEqual(self.started, ['after'])
+		self.assertIn('failed', logs.output[0])
+
+	def test_base_exceptions(self):
+		# Without a time limit, run() would wait forever if they went unreported.
+		def exits(timer):
+			sys.exit(3)
+		self.hooks.register(exits)
+		self.hook('after', after=['exits'])
+		with self.assertLogs('wrapitup'):
+			exits_result, after_result = self.hooks.run()
+		self.assertIsInstance(exits_result.error, SystemExit)
+		self.assertIsNone(after_result.error)
+		self.assertEqual(self.started, ['after'])
+
+	def test_bad_graph(self):
+		self.hook('a', after=['b'])
+		self.assertRaisesRegex(ValueError, 'unregistered', self.hooks.run)
+		self.hook('b', after=['a'])
+		self.assertRaisesRegex(ValueError, 'itself', self.hooks.run)
+		self.assertEqual(self.started, [])
+		self.assertRaises(ValueError, ShutdownHooks, max_workers=0)
+
+	def test_long_chain(self):
+		n = 3 * sys.getrecursionlimit()
+		self.hooks.register(lambda timer: None, name='0')
+		for i in range(1, n):
+			self.hooks.register(lambda timer: None, name=str(i), after=[str(i - 1)])
+		results = self.hooks.run(Timer(n, listen=False))
+		self.assertAlmostEqual(results[0].budget, 1, delta=0.5)
+		self.assertTrue(all(r.duration is not None for r in results))
+
+	def test_daemon_threads(self):
+		# Hooks still running after run returns don't block the interpreter's exit.
+		daemon = []
+		self.hooks.register(
+			lambda timer: daemon.append(threading.current_thread().daemon))
+		self.hooks.run()
+		self.assertEqual(daemon, [True])
@@ -0,0 +1,172 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import threading
+import unittest
+from unittest import mock
+
+from wrapitup import (
+	request, reset, Interrupted, Interrupter, Timer, Token)
+from wrapitup import _interrupt, _requests
+
+
+@unittest.skipUnless(_interrupt._SUPPORTED, 'Requires CPython 3.12 or earlier')
+class TestInterrupter(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.release = threading.Event()
+		self.enrolled = threading.Event()
+		self.results = []
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def interrupter(self, *args, **kwargs):
+		interrupter = Interrupter(*args, **kwargs)
+		self.addCleanup(interrupter.close)
+		return interrupter
+
+	def busy(self, interrupter):
+		try:
+			with interrupter.enroll() as enrollment:
+				self.enrolled.set()
+				while not self.release.is_set():
+					pass
+			self.results.append(enrollment.interrupted)
+		except BaseException as e:
+			self.results.append(e)
+
+	def start(self, interrupter):
+		thread = threading.Thread(target=self.busy, args=(interrupter,))
+		thread.start()
+
+		def stop():
+			self.release.set()
+			thread.join()
+		self.addCleanup(stop)
+		self.assertTrue(self.enrolled.wait(10))
+		return thread
+
+	def test_bad_arguments(self):
+		self.assertRaises(ValueError, Interrupter, -1)
+		self.assertRaises(TypeError, Interrupter, exception=Interrupted())
+		self.assertRaises(TypeError, Interrupter, exception=int)
+
+	def test_request(self):
+		thread = self.start(self.interrupter(grace=0))
+		with self.assertLogs('wrapitup') as logs:
+			request()
+			thread.join(10)
+		self.assertFalse(thread.is_alive())
+		self.assertEqual(self.results, [True])
+		self.assertRegex(logs.output[0], r'Interrupting 1 threads')
+
+	def test_grace(self):
+		thread = self.start(self.interrupter(grace=60))
+		request()
+		thread.join(0.05)
+		self.assertTrue(thread.is_alive())
+		self.release.set()
+		thread.join(10)
+		self.assertEqual(self.results, [False])
+
+	def test_timer(self):
+		with self.assertLogs('wrapitup'):
+			thread = self.start(self.interrupter(
+				grace=0, timer=Timer(0.01, listen=False)))
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+
+	def test_token(self):
+		token = Token()
+		interrupter = self.interrupter(grace=0, token=token)
+		thread = self.start(interrupter)
+		with self.assertLogs('wrapitup'):
+			token.request()
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+		interrupter.close()
+		self.assertEqual(token._callbacks, [])
+
+	def test_already_requested(self):
+		request()
+		interrupter = self.interrupter(grace=0.05)
+		with self.assertLogs('wrapitup'):
+			thread = self.start(interrupter)
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+
+	def test_enroll_after_grace(self):
+		interrupter = self.interrupter(grace=0)
+		with self.assertLogs('wrapitup'):
+			thread = self.start(interrupter)
+			request()
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+		# Threads that enroll later are interrupted as soon as they do.
+		self.enrolled.clear()
+		self.results.clear()
+		with self.assertLogs('wrapitup'):
+			thread = self.start(interrupter)
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+		self.assertEqual(interrupter._enrolled, {})
+
+	def test_leave_while_interrupting(self):
+		# However the exception races the end of the block, it never escapes the
+		# with statement uncaught inside it, and never leaves a thread enrolled.
+		interrupter = self.interrupter(grace=0)
+		request()
+
+		def quick():
+			for _ in range(200):
+				try:
+					with interrupter.enroll():
+						pass
+				except Interrupted:
+					pass  # Arrived as the block exited, as documented.
+			self.results.append(interrupter._enrolled)
+		thread = threading.Thread(target=quick)
+		with mock.patch.object(_interrupt, '_LOG'):
+			thread.start()
+			thread.join(10)
+		self.assertEqual(self.results, [{}])
+
+	def test_custom_exception(self):
+		class Stop(Exception):
+			pass
+		interrupter = self.interrupter(grace=0, exception=Stop)
+		thread = self.start(interrupter)
+		with self.assertLogs('wrapitup'):
+			request()
+			thread.join(10)
+		self.assertEqual(self.results, [True])
+
+	def test_not_enrolled(self):
+		interrupter = self.interrupter(grace=0)
+		with interrupter.enroll():
+			self.assertRaisesRegex(
+				RuntimeError, 'already enrolled', interrupter.enroll().__enter__)
+		self.assertEqual(interrupter._enrolled, {})
+		request()
+		# Nothing to interrupt: the main thread left its block.
+		interrupter.close()
+
+	def test_close(self):
+		interrupter = self.interrupter(grace=0)
+		interrupter.close()
+		interrupter.close()
+		self.assertEqual(_requests._callbacks, [])
+		self.assertRaisesRegex(
+			RuntimeError, 'closed', interrupter.enroll().__enter__)
+		with self.interrupter() as interrupter:
+			pass
+		self.assertFalse(interrupter._thread.is_alive())
+
+
+class TestUnsupported(unittest.TestCase):
+
+	def test_unsupported(self):
+		with mock.patch.object(_interrupt, '_SUPPORTED', False):
+			self.assertRaisesRegex(RuntimeError, 'Cannot raise', Interrupter)
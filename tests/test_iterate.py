@@ -0,0 +1,67 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import unittest
+
+from wrapitup import iterate, request, reset, Timer, Token
+
+
+class TestIterate(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_bad_check_every(self):
+		self.assertRaises(TypeError, iterate, [], check_every=1.0)
+		self.assertRaises(TypeError, iterate, [], check_every=False)
+		self.assertRaises(ValueError, iterate, [], check_every=0)
+
+	def test_exhausts(self):
+		for check_every in (1, 2, 3, 10):
+			with self.subTest(check_every=check_every):
+				items = iterate(range(6), check_every=check_every)
+				self.assertEqual(list(items), list(range(6)))
+				self.assertEqual(items.count, 6)
+				self.assertFalse(items.stopped)
+
+	def test_empty(self):
+		items = iterate([])
+		self.assertEqual(list(items), [])
+		self.assertEqual(items.count, 0)
+		self.assertFalse(items.stopped)
+
+	def test_request_stops_at_batch_boundary(self):
+		items = iterate(range(100), check_every=3)
+		seen = []
+		for item in items:
+			seen.append(item)
+			if item == 4:
+				request()
+		self.assertEqual(seen, list(range(6)))
+		self.assertEqual(items.count, 6)
+		self.assertTrue(items.stopped)
+
+	def test_request_in_last_batch(self):
+		for size in (5, 6):
+			with self.subTest(size=size):
+				items = iterate(range(size), check_every=3)
+				for item in items:
+					if item == 4:
+						request()
+				self.assertEqual(items.count, size)
+				self.assertTrue(items.stopped)
+				reset()
+
+	def test_expired_timer(self):
+		items = iterate(range(10), Timer(0))
+		self.assertEqual(list(items), [])
+		self.assertTrue(items.stopped)
+
+	def test_timer_token(self):
+		token = Token()
+		items = iterate(iter(range(10)), Timer(token=token))
+		for item in items:
+			if item == 1:
+				token.request()
+		self.assertEqual(items.count, 2)
+		self.assertTrue(items.stopped)
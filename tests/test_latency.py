@@ -0,0 +1,124 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import io
+import os
+import signal
+import unittest
+
+from wrapitup import (
+	catch_signals, Histogram, LatencyRecorder, request, requested, reset, Timer,
+	Token)
+from wrapitup import _requests
+
+
+class TestHistogram(unittest.TestCase):
+
+	def test_empty(self):
+		h = Histogram()
+		self.assertEqual(h.count, 0)
+		self.assertIsNone(h.percentile(50))
+		self.assertEqual(h.summary(), 'count=0')
+
+	def test_percentiles(self):
+		h = Histogram()
+		for i in range(1, 101):
+			h.record(i * 1e-3)
+		self.assertEqual(h.count, 100)
+		self.assertEqual(h.min, 1e-3)
+		self.assertEqual(h.max, 0.1)
+		self.assertAlmostEqual(h.percentile(50), 0.05, delta=0.05 * 0.05)
+		self.assertAlmostEqual(h.percentile(99), 0.099, delta=0.099 * 0.05)
+		self.assertEqual(h.percentile(100), 0.1)
+		self.assertEqual(h.percentile(0), 1e-3)
+		self.assertRaises(ValueError, h.percentile, 101)
+		self.assertRegex(h.summary(), r'count=100 p50=\S+ms p99=\S+ms max=100.00ms')
+
+
+class TestLatencyRecorder(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.recorder = LatencyRecorder()
+		self.original = _requests._flag
+		self.recorder.install()
+		self.addCleanup(self.recorder.uninstall)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_install(self):
+		self.assertIs(_requests._flag, self.recorder)
+		self.assertRaisesRegex(RuntimeError, 'already', self.recorder.install)
+		self.recorder.uninstall()
+		self.assertIs(_requests._flag, self.original)
+		self.assertRaisesRegex(RuntimeError, 'not installed', self.recorder.uninstall)
+		self.recorder.install()
+
+	def test_usable_after_uninstall(self):
+		# Other threads may still hold the recorder after it is uninstalled.
+		self.recorder.uninstall()
+		self.addCleanup(self.recorder.install)
+		self.assertFalse(self.recorder.is_set())
+		self.recorder.set()
+		self.assertTrue(self.recorder.is_set())
+		self.assertTrue(requested())
+
+	def test_stacked(self):
+		outer = LatencyRecorder()
+		outer.install()
+		self.addCleanup(outer.uninstall)
+		request()
+		self.assertTrue(requested())
+		for recorder in (self.recorder, outer):
+			self.assertEqual(
+				recorder.histograms()['request_to_observation'].count, 1)
+
+	def test_nothing_recorded_without_request(self):
+		self.assertFalse(requested())
+		self.assertFalse(Timer().expired())
+		self.assertEqual(self.recorder.histograms(), {})
+
+	def test_first_observation_per_site(self):
+		timer = Timer()
+		token = Token()
+		request()
+		for _ in range(3):
+			self.assertTrue(requested())  # site A
+			self.assertTrue(timer.expired())  # site B
+			self.assertTrue(token.requested())  # Not timed; token's own flag is set
+		histograms = self.recorder.histograms()
+		self.assertEqual(histograms['request_to_observation'].count, 2)
+		sites = [
+			name for name in histograms if name.startswith('request_to_observation:')]
+		self.assertEqual(len(sites), 2)
+		for site in sites:
+			self.assertIn(__file__, site)
+			self.assertIn('test_first_observation_per_site', site)
+		self.assertNotIn('signal_to_request', histograms)
+
+		# A new request starts a new round of observations.
+		reset()
+		request()
+		self.assertTrue(requested())
+		self.assertEqual(
+			self.recorder.histograms()['request_to_observation'].count, 3)
+
+	@unittest.skipIf(os.name != 'posix', 'Requires SIGUSR1')
+	def test_signal_to_request(self):
+		with self.assertLogs('wrapitup'):
+			with catch_signals(signals=[signal.SIGUSR1]):
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertTrue(requested())
+		histograms = self.recorder.histograms()
+		self.assertEqual(histograms['signal_to_request'].count, 1)
+		self.assertEqual(histograms['request_to_observation'].count, 1)
+
+	def test_report(self):
+		request()
+		requested()
+		out = io.StringIO()
+		self.recorder.dump(out)
+		lines = out.getvalue().splitlines()
+		self.assertEqual(len(lines), 2)
+		self.assertTrue(all('count=1' in line for line in lines))
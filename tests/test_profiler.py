@@ -0,0 +1,107 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import io
+import threading
+import unittest
+
+from wrapitup import (
+	LatencyRecorder, request, requested, reset, PollProfiler, SiteProfile,
+	Timer, Token)
+from wrapitup import _requests
+
+
+class TestPollProfiler(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.profiler = PollProfiler()
+		self.original = _requests._flag
+		self.profiler.install()
+		self.addCleanup(self.profiler.uninstall)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_install(self):
+		self.assertIs(_requests._flag, self.profiler)
+		self.assertRaisesRegex(RuntimeError, 'already', self.profiler.install)
+		self.profiler.uninstall()
+		self.assertIs(_requests._flag, self.original)
+		self.assertRaisesRegex(
+			RuntimeError, 'not installed', self.profiler.uninstall)
+		self.profiler.install()
+
+	def test_usable_after_uninstall(self):
+		# Other threads may still hold the profiler after it is uninstalled.
+		self.profiler.uninstall()
+		self.addCleanup(self.profiler.install)
+		self.assertFalse(self.profiler.is_set())
+		self.profiler.set()
+		self.assertTrue(self.profiler.is_set())
+		self.assertTrue(requested())
+
+	def test_stacked(self):
+		recorder = LatencyRecorder()
+		recorder.install()
+		self.addCleanup(recorder.uninstall)
+		requested()
+		profiles = self.profiler.profiles()
+		self.assertEqual([p.calls for p in profiles], [1])
+		self.assertIn('test_stacked', profiles[0].site)
+
+	def test_counts_per_site(self):
+		timer = Timer(poll_every=10)
+		token = Token()
+		for _ in range(20):
+			self.assertFalse(requested())  # site A
+			self.assertFalse(timer.expired())  # site B, checked every 10 calls
+			self.assertFalse(token.requested())  # site C
+		request()
+		self.assertTrue(requested())  # site D
+		profiles = self.profiler.profiles()
+		self.assertTrue(all(isinstance(p, SiteProfile) for p in profiles))
+		self.assertEqual(sorted(p.calls for p in profiles), [1, 2, 20, 20])
+		for profile in profiles:
+			self.assertIn(__file__, profile.site)
+			self.assertIn('test_counts_per_site', profile.site)
+			self.assertEqual(profile.gaps.count, profile.calls - 1)
+		self.assertGreater(max(p.rate for p in profiles), 0)
+		self.assertEqual(min(p.rate for p in profiles), 0)
+
+	def test_ranks_by_longest_gap(self):
+		def slow():
+			requested()
+		event = threading.Event()
+		for i in range(4):
+			requested()
+			if i % 3 == 0:
+				slow()
+			event.wait(0.01)
+		profiles = self.profiler.profiles()
+		self.assertEqual(len(profiles), 2)
+		self.assertIn('slow', profiles[0].site)
+		self.assertGreaterEqual(profiles[0].gaps.max, profiles[1].gaps.max)
+
+	def test_gaps_per_thread(self):
+		def check():
+			requested()
+		thread = threading.Thread(target=check)
+		check()
+		thread.start()
+		thread.join()
+		profile, = self.profiler.profiles()
+		self.assertEqual(profile.calls, 2)
+		self.assertEqual(profile.gaps.count, 0)
+
+	def test_report(self):
+		for _ in range(2):
+			requested()
+		requested()
+		out = io.StringIO()
+		self.profiler.dump(out)
+		lines = out.getvalue().splitlines()
+		self.assertEqual(len(lines), 2)
+		self.assertRegex(
+			lines[0], r'calls=2 rate=\S+/s gaps p50=\S+ p99=\S+ max=')
+		self.assertRegex(lines[1], r'calls=1 rate=0\.0/s gaps -$')
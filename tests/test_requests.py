@@ -1,15 +1,97 @@
 # © 2018, William Schwartz. All rights reserved. See the LICENSE file.
 
+import threading
+import time
 import unittest
 
-from wrapitup import request, reset, requested
+from wrapitup import request, reset, requested, sleep, Token
 
 
 class TestRequest(unittest.TestCase):
 
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
 	def test_request(self):
 		self.assertFalse(requested())
 		request()
 		self.assertTrue(requested())
 		reset()
 		self.assertFalse(requested())
+
+	def test_sleep(self):
+		start = time.monotonic()
+		self.assertFalse(sleep(0.01))
+		self.assertGreaterEqual(time.monotonic() - start, 0.01)
+		self.assertFalse(sleep(0))
+		self.assertRaises(ValueError, sleep, -1)
+		request()
+		self.assertTrue(sleep(0))
+
+	def test_sleep_wakes_on_request(self):
+		timer = threading.Timer(0.01, request)
+		timer.start()
+		start = time.monotonic()
+		try:
+			self.assertTrue(sleep(10))
+		finally:
+			timer.join()
+		self.assertLess(time.monotonic() - start, 5)
+
+
+class TestToken(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_tree(self):
+		parent = Token()
+		child, sibling = Token(parent), Token(parent)
+		grandchild = Token(child)
+		tokens = (parent, child, sibling, grandchild)
+
+		child.request()
+		self.assertEqual(
+			[t.requested() for t in tokens], [False, True, False, True])
+		self.assertFalse(requested())
+
+		parent.request()
+		self.assertTrue(all(t.requested() for t in tokens))
+		self.assertTrue(Token(parent).requested())
+
+		# Resetting the parent leaves the child's own request alone.
+		parent.reset()
+		self.assertEqual(
+			[t.requested() for t in tokens], [False, True, False, True])
+		child.reset()
+		self.assertFalse(any(t.requested() for t in tokens))
+
+	def test_root(self):
+		parent = Token()
+		child = Token(parent)
+		child.request()
+		request()
+		self.assertTrue(parent.requested())
+		self.assertTrue(Token(child).requested())
+		self.assertTrue(parent.wait(0))
+		reset()
+		self.assertFalse(parent.requested())
+		self.assertTrue(child.requested())
+
+	def test_wait(self):
+		parent = Token()
+		child = Token(parent)
+		self.assertFalse(child.wait(0.001))
+		timer = threading.Timer(0.01, request)
+		timer.start()
+		try:
+			self.assertTrue(child.wait(10))
+		finally:
+			timer.join()
+
+	def test_children_are_weak(self):
+		parent = Token()
+		Token(parent)
+		self.assertEqual(len(parent._children), 0)
@@ -0,0 +1,104 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import queue
+import time
+import unittest
+
+from wrapitup import request, reset, Scheduler, Timer, Token
+
+
+class TestScheduler(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.scheduler = Scheduler()
+		self.addCleanup(self.scheduler.close)
+		self.fired = queue.Queue()
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def callback(self, timer):
+		self.fired.put(timer)
+
+	def assert_fired(self, *timers):
+		got = [self.fired.get(timeout=10) for _ in timers]
+		self.assertCountEqual(got, timers)
+
+	def test_fires_in_deadline_order(self):
+		timers = [Timer(limit) for limit in (0.03, 0.01, 0.02)]
+		for timer in timers:
+			self.scheduler.schedule(timer, self.callback)
+		self.assertEqual(len(self.scheduler), 3)
+		got = [self.fired.get(timeout=10) for _ in timers]
+		self.assertEqual(got, [timers[1], timers[2], timers[0]])
+		self.assertEqual(len(self.scheduler), 0)
+		for timer in timers:
+			self.assertTrue(timer.expired())
+
+	def test_cancel(self):
+		cancelled = self.scheduler.schedule(Timer(0.01), self.callback)
+		kept = Timer(0.02)
+		self.scheduler.schedule(kept, self.callback)
+		self.assertTrue(self.scheduler.cancel(cancelled))
+		self.assertFalse(self.scheduler.cancel(cancelled))
+		self.assert_fired(kept)
+		self.assertTrue(self.fired.empty())
+
+	def test_restart(self):
+		timer = Timer(10)
+		handle = self.scheduler.schedule(timer, self.callback)
+		self.scheduler.restart(handle, 0.01)
+		self.assert_fired(timer)
+		self.assertEqual(len(self.scheduler), 0)
+		self.assertFalse(self.scheduler.cancel(handle))
+		# Restarting a fired timer schedules it again.
+		self.scheduler.restart(handle, 0)
+		self.assert_fired(timer)
+
+	def test_many_restarts_compact(self):
+		timer = Timer(10)
+		handle = self.scheduler.schedule(timer, self.callback)
+		for _ in range(1000):
+			self.scheduler.restart(handle, 10)
+		self.assertLess(len(self.scheduler._heap), 200)
+		self.assertEqual(len(self.scheduler), 1)
+
+	def test_request_expires_everything(self):
+		timers = [Timer() for _ in range(100)]
+		for timer in timers:
+			self.scheduler.schedule(timer, self.callback)
+		request()
+		self.assert_fired(*timers)
+		late = Timer()
+		self.scheduler.schedule(late, self.callback)
+		self.assert_fired(late)
+
+	def test_token(self):
+		token = Token()
+		with Scheduler(token) as scheduler:
+			timer = Timer()
+			scheduler.schedule(timer, self.callback)
+			token.request()
+			self.assert_fired(timer)
+
+	def test_callback_errors_are_logged(self):
+		def bad(timer):
+			raise RuntimeError('oops')
+		with self.assertLogs('wrapitup', 'ERROR') as logcm:
+			self.scheduler.schedule(Timer(0), bad)
+			timer = Timer(0.01)
+			self.scheduler.schedule(timer, self.callback)
+			self.assert_fired(timer)
+		self.assertIn('oops', logcm.output[0])
+
+	def test_close(self):
+		timer = Timer(0.01)
+		self.scheduler.schedule(timer, self.callback)
+		self.scheduler.close()
+		self.scheduler.close()
+		time.sleep(0.02)
+		self.assertTrue(self.fired.empty())
+		self.assertRaisesRegex(
+			RuntimeError, 'closed', self.scheduler.schedule, timer, self.callback)
@@ -0,0 +1,119 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import gc
+import multiprocessing
+import os
+import pickle
+import sys
+import threading
+import unittest
+
+from wrapitup import request, reset, requested, SharedFlag, Token
+from wrapitup import _requests
+
+
+def child(flag, install, ready, done):
+	"""Wait in a child process for a request from the parent."""
+	if install:
+		flag.install()
+	ready.set()
+	done.put(_requests._flag.wait(10) and requested())
+
+
+class TestSharedFlag(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.flag = SharedFlag()
+		self.addCleanup(self.flag.close)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_event_interface(self):
+		self.assertFalse(self.flag.is_set())
+		self.assertFalse(self.flag.wait(0.001))
+		self.flag.set()
+		self.assertTrue(self.flag.is_set())
+		self.assertTrue(self.flag.wait())
+		self.flag.clear()
+		self.assertFalse(self.flag.is_set())
+
+	def test_install(self):
+		original = _requests._flag
+		self.flag.install()
+		try:
+			self.assertIs(_requests._flag, self.flag)
+			request()
+			self.assertTrue(self.flag.is_set())
+			self.assertFalse(original.is_set())
+			reset()
+			self.assertFalse(self.flag.is_set())
+		finally:
+			self.flag.uninstall()
+		self.assertIs(_requests._flag, original)
+		self.assertRaisesRegex(RuntimeError, 'not installed', self.flag.uninstall)
+
+	def test_token_wait(self):
+		# Another process's request sets only the shared memory.
+		copy = pickle.loads(pickle.dumps(self.flag))
+		self.addCleanup(copy.close)
+		self.flag.install()
+		self.addCleanup(self.flag.uninstall)
+		token = Token()
+		self.assertFalse(token.wait(0.001))
+		setter = threading.Timer(0.05, lambda: copy._mmap.__setitem__(0, 1))
+		setter.start()
+		self.addCleanup(setter.join)
+		self.assertTrue(token.wait(10))
+		self.assertTrue(token.requested())
+
+	def test_pickle_shares_memory(self):
+		copy = pickle.loads(pickle.dumps(self.flag))
+		self.addCleanup(copy.close)
+		copy.set()
+		self.assertTrue(self.flag.is_set())
+		self.flag.clear()
+		self.assertFalse(copy.is_set())
+
+	@unittest.skipIf(os.name != 'posix', 'Backed by a file only on Unix')
+	def test_file_removed_without_close(self):
+		flag = SharedFlag()
+		path = flag._path
+		self.assertTrue(os.path.exists(path))
+		if sys.platform.startswith('linux'):
+			self.assertEqual(os.path.dirname(path), '/dev/shm')
+		del flag
+		gc.collect()
+		self.assertFalse(os.path.exists(path))
+		# Closing a copy, such as a child's, does not remove the owner's file.
+		copy = pickle.loads(pickle.dumps(self.flag))
+		copy.close()
+		self.assertTrue(os.path.exists(self.flag._path))
+
+	def assert_child_sees_request(self, method, install):
+		ctx = multiprocessing.get_context(method)
+		ready, done = ctx.Event(), ctx.Queue()
+		self.flag.install()
+		try:
+			proc = ctx.Process(
+				target=child, args=(self.flag, install, ready, done))
+			proc.start()
+			try:
+				self.assertTrue(ready.wait(10))
+				request()
+				self.assertTrue(done.get(timeout=10))
+			finally:
+				proc.join(10)
+		finally:
+			self.flag.uninstall()
+
+	@unittest.skipIf(
+		'fork' not in multiprocessing.get_all_start_methods(),
+		'Requires the fork start method')
+	def test_fork(self):
+		self.assert_child_sees_request('fork', install=False)
+
+	def test_spawn(self):
+		self.assert_child_sees_request('spawn', install=True)
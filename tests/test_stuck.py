@@ -0,0 +1,147 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import io
+import os
+import tempfile
+import threading
+import unittest
+
+from wrapitup import (
+	LatencyRecorder, request, requested, reset, sleep, StuckListenerDetector,
+	Timer)
+from wrapitup import _requests
+
+
+class TestStuckListenerDetector(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.file = io.StringIO()
+		self.release = threading.Event()
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def install(self, **kwargs):
+		detector = StuckListenerDetector(file=self.file, **kwargs)
+		original = _requests._flag
+		detector.install()
+		self.addCleanup(lambda: detector._installed and detector.uninstall())
+		self.assertIs(_requests._flag, detector)
+		self.assertRaises(RuntimeError, detector.install)
+		return detector, original
+
+	def stuck_loop(self):
+		self.release.wait(10)
+
+	def listening_loop(self):
+		timer = Timer()
+		while not timer.expired() and not self.release.is_set():
+			self.release.wait(0.001)
+
+	def start(self, target, daemon=False):
+		thread = threading.Thread(target=target, name=target.__name__)
+		thread.daemon = daemon
+		thread.start()
+
+		def stop():
+			self.release.set()
+			request()
+			thread.join()
+			reset()
+		self.addCleanup(stop)
+		return thread
+
+	def test_bad_grace(self):
+		self.assertRaises(ValueError, StuckListenerDetector, -1)
+
+	def test_install_uninstall(self):
+		detector, original = self.install()
+		detector.uninstall()
+		self.assertIs(_requests._flag, original)
+		self.assertRaises(RuntimeError, detector.uninstall)
+
+	def test_usable_after_uninstall(self):
+		# Other threads may still hold the detector after it is uninstalled.
+		detector, _ = self.install()
+		detector.uninstall()
+		self.assertFalse(detector.is_set())
+		detector.set()
+		self.assertTrue(detector.is_set())
+		self.assertTrue(requested())
+		self.assertEqual(detector.stuck(), [])
+
+	def test_stacked(self):
+		detector, _ = self.install(grace=60)
+		recorder = LatencyRecorder()
+		recorder.install()
+		self.addCleanup(recorder.uninstall)
+		observed = threading.Event()
+
+		def observe_then_wait():
+			while not requested():
+				self.release.wait(0.001)
+			observed.set()
+			self.release.wait(10)
+		self.start(observe_then_wait)
+		request()
+		self.assertTrue(observed.wait(10))
+		# The detector sees through the recorder to requested().
+		self.assertEqual(detector.stuck(), [])
+
+	def test_stuck(self):
+		detector, _ = self.install(grace=60)
+		self.assertEqual(detector.stuck(), [])
+		stuck = self.start(self.stuck_loop)
+		listening = self.start(self.listening_loop)
+		sleeping = self.start(lambda: sleep(10))
+		self.start(self.stuck_loop, daemon=True)
+		request()
+		listening.join(10)
+		sleeping.join(10)
+		self.assertTrue(requested())  # Observe from the main thread.
+		self.assertEqual(detector.stuck(), [stuck])
+		self.assertEqual(detector.dump(), 1)
+		self.assertIn("Thread 'stuck_loop'", self.file.getvalue())
+		self.assertIn('in stuck_loop', self.file.getvalue())
+		reset()
+		self.assertEqual(detector.stuck(), [])
+		self.assertEqual(detector.dump(), 0)
+
+	def test_include_daemon(self):
+		detector, _ = self.install(grace=60, include_daemon=True)
+		daemon = self.start(self.stuck_loop, daemon=True)
+		request()
+		self.assertIn(daemon, detector.stuck())
+
+	def test_dumps_after_grace(self):
+		self.install(grace=0.01)
+		self.start(self.stuck_loop)
+		with self.assertLogs('wrapitup') as logs:
+			request()
+			for _ in range(1000):
+				if 'stuck_loop' in self.file.getvalue():
+					break
+				self.release.wait(0.01)
+		self.assertIn('in stuck_loop', self.file.getvalue())
+		self.assertRegex(
+			logs.output[0], r'\d+ threads did not observe the request')
+
+	def test_reset_cancels(self):
+		detector, _ = self.install(grace=0.05)
+		self.start(self.stuck_loop)
+		request()
+		reset()
+		self.release.wait(0.1)
+		self.assertEqual(self.file.getvalue(), '')
+
+	def test_dump_to_path(self):
+		detector, _ = self.install(grace=60)
+		self.start(self.stuck_loop)
+		request()
+		with tempfile.TemporaryDirectory() as directory:
+			path = os.path.join(directory, 'stacks.txt')
+			self.assertGreaterEqual(detector.dump(path), 1)
+			with open(path) as file:
+				self.assertIn('in stuck_loop', file.read())
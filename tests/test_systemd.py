@@ -0,0 +1,169 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import os
+import socket
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from wrapitup import request, reset, SystemdNotifier, Timer, Token
+from wrapitup import _systemd
+
+
+@unittest.skipIf(not hasattr(socket, 'AF_UNIX'), 'Requires Unix sockets')
+class TestSystemdNotifier(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		directory = tempfile.TemporaryDirectory()
+		self.addCleanup(directory.cleanup)
+		self.path = os.path.join(directory.name, 'notify')
+		self.server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		self.addCleanup(self.server.close)
+		self.server.bind(self.path)
+		self.server.settimeout(10)
+		self.environ({'NOTIFY_SOCKET': self.path})
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def environ(self, values):
+		patcher = mock.patch.dict(os.environ, values)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		for name in ('WATCHDOG_USEC', 'WATCHDOG_PID'):
+			if name not in values:
+				os.environ.pop(name, None)
+
+	def receive(self):
+		return self.server.recv(4096).decode()
+
+	def test_disabled(self):
+		del os.environ['NOTIFY_SOCKET']
+		notifier = SystemdNotifier()
+		self.assertFalse(notifier.enabled)
+		self.assertIsNone(notifier.watchdog_interval)
+		with notifier:
+			self.assertFalse(notifier.notify('READY=1'))
+			self.assertFalse(notifier.extend_timeout(Timer(1)))
+			request()
+
+	def test_unsupported_address(self):
+		self.environ({'NOTIFY_SOCKET': 'vsock:2:1234'})
+		self.assertFalse(SystemdNotifier().enabled)
+
+	def test_ready_and_stopping(self):
+		with SystemdNotifier() as notifier:
+			self.assertTrue(notifier.enabled)
+			self.assertIsNone(notifier.watchdog_interval)
+			self.assertEqual(self.receive(), 'READY=1')
+			request()
+			self.assertEqual(self.receive(), 'STOPPING=1')
+			self.assertTrue(notifier.notify('STATUS=Draining', 'ERRNO=0'))
+			self.assertEqual(self.receive(), 'STATUS=Draining\nERRNO=0')
+		self.assertRaises(RuntimeError, notifier.__enter__)
+		self.assertFalse(notifier.notify('READY=1'))
+
+	def test_socket_only_in_block(self):
+		notifier = SystemdNotifier(ready=False)
+		self.assertTrue(notifier.enabled)
+		self.assertIsNone(notifier._socket)
+		self.assertFalse(notifier.notify('READY=1'))
+		with notifier:
+			sock = notifier._socket
+			self.assertTrue(notifier.notify('READY=1'))
+			self.assertEqual(self.receive(), 'READY=1')
+		self.assertIsNone(notifier._socket)
+		self.assertEqual(sock.fileno(), -1)
+
+	def test_not_ready_and_already_requested(self):
+		token = Token()
+		token.request()
+		with SystemdNotifier(ready=False, token=token):
+			self.assertEqual(self.receive(), 'STOPPING=1')
+		self.assertEqual(token._callbacks, [])
+
+	def test_extend_timeout(self):
+		with SystemdNotifier(ready=False) as notifier:
+			self.assertTrue(notifier.extend_timeout(Timer(2.5, listen=False)))
+			usec = int(self.receive().split('=')[1])
+			self.assertGreater(usec, 2400000)
+			self.assertLessEqual(usec, 2500000)
+			self.assertTrue(notifier.extend_timeout(Timer(0, listen=False)))
+			self.assertEqual(self.receive(), 'EXTEND_TIMEOUT_USEC=0')
+			self.assertFalse(notifier.extend_timeout(Timer(listen=False)))
+
+	def test_extend_timeout_until_expiry(self):
+		patcher = mock.patch.object(_systemd, '_EXTEND_INTERVAL', 0.01)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		with SystemdNotifier(ready=False) as notifier:
+			timer = Timer(0.2, listen=False)
+			self.assertTrue(notifier.extend_timeout(timer))
+			self.server.settimeout(0.1)
+			usecs = []
+			while True:
+				try:
+					message = self.receive()
+				except socket.timeout:
+					break
+				self.assertRegex(message, r'^EXTEND_TIMEOUT_USEC=\d+$')
+				usecs.append(int(message.split('=')[1]))
+			# The notifier stopped sending once the timer expired.
+			self.assertTrue(timer.expired())
+			self.assertIsNone(notifier._thread)
+			self.assertGreater(len(usecs), 2)
+			self.assertEqual(usecs, sorted(usecs, reverse=True))
+
+	def test_extend_timeout_with_watchdog(self):
+		self.environ({
+			'NOTIFY_SOCKET': self.path, 'WATCHDOG_USEC': '20000',
+			'WATCHDOG_PID': str(os.getpid())})
+		patcher = mock.patch.object(_systemd, '_EXTEND_INTERVAL', 0.03)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		with SystemdNotifier(ready=False) as notifier:
+			self.assertEqual(self.receive(), 'WATCHDOG=1')
+			notifier.extend_timeout(Timer(10, listen=False))
+			for _ in range(50):
+				if self.receive().startswith('WATCHDOG=1\nEXTEND_TIMEOUT_USEC='):
+					break
+			else:
+				self.fail('No combined message')
+
+	def test_stop_timeout(self):
+		with SystemdNotifier(ready=False, stop_timeout=2.5):
+			request()
+			self.assertEqual(
+				self.receive(), 'STOPPING=1\nEXTEND_TIMEOUT_USEC=2500000')
+		with SystemdNotifier(ready=False, stop_timeout=float('inf')):
+			self.assertEqual(self.receive(), 'STOPPING=1')
+		for bad in (-1, float('nan')):
+			self.assertRaises(ValueError, SystemdNotifier, stop_timeout=bad)
+
+	def test_watchdog(self):
+		self.environ({
+			'NOTIFY_SOCKET': self.path, 'WATCHDOG_USEC': '20000',
+			'WATCHDOG_PID': str(os.getpid())})
+		with SystemdNotifier(ready=False) as notifier:
+			self.assertEqual(notifier.watchdog_interval, 0.01)
+			for _ in range(3):
+				self.assertEqual(self.receive(), 'WATCHDOG=1')
+
+	def test_watchdog_for_another_process(self):
+		self.environ({
+			'NOTIFY_SOCKET': self.path, 'WATCHDOG_USEC': '20000',
+			'WATCHDOG_PID': '1'})
+		self.assertIsNone(SystemdNotifier().watchdog_interval)
+
+	@unittest.skipUnless(sys.platform.startswith('linux'), 'Requires Linux')
+	def test_abstract_address(self):
+		server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		self.addCleanup(server.close)
+		server.bind('\0wrapitup-test-%d' % os.getpid())
+		server.settimeout(10)
+		self.environ({'NOTIFY_SOCKET': '@wrapitup-test-%d' % os.getpid()})
+		with SystemdNotifier():
+			self.assertEqual(server.recv(4096), b'READY=1')
@@ -1,12 +1,16 @@
 # © 2018, William Schwartz. All rights reserved. See the LICENSE file.
 
+import copy
 import os
+import pickle
 import signal
 import sys
+import threading
 import time
 import unittest
+import weakref
 
-from wrapitup import request, reset, Timer
+from wrapitup import request, reset, Timer, Token
 
 
 class TestTimer(unittest.TestCase):
@@ -22,6 +26,10 @@ class TestTimer(unittest.TestCase):
 		time_limit = 0.001
 		decimal_places = 3
 
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
 	def test_wrapitup_timer(self):
 		"Calling request causes Timer.expired to return True."
 		request()
@@ -34,6 +42,20 @@ class TestTimer(unittest.TestCase):
 		self.assertRaises(TypeError, Timer, None)
 		self.assertRaises(ValueError, Timer, float('nan'))
 
+	def test_slots(self):
+		timer = Timer()
+		self.assertFalse(hasattr(timer, '__dict__'))
+		self.assertRaises(AttributeError, setattr, timer, 'x', 1)
+		self.assertIs(weakref.ref(timer)(), timer)
+
+	def test_pickle(self):
+		for timer in (Timer(10), Timer(10, listen=False)):
+			for clone in (pickle.loads(pickle.dumps(timer)), copy.deepcopy(timer)):
+				self.assertLessEqual(clone.remaining(), 10)
+				request()
+				self.assertEqual(clone.expired(), timer.expired())
+				reset()
+
 	def test_default_no_time_limit(self):
 		"Test that the default time limit is None."
 		s = Timer()
@@ -135,3 +157,124 @@ class TestTimer(unittest.TestCase):
 			else:
 				signal.setitimer(signal.ITIMER_REAL, 0, 0)
 			signal.signal(signal.SIGALRM, prev_handler)
+
+	def test_bad_poll_every(self):
+		self.assertRaises(TypeError, Timer, poll_every=1.0)
+		self.assertRaises(TypeError, Timer, poll_every=True)
+		self.assertRaises(ValueError, Timer, poll_every=0)
+		self.assertRaises(ValueError, Timer, poll_every=-1)
+
+	def test_poll_every(self):
+		# The first call always checks.
+		self.assertTrue(Timer(0, poll_every=100).expired())
+
+		# Requests are noticed within poll_every calls.
+		s = Timer(poll_every=3)
+		self.assertFalse(s.expired())
+		request()
+		self.assertFalse(s.expired())
+		self.assertFalse(s.expired())
+		self.assertTrue(s.expired())
+		# Once expired, every call checks, so resetting takes effect at once.
+		self.assertTrue(s.expired())
+		reset()
+		self.assertFalse(s.expired())
+
+		# Time limits are noticed within poll_every calls.
+		s = Timer(self.time_limit, poll_every=2)
+		self.assertFalse(s.expired())
+		time.sleep(self.time_limit)
+		self.assertFalse(s.expired())
+		self.assertTrue(s.expired())
+
+		# Restarting makes the next call check.
+		s.start(self.time_limit)
+		self.assertFalse(s.expired())
+		s.start(0)
+		self.assertTrue(s.expired())
+
+		# Stopping fixes the result regardless of the countdown.
+		s = Timer(0, poll_every=10)
+		s.stop()
+		self.assertTrue(s.expired())
+		s = Timer(poll_every=10)
+		self.assertFalse(s.expired())
+		s.stop()
+		self.assertFalse(s.expired())
+
+	def test_wait(self):
+		# Waits until the time limit
+		s = Timer(self.time_limit)
+		self.assertTrue(s.wait())
+		self.assertLessEqual(s.remaining(), 0)
+
+		# Gives up after the timeout
+		s = Timer()
+		self.assertFalse(s.wait(self.time_limit))
+		self.assertFalse(s.expired())
+
+		# Returns as soon as shut down is requested
+		s = Timer(poll_every=10)
+		self.assertFalse(s.expired())
+		timer = threading.Timer(self.time_limit, request)
+		timer.start()
+		start = time.monotonic()
+		try:
+			self.assertTrue(s.wait())
+		finally:
+			timer.join()
+		self.assertLess(time.monotonic() - start, 5)
+		self.assertTrue(s.expired())  # No countdown after wait
+		reset()
+
+		# Stopped timers don't wait
+		s = Timer(10)
+		s.stop()
+		self.assertFalse(s.wait())
+
+	def test_token(self):
+		self.assertRaises(TypeError, Timer, token=object())
+		token = Token()
+		s = Timer(token=token)
+		t = Timer()
+		token.request()
+		self.assertTrue(s.expired())
+		self.assertTrue(s.wait())
+		self.assertFalse(t.expired())
+		token.reset()
+		self.assertFalse(s.expired())
+		request()
+		self.assertTrue(s.expired())
+
+	def test_listen(self):
+		self.assertRaises(ValueError, Timer, token=Token(), listen=False)
+		s = Timer(listen=False)
+		request()
+		self.assertFalse(s.expired())
+		self.assertEqual(s.remaining(), float('inf'))
+		s = Timer(self.time_limit, listen=False)
+		self.assertGreater(s.remaining(), 0)
+		self.assertTrue(s.wait())
+		self.assertLessEqual(s.remaining(), 0)
+		self.assertFalse(Timer(listen=False).wait(self.time_limit))
+
+	def test_clock(self):
+		self.assertRaises(TypeError, Timer, clock=1.0)
+		now = [100.0]
+		s = Timer(10, clock=lambda: now[0])
+		self.assertEqual(s.remaining(), 10)
+		now[0] += 4
+		self.assertEqual(s.remaining(), 6)
+		self.assertFalse(s.expired())
+		now[0] += 6
+		self.assertTrue(s.expired())
+		self.assertEqual(s.stop(), 10)
+		s.start(1)
+		self.assertEqual(s.remaining(), 1)
+
+	def test_process_time(self):
+		s = Timer(10, clock=time.process_time)
+		time.sleep(self.time_limit * 10)
+		# Sleeping takes (almost) no CPU time.
+		self.assertGreater(s.remaining(), 9)
+		self.assertLess(s.stop(), self.time_limit * 10)
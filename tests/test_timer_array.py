@@ -0,0 +1,145 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import time
+import unittest
+from unittest import mock
+
+from wrapitup import request, reset, TimerArray, Token
+from wrapitup import _timer_array
+
+
+class TestTimerArray(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_bad_limits(self):
+		self.assertRaises(TypeError, TimerArray, ['1'])
+		self.assertRaises(ValueError, TimerArray, [1, float('nan')])
+		timers = TimerArray()
+		self.assertRaises(TypeError, timers.append, None)
+		self.assertRaises(ValueError, timers.start, None, float('nan'))
+		self.assertEqual(len(timers), 0)
+		self.assertRaises(ValueError, TimerArray, token=Token(), listen=False)
+		self.assertRaises(TypeError, TimerArray, token=object())
+
+	def test_append_extend(self):
+		timers = TimerArray([1, 2])
+		self.assertEqual(timers.append(3), 2)
+		self.assertEqual(timers.extend([4, 5]), range(3, 5))
+		self.assertEqual(len(timers), 5)
+		self.assertEqual(list(timers.expired()), [False] * 5)
+
+	def test_empty(self):
+		timers = TimerArray()
+		self.assertEqual(list(timers.remaining()), [])
+		self.assertEqual(list(timers.expired()), [])
+		self.assertEqual(list(timers.stop()), [])
+		timers.start()
+
+	def test_remaining_expired(self):
+		timers = TimerArray([0, 10, float('inf')])
+		remaining = list(timers.remaining())
+		self.assertLessEqual(remaining[0], 0)
+		self.assertAlmostEqual(remaining[1], 10, places=1)
+		self.assertEqual(remaining[2], float('inf'))
+		self.assertEqual(list(timers.expired()), [True, False, False])
+		self.assertEqual(list(timers.expired([2, 0])), [False, True])
+		self.assertEqual(len(timers.remaining([1])), 1)
+
+	def test_request(self):
+		timers = TimerArray([10, 10])
+		request()
+		self.assertEqual(list(timers.remaining()), [0.0, 0.0])
+		self.assertEqual(list(timers.expired()), [True, True])
+		reset()
+		self.assertEqual(list(timers.expired()), [False, False])
+
+	def test_listen_false_and_token(self):
+		token = Token()
+		ignoring = TimerArray([10], listen=False)
+		listening = TimerArray([10], token=token)
+		request()
+		self.assertEqual(list(ignoring.expired()), [False])
+		self.assertEqual(list(listening.expired()), [True])
+		reset()
+		token.request()
+		self.assertEqual(list(ignoring.expired()), [False])
+		self.assertEqual(list(listening.expired()), [True])
+
+	def test_stop(self):
+		timers = TimerArray([10, 0, 10])
+		time.sleep(0.001)
+		first = list(timers.stop([0, 1]))
+		self.assertTrue(all(t > 0 for t in first))
+		time.sleep(0.001)
+		# Stopping again returns the same running times.
+		self.assertEqual(list(timers.stop([1, 0])), first[::-1])
+		self.assertEqual(list(timers.remaining()[:2]), [0.0, 0.0])
+		request()
+		self.assertEqual(list(timers.expired()), [False, True, True])
+		timers.stop([2])
+		reset()
+		# Stopped timers remember whether a shut down was requested.
+		self.assertEqual(list(timers.expired()), [False, True, True])
+
+	def test_start(self):
+		timers = TimerArray([0, 0])
+		timers.stop()
+		timers.start([1], 10)
+		self.assertEqual(list(timers.expired()), [True, False])
+		self.assertAlmostEqual(timers.remaining()[1], 10, places=1)
+		timers.start()
+		self.assertEqual(list(timers.remaining()), [float('inf')] * 2)
+
+	def test_clock(self):
+		self.assertRaises(TypeError, TimerArray, clock=None)
+		now = [0.0]
+		timers = TimerArray([1, 2], clock=lambda: now[0])
+		now[0] = 1.5
+		self.assertEqual(list(timers.remaining()), [-0.5, 0.5])
+		self.assertEqual(list(timers.expired()), [True, False])
+		self.assertEqual(list(timers.stop()), [1.5, 1.5])
+
+
+class TestTimerArrayWithoutNumPy(TestTimerArray):
+
+	def setUp(self):
+		super().setUp()
+		patcher = mock.patch.object(_timer_array, 'numpy', None)
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+	def test_result_types(self):
+		timers = TimerArray([1])
+		self.assertEqual(timers.remaining().typecode, 'd')
+		self.assertEqual(timers.stop().typecode, 'd')
+		self.assertEqual(timers.expired().typecode, 'B')
+
+
+@unittest.skipIf(_timer_array.numpy is None, 'Requires NumPy')
+class TestTimerArrayWithNumPy(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_result_types(self):
+		numpy = _timer_array.numpy
+		timers = TimerArray([0, 10, 10])
+		self.assertIsInstance(timers.remaining(), numpy.ndarray)
+		self.assertIsInstance(timers.stop([2]), numpy.ndarray)
+		expired = timers.expired()
+		self.assertIsInstance(expired, numpy.ndarray)
+		self.assertEqual(expired.dtype, numpy.bool_)
+		self.assertEqual(list(expired), [True, False, False])
+
+	def test_numpy_indices(self):
+		numpy = _timer_array.numpy
+		timers = TimerArray([0, 10, 0])
+		mask = numpy.array([True, False, True])
+		self.assertEqual(list(timers.expired(mask)), [True, True])
+		self.assertEqual(list(timers.expired(numpy.array([1]))), [False])
+		timers.start(mask, 10)
+		self.assertEqual(list(timers.expired()), [False] * 3)
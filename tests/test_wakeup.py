@@ -0,0 +1,78 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import os
+import selectors
+import signal
+import threading
+import unittest
+
+from wrapitup import catch_signals, request, reset, Token, WakeupFD
+from wrapitup import _requests
+
+
+class TestWakeupFD(unittest.TestCase):
+
+	def setUp(self):
+		super().setUp()
+		self.selector = selectors.DefaultSelector()
+		self.addCleanup(self.selector.close)
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def readable(self, wakeup, timeout=0):
+		key = self.selector.register(wakeup, selectors.EVENT_READ)
+		try:
+			return bool(self.selector.select(timeout))
+		finally:
+			self.selector.unregister(key.fileobj)
+
+	def test_request_makes_readable(self):
+		with WakeupFD() as wakeup:
+			self.assertFalse(self.readable(wakeup))
+			request()
+			request()
+			self.assertTrue(self.readable(wakeup))
+			reset()
+			self.assertTrue(self.readable(wakeup))  # Until drained
+			wakeup.drain()
+			self.assertFalse(self.readable(wakeup))
+			wakeup.drain()  # Idempotent
+
+	def test_already_requested(self):
+		request()
+		with WakeupFD() as wakeup:
+			self.assertTrue(self.readable(wakeup))
+
+	def test_request_from_thread_wakes_select(self):
+		with WakeupFD() as wakeup:
+			timer = threading.Timer(0.01, request)
+			timer.start()
+			try:
+				self.assertTrue(self.readable(wakeup, timeout=10))
+			finally:
+				timer.join()
+
+	def test_token(self):
+		token = Token()
+		with WakeupFD(token) as wakeup:
+			Token().request()
+			self.assertFalse(self.readable(wakeup))
+			token.request()
+			self.assertTrue(self.readable(wakeup))
+
+	@unittest.skipIf(os.name != 'posix', 'Requires SIGUSR1')
+	def test_signal(self):
+		with WakeupFD() as wakeup, self.assertLogs('wrapitup'):
+			with catch_signals(signals=[signal.SIGUSR1]):
+				os.kill(os.getpid(), signal.SIGUSR1)
+				self.assertTrue(self.readable(wakeup))
+
+	def test_close(self):
+		wakeup = WakeupFD()
+		self.assertIn(wakeup._notify, _requests._callbacks)
+		wakeup.close()
+		wakeup.close()
+		self.assertNotIn(wakeup._notify, _requests._callbacks)
+		request()  # Doesn't write to a closed descriptor.
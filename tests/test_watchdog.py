@@ -0,0 +1,62 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+import os
+import unittest
+from unittest import mock
+
+from wrapitup import reset, requested, sleep, ResourceWatchdog, Token
+from wrapitup import _watchdog
+
+
+@unittest.skipUnless(os.path.exists('/proc/self/statm'), 'needs /proc')
+class TestResourceWatchdog(unittest.TestCase):
+
+	def tearDown(self):
+		reset()
+		super().tearDown()
+
+	def test_samplers(self):
+		self.assertGreater(_watchdog._rss(), 0)
+		with open(os.devnull):
+			before = _watchdog._open_fds()
+			self.assertGreater(before, 2)
+		self.assertEqual(_watchdog._open_fds(), before - 1)
+		self.assertGreaterEqual(_watchdog._load(), 0)
+
+	def test_bad_arguments(self):
+		self.assertRaisesRegex(ValueError, 'No limits', ResourceWatchdog)
+		self.assertRaisesRegex(
+			ValueError, 'interval', ResourceWatchdog, max_fds=1, interval=0)
+		with mock.patch.object(_watchdog, '_load', return_value=None):
+			self.assertRaisesRegex(
+				ValueError, 'load average', ResourceWatchdog, max_load=1)
+
+	def test_requests_shut_down(self):
+		with self.assertLogs('wrapitup') as logs:
+			with ResourceWatchdog(max_rss=1, interval=0.001) as watchdog:
+				self.assertTrue(sleep(10))
+		self.assertRegex(
+			watchdog.reason, r'^RSS bytes at \d+ exceeds limit of 1$')
+		self.assertIn(watchdog.reason, logs.output[0])
+
+	def test_within_limits(self):
+		with ResourceWatchdog(
+			max_rss=2**62, max_fds=2**30, max_load=1e9, interval=0.001
+		) as watchdog:
+			self.assertFalse(sleep(0.05))
+		self.assertIsNone(watchdog.reason)
+		self.assertFalse(watchdog._thread.is_alive())
+
+	def test_token_and_resume_after_reset(self):
+		token = Token()
+		load = [0.0]
+		with mock.patch.object(_watchdog, '_load', lambda: load[0]):
+			with self.assertLogs('wrapitup') as logs:
+				with ResourceWatchdog(max_load=4, interval=0.001, token=token):
+					load[0] = 5.0
+					self.assertTrue(token.wait(10))
+					self.assertFalse(requested())
+					token.reset()
+					self.assertTrue(token.wait(10))
+		self.assertGreaterEqual(len(logs.output), 2)
+		self.assertIn('load average at 5.0 exceeds limit of 4', logs.output[0])
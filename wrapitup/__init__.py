@@ -9,10 +9,32 @@ occasionally. Scripts can also pass listeners time limits, which the listeners
 can track with :class:`Timer` instances; since those instances also check for
 requests to shut down, listeners can encapsulate all their listening directly
 via :class:`Timer`'s :meth:`Timer.remaining` and :meth:`Timer.expired` methods.
+Listeners with nothing to do can block in :func:`sleep` or :meth:`Timer.wait`,
+which return as soon as a shut down is requested. To shut down only part of a
+process, create a :class:`Token` for each part and pass it to the part's
+:class:`Timer`\ s. Programs juggling thousands of timers can have a
+:class:`Scheduler` call them back when each expires, or keep them in a
+:class:`TimerArray` to check them all at once. A
+:class:`ShutdownAwareExecutor` stops a :mod:`concurrent.futures` pool from
+starting new work once a shut down is requested, and :class:`ShutdownHooks`
+runs clean-up functions concurrently in dependency order within a time limit.
 
 Scripts can allow users to interrupt listeners using :mod:`signal`\ s or Ctrl+C
 via :func:`catch_signals`. It returns a context manager inside of which the
-receipt of specified signals triggers :func:`request`.
+receipt of specified signals triggers :func:`request`. To bound how long a shut
+down can take, :func:`catch_signals_escalating` moves through time-limited
+:class:`Phase`\ s with each further signal or missed deadline. A
+:class:`ResourceWatchdog` calls :func:`request` when memory, file descriptors,
+or load run short. An :class:`Interrupter` raises an exception in enrolled
+threads that ignore a shut down for too long. :class:`ChildProcesses` forwards
+caught signals to subprocesses and waits for them all to exit. A
+:class:`SystemdNotifier` keeps systemd informed while the process drains.
+
+Coroutines can await :func:`wait_requested` instead of polling, and
+:mod:`asyncio` programs can catch signals in their event loop with
+:func:`catch_signals_async`. A :class:`deadline` block cancels its task when
+a :class:`Timer` expires or a shut down is requested. Other event loops can
+watch a :class:`WakeupFD`.
 
 Example
 ^^^^^^^
@@ -48,21 +70,49 @@ break out of the :keyword:`for` loop, upon the earlier of
 #. the time limit having run out or
 #. the process receiving a Ctrl+C or similar signal.
 
+:func:`iterate` packages up this loop, checking the timer only once per batch
+of items. For vectorized work, :func:`chunked` slices the data into chunks sized
+to fit the time remaining.
+
 .. note::
 
 	The request API --- :func:`request`, :func:`requested`, and :func:`reset`
 	--- is thread safe, but :func:`catch_signals` must be called from the `main
 	thread only <https://docs.python.org/3/library/signal.html#signals-and-
 	threads>`_. :class:`Timer` instances require external synchronization if you
-	want to rely on their timing features.
+	want to rely on their timing features. Requests reach only the calling
+	process unless a :class:`SharedFlag` is installed.
 """
 
 
+from wrapitup._asyncio import wait_requested, catch_signals_async, deadline
 from wrapitup._catch_signals import catch_signals
-from wrapitup._requests import request, reset, requested
+from wrapitup._children import ChildProcesses, ChildExit
+from wrapitup._chunked import chunked
+from wrapitup._escalate import catch_signals_escalating, Phase
+from wrapitup._executor import ShutdownAwareExecutor, DrainReport
+from wrapitup._hooks import ShutdownHooks, HookResult
+from wrapitup._interrupt import Interrupter, Interrupted
+from wrapitup._iterate import iterate
+from wrapitup._latency import Histogram, LatencyRecorder
+from wrapitup._profiler import PollProfiler, SiteProfile
+from wrapitup._requests import request, reset, requested, sleep, Token
+from wrapitup._scheduler import Scheduler
+from wrapitup._shared import SharedFlag
+from wrapitup._stuck import StuckListenerDetector
+from wrapitup._systemd import SystemdNotifier
 from wrapitup._version import __version__
+from wrapitup._wakeup import WakeupFD
+from wrapitup._watchdog import ResourceWatchdog
 from wrapitup._timer import Timer
+from wrapitup._timer_array import TimerArray
 
 
 __all__ = [
-	'request', 'reset', 'requested', 'catch_signals', 'Timer', '__version__']
+	'request', 'reset', 'requested', 'sleep', 'Token', 'catch_signals', 'Timer',
+	'iterate', 'chunked', 'SharedFlag', 'Scheduler', 'ShutdownAwareExecutor',
+	'DrainReport', 'wait_requested', 'catch_signals_async', 'WakeupFD',
+	'LatencyRecorder', 'Histogram', 'catch_signals_escalating', 'Phase',
+	'TimerArray', 'ResourceWatchdog', 'StuckListenerDetector', 'PollProfiler',
+	'SiteProfile', 'deadline', 'Interrupter', 'Interrupted', 'ChildProcesses',
+	'ChildExit', 'ShutdownHooks', 'HookResult', 'SystemdNotifier', '__version__']
@@ -0,0 +1,315 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the asyncio API."""
+
+import asyncio
+import signal
+from types import FrameType, TracebackType
+import typing
+import weakref
+
+from wrapitup import _requests
+from wrapitup._catch_signals import (
+	catch_signals, _ExcType, _signal_hooks)
+from wrapitup._requests import request, Token
+from wrapitup._timer import Timer, _token_of
+
+
+__all__ = ['wait_requested', 'catch_signals_async', 'deadline']
+
+
+async def wait_requested(token: typing.Optional[Token] = None) -> None:
+	"""Wait until a shut down is requested.
+
+	The returned awaitable finishes within one iteration of the event loop after
+	:func:`request` is called, whether from a coroutine, another thread, or a
+	signal handler, without polling. If a shut down has already been requested,
+	it finishes immediately.
+
+	.. note::
+
+		If a :class:`SharedFlag` is installed, only requests made in the waiting
+		process wake the waiter. Requests from other processes are not noticed.
+
+	:param token: The :class:`Token` whose requests to wait for. The default,
+		used if the argument is :const:`None`, waits for :func:`request`.
+
+	.. versionadded:: 0.4.0
+	"""
+	if token is None:
+		token = _requests._root
+	if token.requested():
+		return
+	loop = asyncio.get_event_loop()
+	future = loop.create_future()
+
+	def wake() -> None:
+		try:
+			loop.call_soon_threadsafe(_set_done, future)
+		except RuntimeError:  # pragma: no cover
+			pass  # The loop is closed, so nobody is waiting anymore.
+
+	already = token._add_callback(wake)
+	try:
+		if not already:
+			await future
+	finally:
+		token._remove_callback(wake)
+
+
+def _set_done(future: 'asyncio.Future[None]') -> None:
+	if not future.done():
+		future.set_result(None)
+
+
+# A handler that catch_signals_async installed in loop.
+_LoopHandler = typing.NamedTuple('_LoopHandler', [
+	('loop', asyncio.AbstractEventLoop),
+	('function', typing.Callable[[signal.Signals], None]),
+])
+
+
+# The handlers catch_signals_async most recently installed in each loop.
+_loop_handlers = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary
+
+
+class catch_signals_async(catch_signals):
+	"""Return a context manager to catch signals in an :mod:`asyncio` event loop.
+
+	:func:`catch_signals_async` works like :func:`catch_signals`, except that it
+	installs its handlers with :meth:`loop.add_signal_handler
+	<asyncio.loop.add_signal_handler>` instead of :func:`signal.signal`. Thus
+	``callback`` runs as an ordinary callback in the event loop rather than
+	inside a signal handler, and its ``stack_frame`` argument is always
+	:const:`None`. Use it as either a :keyword:`with` or an :keyword:`async
+	with` block inside a coroutine running in the main thread.
+
+	On exit, :func:`catch_signals_async` restores the handlers installed before
+	it, whether they were installed with :func:`signal.signal` or by an
+	enclosing :func:`catch_signals_async` in the same loop.
+
+	Availability: Unix.
+
+	:param signals: Same as for :func:`catch_signals`.
+	:param callback: Same as for :func:`catch_signals`.
+	:param loop: The event loop in which to install the handlers. The default,
+		used if the argument is :const:`None`, is the current event loop as of
+		entry into the context manager.
+	:raises KeyError: Same as for :func:`catch_signals`.
+	:raises TypeError: Same as for :func:`catch_signals`.
+	:raises ValueError: Same as for :func:`catch_signals`.
+	:raises RuntimeError: On entry, if called from a thread other than the
+		main thread.
+	:return: A context manager to use in a :keyword:`with` or :keyword:`async
+		with` block.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		signals: typing.Iterable[
+			typing.Union[signal.Signals, int, str]] = catch_signals._DEFAULT_SIGS,
+		callback: typing.Optional[
+			typing.Callable[[signal.Signals, typing.Optional[FrameType]], None]] = None,
+		loop: typing.Optional[asyncio.AbstractEventLoop] = None,
+	):
+		super().__init__(signals, callback)
+		self._loop = loop
+		self._loops = []  # type: typing.List[asyncio.AbstractEventLoop]
+
+	def __enter__(self) -> None:
+		"""Install signal handlers and log at :const:`logging.INFO` level."""
+		self._loops.append(self._loop or asyncio.get_event_loop())
+		try:
+			super().__enter__()
+		except BaseException:
+			self._loops.pop()
+			raise
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> bool:
+		"""Uninstall signal handlers if that has not already happened."""
+		try:
+			return super().__exit__(exc_type, exc_value, traceback)
+		finally:
+			self._loops.pop()
+
+	async def __aenter__(self) -> None:
+		"""Do the same as :meth:`__enter__`."""
+		self.__enter__()
+
+	async def __aexit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> bool:
+		"""Do the same as :meth:`__exit__`."""
+		return self.__exit__(exc_type, exc_value, traceback)
+
+	def _install_handler(
+		self,
+		intended_signal: signal.Signals,
+		callback: typing.Callable[[signal.Signals, FrameType], None],
+	) -> typing.Any:
+		"""Install shutdown handler for ``intended_signal`` & return its old handler.
+
+		Must be called from the main thread.
+		"""
+		loop = self._loops[-1]
+
+		def handler(signum: signal.Signals) -> None:
+			for hook in tuple(_signal_hooks):
+				hook(signum)
+			request()
+			self._clear_signal_handlers()
+			callback(signum, None)  # type: ignore
+
+		handlers = _loop_handlers.setdefault(loop, {})
+		old = handlers.get(intended_signal)  # type: typing.Any
+		if old is None:
+			old = signal.getsignal(intended_signal)
+		loop.add_signal_handler(intended_signal, handler, intended_signal)
+		handlers[intended_signal] = _LoopHandler(loop, handler)
+		return old
+
+	def _restore_handler(
+		self,
+		signum: signal.Signals,
+		old_handler: typing.Any,
+	) -> None:
+		"""Reinstall ``old_handler``, which :meth:`_install_handler` returned."""
+		loop = self._loops[-1]
+		handlers = _loop_handlers.get(loop, {})
+		if isinstance(old_handler, _LoopHandler):
+			loop.add_signal_handler(signum, old_handler.function, signum)
+			handlers[signum] = old_handler
+		else:
+			loop.remove_signal_handler(signum)
+			handlers.pop(signum, None)
+			signal.signal(signum, old_handler)
+
+
+class deadline:
+	"""Return an asynchronous context manager that enforces ``timer``.
+
+	Inside an :keyword:`async with` block, :func:`deadline` cancels the task
+	running the block as soon as ``timer`` expires or, if ``timer`` listens for
+	requests to shut down, as soon as one is requested, even while the task is
+	stuck in an :keyword:`await`. The block then exits cleanly: the
+	:exc:`asyncio.CancelledError` does not propagate, and the context manager's
+	:attr:`expired` attribute becomes :const:`True`.
+
+	.. code-block:: python
+
+		async def handle(request):
+			async with wrapitup.deadline(wrapitup.Timer(30)) as scope:
+				response = await backend(request)
+			if scope.expired:
+				response = TIMED_OUT
+			...
+
+	Each block schedules a single callback with :meth:`loop.call_later
+	<asyncio.loop.call_later>` for the time remaining on ``timer`` at entry, so
+	it does not poll, and thousands of concurrent blocks cost little. Restarting
+	``timer`` inside the block does not move the deadline. If a shut down is
+	already requested, or ``timer`` has already expired, the task is cancelled
+	at its first :keyword:`await` in the block, and a block that never awaits
+	runs to completion.
+
+	On Python before 3.11, a cancellation from elsewhere that arrives during the
+	block is absorbed as if it were the deadline's.
+
+	.. attribute:: expired
+
+		Whether the block ended because ``timer`` expired or a shut down was
+		requested.
+
+	:param Timer timer: The time limit for the block.
+	:raises RuntimeError: On entry, if not called from inside a task.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, timer: Timer):
+		self._timer = timer
+		self.expired = False
+		self._task = None  # type: typing.Optional[asyncio.Task]
+		self._loop = None  # type: typing.Optional[asyncio.AbstractEventLoop]
+		self._handle = None  # type: typing.Optional[asyncio.Handle]
+		self._token = None  # type: typing.Optional[Token]
+		self._cancelled = False
+		self._active = False
+
+	async def __aenter__(self) -> 'deadline':
+		"""Schedule the cancellation and return the context manager itself."""
+		if self._active:
+			raise RuntimeError('deadline is not reentrant')
+		loop = asyncio.get_event_loop()
+		current_task = getattr(asyncio, 'current_task', None)
+		if current_task is None:  # pragma: no cover
+			task = getattr(asyncio.Task, 'current_task')(loop)  # Python < 3.7
+		else:
+			task = current_task(loop)
+		if task is None:
+			raise RuntimeError('deadline must be used inside a task')
+		self._task, self._loop = task, loop
+		self.expired = self._cancelled = False
+		self._active = True
+		self._token = _token_of(self._timer)
+		if self._token is not None:
+			self._token._add_callback(self._on_request)
+		remaining = self._timer.remaining()
+		if remaining <= 0:
+			# Not right away: if the block never awaits, the cancellation would
+			# hit the task's next await after the block.
+			self._handle = loop.call_soon(self._cancel)
+		else:
+			self._handle = loop.call_later(remaining, self._cancel)
+		return self
+
+	async def __aexit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> bool:
+		"""Stop the deadline, and absorb the cancellation if it caused one."""
+		self._active = False
+		if self._handle is not None:
+			self._handle.cancel()
+			self._handle = None
+		if self._token is not None:
+			self._token._remove_callback(self._on_request)
+		if not self._cancelled:
+			return False
+		task = self._task
+		if hasattr(task, 'uncancel'):
+			# Python 3.11+: withdraw our cancellation, and let others through.
+			others = task.uncancel()  # type: ignore
+		else:  # pragma: no cover
+			others = 0
+		if exc_type is asyncio.CancelledError and not others:
+			self.expired = True
+			return True
+		return False
+
+	def _cancel(self) -> None:
+		"""Cancel the task unless the block has exited or already cancelled."""
+		if self._active and not self._cancelled:
+			self._cancelled = True
+			assert self._task is not None
+			self._task.cancel()
+
+	def _on_request(self) -> None:
+		"""Cancel the task from any thread. :func:`request` calls this."""
+		assert self._loop is not None
+		try:
+			self._loop.call_soon_threadsafe(self._cancel)
+		except RuntimeError:  # pragma: no cover
+			pass  # The loop is closed, so the block is gone.
@@ -6,12 +6,21 @@
 from inspect import Parameter, signature
 import os
 import logging
+import queue
 import signal
+import threading
 from types import FrameType, TracebackType
 import typing
 
 from wrapitup._requests import request, reset, requested
 
+try:
+	# signal.getsignal converts SIG_DFL and SIG_IGN to enums, which costs more
+	# than the lookup itself. Nested scopes only need to know whether _dispatch
+	# is installed.
+	from _signal import getsignal as _getsignal  # type: ignore[import-not-found]
+except ImportError:  # pragma: no cover
+	_getsignal = signal.getsignal
 
 __all__ = ['catch_signals']
 
@@ -23,7 +32,134 @@ _HandlerType = typing.Union[
 	signal.Handlers,
 	None
 ]
-_HandlersListType = typing.List[typing.Dict[signal.Signals, _HandlerType]]
+# Values are whatever catch_signals._install_handler returns.
+_HandlersListType = typing.List[typing.Dict[signal.Signals, typing.Any]]
+# Called with the signal first thing in every handler catch_signals installs.
+_signal_hooks = []  # type: typing.List[typing.Callable[[signal.Signals], None]]
+
+
+# Callbacks that catch_signals(dispatch_thread=True) deferred from its signal
+# handlers, for _dispatcher to call, with their arguments and their
+# catch_signals's list of escaped exceptions. SimpleQueue.put is safe to call
+# from signal handlers. Queue.put, the fallback for Python < 3.7, is not: it
+# takes a lock, so a signal that arrives while the main thread is inside
+# Queue.put deadlocks.
+_deferred = getattr(queue, 'SimpleQueue', queue.Queue)()  # type: typing.Any
+_dispatcher = None  # type: typing.Optional[threading.Thread]
+_dispatcher_lock = threading.Lock()
+# Seconds between checks that the dispatcher is still alive while flushing.
+_FLUSH_POLL = 0.1
+
+
+def _start_dispatcher() -> None:
+	"""Start the thread that calls deferred callbacks, if not yet running."""
+	global _dispatcher
+	with _dispatcher_lock:
+		if _dispatcher is None or not _dispatcher.is_alive():
+			_dispatcher = threading.Thread(
+				target=_run_deferred, name='wrapitup.catch_signals', daemon=True)
+			_dispatcher.start()
+
+
+def _run_deferred() -> None:
+	while True:
+		callback, args, escaped = _deferred.get()
+		try:
+			callback(*args)
+		except Exception:
+			_LOG.exception('Signal callback %r failed', callback)
+		except BaseException as e:
+			# Don't let sys.exit() and the like kill the dispatcher.
+			escaped.append(e)
+
+
+def _flush_deferred(escaped: typing.List[BaseException]) -> None:
+	"""Wait until the dispatcher has called every callback deferred so far.
+
+	Then raise the first exception other than an :exc:`Exception` that any of
+	them raised into ``escaped``, if any.
+	"""
+	done = threading.Event()
+	_deferred.put((done.set, (), escaped))
+	while not done.wait(_FLUSH_POLL):
+		_start_dispatcher()  # In case it died anyway.
+	if escaped:
+		first = escaped[0]
+		del escaped[:]
+		raise first
+
+
+class _Scope:
+	"""One catch_signals scope's handler for one signal, as _dispatch sees it."""
+
+	__slots__ = ('handler', 'previous')
+
+	def __init__(
+		self,
+		handler: typing.Callable[[signal.Signals, FrameType], None],
+		previous: _HandlerType,
+	):
+		self.handler = handler
+		# What _getsignal returned when the scope was entered. If it is
+		# _dispatch, the scope below this one on the stack is the previous handler.
+		self.previous = previous
+
+
+# For each signal, the scopes that _dispatch multiplexes, innermost last.
+# No need for a lock because signals can only be set from the main thread.
+_scopes = {}  # type: typing.Dict[signal.Signals, typing.List[_Scope]]
+
+
+def _dispatch(signum: int, stack_frame: FrameType) -> None:
+	"""Call the innermost scope's handler. catch_signals installs only this."""
+	scopes = _scopes.get(signal.Signals(signum))
+	# If there are no scopes, someone reinstalled _dispatch after all the scopes
+	# exited, so there is nothing to do.
+	if scopes:
+		scopes[-1].handler(signal.Signals(signum), stack_frame)
+
+
+def _push_scope(
+	signum: signal.Signals,
+	handler: typing.Callable[[signal.Signals, FrameType], None],
+) -> _Scope:
+	"""Make ``handler`` the innermost handler for ``signum``.
+
+	Only installs :func:`_dispatch` with :func:`signal.signal` if something else
+	is installed, so entering nested scopes makes no system calls.
+	"""
+	if threading.current_thread() is not threading.main_thread():
+		raise ValueError('signal only works in main thread')
+	previous = _getsignal(signum)
+	if previous is not _dispatch:
+		signal.signal(signum, _dispatch)
+	scope = _Scope(handler, previous)
+	_scopes.setdefault(signum, []).append(scope)
+	return scope
+
+
+def _remove_scope(signum: signal.Signals, scope: _Scope) -> None:
+	"""Remove ``scope`` from ``signum``'s stack, restoring its previous handler.
+
+	Only calls :func:`signal.signal` if ``scope`` was innermost, and either the
+	handler installed before it was not :func:`_dispatch`, or code in its block
+	replaced :func:`_dispatch`.
+	"""
+	scopes = _scopes[signum]
+	index = scopes.index(scope)
+	del scopes[index]
+	if not scopes:
+		del _scopes[signum]
+	if index < len(scopes):
+		# The scope above falls back to whatever scope fell back to.
+		if scopes[index].previous is _dispatch:
+			scopes[index].previous = scope.previous
+	elif scope.previous is not _dispatch:
+		signal.signal(signum, scope.previous)
+	elif _getsignal(signum) is not _dispatch:
+		# Code in the block installed its own handler. The enclosing scope needs
+		# its signals back.
+		signal.signal(signum, _dispatch)
 
 
 def _two_pos_args(f: typing.Callable) -> typing.Union[int, float]:
@@ -72,6 +208,12 @@ class catch_signals:
 	However, keep in mind that signals and the state of :func:`requested` are
 	global.
 
+	All :func:`catch_signals` blocks share one signal handler, which passes each
+	signal to the innermost block listening for it. Only the outermost block
+	calls :func:`signal.signal`, so entering and exiting nested blocks is cheap.
+	A block entered after something other than :func:`catch_signals` replaced
+	the shared handler installs it again, and restores that handler on exit.
+
 	Availability: Unix (including macOS and Linux), Windows.
 
 	.. note::
@@ -117,6 +259,21 @@ class catch_signals:
 		:class:`signal.Signals` first. The default, used if the argument is
 		:const:`None`, logs the event at the :const:`logging.WARNING` level to
 		the logger whose name is this module's :const:`__package__`.
+	:param bool dispatch_thread: Whether to call ``callback`` from a dedicated
+		thread instead of the signal handler. The handler then only calls
+		:func:`request`, restores the previous handlers, and queues the call,
+		so the main thread resumes sooner and cannot deadlock on a lock, such
+		as the :mod:`logging` module's, that it held when the signal arrived.
+		:class:`Exception`\ s that ``callback`` raises are logged rather than
+		propagated. Exiting the :keyword:`with` block waits for queued calls to
+		finish, and then raises any other exception, such as the
+		:exc:`SystemExit` from :func:`sys.exit`, that one of them raised.
+		Hooks that run on every caught signal, such as
+		:class:`ChildProcesses`'s forwarding, and callbacks that
+		:func:`request` runs, such as :class:`WakeupFD`'s, still run in the
+		handler. On Python before 3.7, queuing the call takes a lock, so a
+		signal that arrives while the main thread is queuing another can
+		deadlock.
 	:raises KeyError: If the :mod:`signal` module does not recognize a string
 		signal name in ``signals``.
 	:raises TypeError: If ``callback`` isn't a callable taking two positional
@@ -135,6 +292,12 @@ class catch_signals:
 
 	.. versionchanged:: 0.3.0
 		:func:`catch_signals` became reentrant and reusable.
+
+	.. versionchanged:: 0.4.0
+		Nested blocks share one signal handler.
+
+	.. versionadded:: 0.4.0
+		The *dispatch_thread* parameter.
 	"""
 
 	# SIGINT is generally what happens when you hit Ctrl+C.
@@ -159,6 +322,8 @@ class catch_signals:
 			typing.Union[signal.Signals, int, str]] = _DEFAULT_SIGS,
 		callback: typing.Optional[
 			typing.Callable[[signal.Signals, typing.Optional[FrameType]], None]] = None,
+		*,
+		dispatch_thread: bool = False
 	):
 		signals = list(signals)
 		signals_tmp = []  # type: typing.List[signal.Signals]
@@ -184,13 +349,22 @@ class catch_signals:
 				raise ValueError(
 					"Windows does not support one of the signals: %r" % (signals,))
 		self._signals = tuple(signals_tmp)  # type: typing.Tuple[signal.Signals, ...]
-		self._callback = callback
+		# Exceptions other than Exception, such as SystemExit, that callbacks
+		# raised on the dispatcher, for __exit__ to raise in the main thread.
+		self._escaped = []  # type: typing.List[BaseException]
+		if dispatch_thread:
+			self._callback = self._deferrer(callback, self._escaped)
+		else:
+			self._callback = callback
+		self._dispatch_thread = dispatch_thread
 		# No need for a lock because signals can only be set from the main thread.
 		self._old_handlers = []  # type: _HandlersListType
 		self._depth = 0
 
 	def __enter__(self) -> None:
 		"""Install signal handlers and log at :const:`logging.INFO` level."""
+		if self._dispatch_thread:
+			_start_dispatcher()
 		self._old_handlers.append({})
 		self._depth += 1
 		names = []  # type: typing.List[str]
@@ -211,11 +385,15 @@ class catch_signals:
 	) -> bool:
 		"""Uninstall signal handlers if that has not already happened."""
 		self._clear_signal_handlers()
-		self._depth -= 1
-		if self._old_requested:
-			request()
-		else:
-			reset()
+		try:
+			if self._dispatch_thread:
+				_flush_deferred(self._escaped)
+		finally:
+			self._depth -= 1
+			if self._old_requested:
+				request()
+			else:
+				reset()
 		return False
 
 	def _clear_signal_handlers(self) -> None:
@@ -228,26 +406,63 @@ class catch_signals:
 			return
 		old_handlers = self._old_handlers[-1]
 		for signum, old_handler in old_handlers.copy().items():
-			signal.signal(signum, old_handler)
+			self._restore_handler(signum, old_handler)
 			del old_handlers[signum]
 		self._old_handlers.pop()
 
+	def _restore_handler(
+		self,
+		signum: signal.Signals,
+		old_handler: typing.Any,
+	) -> None:
+		"""Undo :meth:`_install_handler`, given what it returned."""
+		_remove_scope(signum, old_handler)
+
 	def _install_handler(
 		self,
 		intended_signal: signal.Signals,
 		callback: typing.Callable[[signal.Signals, FrameType], None],
-	) -> _HandlerType:
-		"""Install shutdown handler for ``intended_signal`` & return its old handler.
+	) -> typing.Any:
+		"""Install shutdown handler for ``intended_signal``.
 
-		Must be called from the main thread.
+		Return what :meth:`_restore_handler` needs to uninstall it. Must be called
+		from the main thread.
 		"""
+		return _push_scope(
+			intended_signal, self._make_handler(intended_signal, callback))
+
+	def _make_handler(
+		self,
+		intended_signal: signal.Signals,
+		callback: typing.Callable[[signal.Signals, FrameType], None],
+	) -> typing.Callable[[signal.Signals, FrameType], None]:
+		"""Return the shutdown handler for ``intended_signal``."""
 		def handler(signum: signal.Signals, stack_frame: FrameType) -> None:
 			signum = signal.Signals(signum)
 			assert signum == intended_signal
+			for hook in tuple(_signal_hooks):
+				hook(signum)
 			request()
 			self._clear_signal_handlers()
 			callback(signum, stack_frame)
-		return signal.signal(intended_signal, handler)
+		return handler
+
+	@staticmethod
+	def _deferrer(
+		callback: typing.Callable[[signal.Signals, typing.Optional[FrameType]], None],
+		escaped: typing.List[BaseException],
+	) -> typing.Callable[[signal.Signals, typing.Optional[FrameType]], None]:
+		"""Return a callback that queues ``callback`` for the dispatcher.
+
+		The dispatcher appends exceptions other than :exc:`Exception` that
+		``callback`` raises to ``escaped``.
+		"""
+		def defer(
+			signum: signal.Signals,
+			stack_frame: typing.Optional[FrameType]
+		) -> None:
+			_deferred.put((callback, (signum, stack_frame), escaped))
+		return defer
 
 	def _default_callback(
 		self,
@@ -0,0 +1,345 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the child process registry."""
+
+import errno
+import logging
+import math
+import os
+import select
+import signal
+import subprocess
+import threading
+from time import monotonic, sleep
+from types import TracebackType
+import typing
+
+from wrapitup import _catch_signals
+from wrapitup._timer import Timer, _budget
+
+
+__all__ = ['ChildProcesses', 'ChildExit']
+
+_LOG = logging.getLogger(__package__)
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+# Linux 5.3+ and Python 3.9+. Tests replace it with None to use the fallback.
+_pidfd_open = getattr(os, 'pidfd_open', None)
+# Bounds on the fallback's sleeps between checking every child.
+_MIN_POLL = 0.001
+_MAX_POLL = 0.05
+# Longest timeout, in seconds, that poll's C int of milliseconds can hold.
+_MAX_TIMEOUT = (2**31 - 1) / 1000
+
+
+ChildExit = typing.NamedTuple('ChildExit', [
+	('pid', int),
+	('returncode', typing.Optional[int]),
+	('latency', typing.Optional[float]),
+	('killed', bool),
+])
+ChildExit.__doc__ = """How a child process exited while draining.
+
+.. attribute:: pid
+
+	The child's process ID.
+
+.. attribute:: returncode
+
+	The child's exit status, or the negative of the signal that terminated it,
+	as in :attr:`subprocess.Popen.returncode`. :const:`None` if the child did
+	not exit even after :data:`~signal.SIGKILL`, or if its status was collected
+	elsewhere.
+
+.. attribute:: latency
+
+	Seconds from the first signal forwarded to the child, or from the start of
+	draining if none was, until the child was seen to exit. :const:`None` if it
+	did not exit.
+
+.. attribute:: killed
+
+	Whether the child was sent :data:`~signal.SIGKILL` for running out of time.
+
+.. versionadded:: 0.4.0
+"""
+
+
+class _Child:
+	__slots__ = ('pid', 'popen', 'pgid', 'signalled')
+
+	def __init__(
+		self,
+		pid: int,
+		popen: typing.Optional[subprocess.Popen],
+		pgid: typing.Optional[int],
+	):
+		self.pid = pid
+		self.popen = popen
+		self.pgid = pgid
+		self.signalled = None  # type: typing.Optional[float]
+
+	def kill(self, signum: int) -> None:
+		"""Send ``signum`` to the child or its process group, if still alive."""
+		try:
+			if self.pgid is not None:
+				os.killpg(self.pgid, signum)
+			elif self.popen is not None:
+				self.popen.send_signal(signum)
+			else:
+				os.kill(self.pid, signum)
+		except ProcessLookupError:
+			pass
+
+	def reap(self) -> typing.Tuple[bool, typing.Optional[int]]:
+		"""Return whether the child exited, and if so, its return code."""
+		if self.popen is not None:
+			returncode = self.popen.poll()
+			return returncode is not None, returncode
+		try:
+			pid, status = os.waitpid(self.pid, os.WNOHANG)
+		except ChildProcessError:
+			return True, None  # Reaped elsewhere.
+		if not pid:
+			return False, None
+		if os.WIFSIGNALED(status):
+			return True, -os.WTERMSIG(status)
+		return True, os.WEXITSTATUS(status)
+
+
+class ChildProcesses:
+	"""Forward signals to child processes, and wait for them all to exit.
+
+	:meth:`register` child processes, and install the registry with
+	:meth:`install` or a ``with`` statement. Then every signal that
+	:func:`catch_signals` catches is also sent to each registered child, or to
+	its process group. Call :meth:`drain` to wait for all the children to exit
+	at once, up to a time limit, then kill any stragglers with
+	:data:`~signal.SIGKILL` and learn how long each took.
+
+	.. code-block:: python
+
+		children = wrapitup.ChildProcesses()
+		for command in commands:
+			children.register(subprocess.Popen(command))
+		with children, wrapitup.catch_signals(signals=[signal.SIGTERM]):
+			supervise()
+		for child in children.drain(30):
+			print(child.pid, child.returncode, child.latency)
+
+	On Linux 5.3 and later with Python 3.9 and later, :meth:`drain` waits on a
+	:func:`pidfd <os.pidfd_open>` per child, so it notices each exit as it
+	happens. Elsewhere it checks every child without blocking, sleeping between
+	rounds for a little longer each time, up to 50 milliseconds.
+
+	Availability: Unix.
+
+	:param float kill_timeout: Seconds :meth:`drain` waits for children to exit
+		after killing them.
+	:raises ValueError: if ``kill_timeout`` is negative.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, *, kill_timeout: float = 5.0):
+		if kill_timeout < 0:
+			raise ValueError(
+				'kill_timeout must not be negative: %r' % (kill_timeout,))
+		self._kill_timeout = kill_timeout
+		# Reentrant because the signal hook may run while the main thread holds
+		# the lock.
+		self._lock = threading.RLock()
+		self._children = {}  # type: typing.Dict[int, _Child]
+		self._installed = False
+
+	def register(
+		self,
+		child: typing.Union[subprocess.Popen, int],
+		*,
+		group: bool = False
+	) -> None:
+		"""Forward signals to ``child`` and include it in :meth:`drain`.
+
+		:param child: A :class:`subprocess.Popen`, or the process ID of a child
+			of this process.
+		:param bool group: Whether to send signals to the child's process group
+			instead of just the child, e.g., if it was started with
+			``start_new_session=True``. :meth:`drain` still waits only for the
+			child itself.
+		:raises ValueError: if ``child`` is already registered, or if ``group``
+			is true and ``child`` is in this process's own process group, which
+			would forward signals back to this process.
+		:raises ProcessLookupError: if ``group`` is true and ``child`` has
+			already exited.
+		"""
+		popen = None  # type: typing.Optional[subprocess.Popen]
+		if isinstance(child, subprocess.Popen):
+			pid, popen = child.pid, child
+		else:
+			pid = child
+		pgid = os.getpgid(pid) if group else None
+		if pgid is not None and pgid == os.getpgrp():
+			raise ValueError(
+				'Child %d shares process group %d with this process' % (pid, pgid))
+		with self._lock:
+			if pid in self._children:
+				raise ValueError('Child %d is already registered' % pid)
+			self._children[pid] = _Child(pid, popen, pgid)
+
+	def unregister(self, child: typing.Union[subprocess.Popen, int]) -> None:
+		"""Stop forwarding signals to ``child`` and leave it out of :meth:`drain`.
+
+		:raises KeyError: if ``child`` is not registered.
+		"""
+		pid = child.pid if isinstance(child, subprocess.Popen) else child
+		with self._lock:
+			del self._children[pid]
+
+	def install(self) -> None:
+		"""Start forwarding the signals :func:`catch_signals` catches.
+
+		:raises RuntimeError: if already installed.
+		"""
+		if self._installed:
+			raise RuntimeError('ChildProcesses is already installed')
+		_catch_signals._signal_hooks.append(self.send_signal)
+		self._installed = True
+
+	def uninstall(self) -> None:
+		"""Stop forwarding signals.
+
+		:raises RuntimeError: if not installed.
+		"""
+		if not self._installed:
+			raise RuntimeError('ChildProcesses is not installed')
+		_catch_signals._signal_hooks.remove(self.send_signal)
+		self._installed = False
+
+	def __enter__(self) -> 'ChildProcesses':
+		"""Call :meth:`install` and return the registry itself."""
+		self.install()
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Call :meth:`uninstall`."""
+		self.uninstall()
+
+	def send_signal(self, signum: int) -> None:
+		"""Send ``signum`` to every registered child or process group.
+
+		Safe to call from a signal handler.
+		"""
+		now = monotonic()
+		for child in tuple(self._children.values()):
+			if child.signalled is None:
+				child.signalled = now
+			child.kill(signum)
+
+	def drain(
+		self,
+		limit: typing.Union[Timer, float, None] = None,
+		signum: typing.Optional[int] = None,
+	) -> typing.List[ChildExit]:
+		"""Wait for every registered child to exit, and kill those that do not.
+
+		Children that exit, or are found to have already exited, are
+		unregistered. Killed children that still do not exit within
+		``kill_timeout`` seconds are reported with a ``returncode`` of
+		:const:`None` and stay registered.
+
+		:param limit: How long to wait before killing the remaining children,
+			in seconds, or a :class:`Timer` to share with the rest of the shut
+			down. The default, used if the argument is :const:`None`, waits until
+			all children exit.
+		:param signum: A signal to :meth:`send_signal` before waiting, such as
+			:data:`signal.SIGTERM`, if the children have not been told to exit.
+		:return: A :class:`ChildExit` per child, in the order they exited.
+		"""
+		start = monotonic()
+		if signum is not None:
+			self.send_signal(signum)
+		with self._lock:
+			pending = dict(self._children)
+		exits = []  # type: typing.List[ChildExit]
+		self._wait(pending, exits, _budget(limit).remaining, start, False)
+		if pending:
+			_LOG.warning(
+				'Killing %d child processes that did not exit in time. '
+				'(Process %d.)', len(pending), os.getpid())
+			for child in pending.values():
+				child.kill(signal.SIGKILL)
+			kill_deadline = monotonic() + self._kill_timeout
+			self._wait(
+				pending, exits, lambda: kill_deadline - monotonic(), start, True)
+			exits.extend(
+				ChildExit(pid=pid, returncode=None, latency=None, killed=True)
+				for pid in pending)
+		with self._lock:
+			for child_exit in exits:
+				if child_exit.latency is not None:
+					self._children.pop(child_exit.pid, None)
+		return exits
+
+	def _wait(
+		self,
+		pending: typing.Dict[int, _Child],
+		exits: typing.List[ChildExit],
+		remaining: typing.Callable[[], float],
+		start: float,
+		killed: bool,
+	) -> None:
+		"""Move children from ``pending`` to ``exits`` as they exit."""
+
+		def reap(child: _Child) -> bool:
+			exited, returncode = child.reap()
+			if exited:
+				del pending[child.pid]
+				since = start if child.signalled is None else child.signalled
+				exits.append(ChildExit(
+					pid=child.pid, returncode=returncode,
+					latency=monotonic() - since, killed=killed))
+			return exited
+
+		fds = {}  # type: typing.Dict[int, _Child]
+		try:
+			for child in list(pending.values()):
+				if reap(child) or _pidfd_open is None:
+					continue
+				try:
+					fds[_pidfd_open(child.pid)] = child
+				except ProcessLookupError:
+					reap(child)  # Exited and reaped elsewhere in the meantime.
+				except OSError as e:  # pragma: no cover
+					if e.errno not in (errno.ENOSYS, errno.EPERM):
+						raise
+					break  # Kernel too old, or forbidden. Poll instead.
+			if pending and len(fds) == len(pending):
+				poller = select.poll()
+				for fd in fds:
+					poller.register(fd, select.POLLIN)
+				while pending:
+					timeout = remaining()
+					if timeout <= 0:
+						return
+					# Longer timeouts take more rounds.
+					ready = poller.poll(math.ceil(min(timeout, _MAX_TIMEOUT) * 1000))
+					for fd, _ in ready:
+						if reap(fds[fd]):
+							poller.unregister(fd)
+				return
+			delay = _MIN_POLL
+			while pending:
+				for child in list(pending.values()):
+					reap(child)
+				timeout = remaining()
+				if not pending or timeout <= 0:
+					return
+				sleep(min(delay, timeout))
+				delay = min(delay * 2, _MAX_POLL)
+		finally:
+			for fd in fds:
+				os.close(fd)
@@ -0,0 +1,127 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the deadline-aware chunking API."""
+
+from math import floor, isnan
+import typing
+
+from wrapitup._timer import Timer, _clock_of
+
+
+__all__ = ['chunked']
+
+_S = typing.TypeVar('_S', bound=typing.Sequence)
+
+
+class chunked(typing.Generic[_S]):
+	"""Slice ``sequence`` into chunks sized to fit the time ``timer`` has left.
+
+	For vectorized work, big chunks are fast, but a chunk that is too big
+	overruns the time limit. :func:`chunked` measures how long the loop body
+	takes per item, i.e., the time between yielding a chunk and being asked for
+	the next one, and sizes each chunk to fill ``safety`` times
+	:meth:`Timer.remaining`. Chunks at most double in size each time, so one
+	misleadingly fast chunk cannot cause a huge overrun. The last chunk before
+	the deadline shrinks to fit, and iteration stops once not even one item
+	fits, when ``timer`` expires, or when ``sequence`` runs out.
+
+	.. code-block:: python
+
+		chunks = wrapitup.chunked(array, timer)
+		for chunk in chunks:
+			results.append(vectorized_work(chunk))
+		if chunks.stopped:
+			log.info('Ran out of time after %d rows', chunks.count)
+
+	:param sequence: Any sequence that supports :func:`len` and slicing, such as
+		a :class:`list` or a NumPy array. Chunks are slices of it.
+	:param timer: The :class:`Timer` whose budget to fit in. The default, used
+		if the argument is :const:`None`, is a new :class:`Timer` without a time
+		limit, so chunks grow up to ``max_size`` and iteration stops early only if
+		a shut down is requested.
+	:param int initial_size: The size of the first chunk, which measures the
+		throughput.
+	:param max_size: The largest chunk to yield, or :const:`None` for no limit.
+	:param float safety: Fraction of the remaining time to plan to use, to
+		leave slack for variation in throughput.
+	:raises ValueError: if ``initial_size`` or ``max_size`` is less than 1, or
+		if ``safety`` is not between 0 (exclusive) and 1 (inclusive).
+	:return: An iterable with attributes :attr:`count` and :attr:`stopped`.
+
+	.. attribute:: count
+
+		How many items the chunks yielded so far contain.
+
+	.. attribute:: stopped
+
+		Whether iteration ended before ``sequence`` ran out.
+
+	.. attribute:: seconds_per_item
+
+		The current estimate of the loop body's time per item, or :const:`None`
+		before the first chunk is done.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	#: Weight of the newest chunk in the moving average of time per item.
+	smoothing = 0.5
+
+	def __init__(
+		self,
+		sequence: _S,
+		timer: typing.Optional[Timer] = None,
+		initial_size: int = 1,
+		max_size: typing.Optional[int] = None,
+		safety: float = 0.9,
+	):
+		if initial_size < 1:
+			raise ValueError('initial_size must be at least 1: %r' % (initial_size,))
+		if max_size is not None and max_size < 1:
+			raise ValueError('max_size must be at least 1: %r' % (max_size,))
+		if isnan(safety) or not 0 < safety <= 1:
+			raise ValueError('safety must be in (0, 1]: %r' % (safety,))
+		self._sequence = sequence
+		self._timer = Timer() if timer is None else timer
+		self._initial_size = initial_size
+		self._max_size = float('inf') if max_size is None else max_size
+		self._safety = safety
+		self.count = 0
+		self.stopped = False
+		self.seconds_per_item = None  # type: typing.Optional[float]
+
+	def _next_size(self, previous: int) -> float:
+		"""Return how many items fit in the remaining time. Possibly zero."""
+		if self.seconds_per_item is None:
+			return min(self._initial_size, self._max_size)
+		limit = min(2 * previous, self._max_size)
+		if self.seconds_per_item <= 0:
+			return limit
+		fit = self._timer.remaining() * self._safety / self.seconds_per_item
+		if fit >= limit:
+			return limit
+		return max(floor(fit), 0)
+
+	def __iter__(self) -> typing.Iterator[_S]:
+		"""Yield successive slices of ``sequence``."""
+		total = len(self._sequence)
+		clock = _clock_of(self._timer)
+		size = 0
+		while self.count < total:
+			if self._timer.expired():
+				self.stopped = True
+				return
+			size = int(min(self._next_size(size), total - self.count))
+			if size < 1:
+				self.stopped = True
+				return
+			start = self.count
+			self.count += size
+			began = clock()
+			yield self._sequence[start:self.count]  # type: ignore
+			per_item = (clock() - began) / size
+			if self.seconds_per_item is None:
+				self.seconds_per_item = per_item
+			else:
+				self.seconds_per_item += self.smoothing * (
+					per_item - self.seconds_per_item)
@@ -0,0 +1,271 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement multi-phase escalating shut down."""
+
+import os
+import signal
+import threading
+from types import FrameType, TracebackType
+import typing
+
+from wrapitup import _requests
+from wrapitup._catch_signals import (
+	catch_signals, _ExcType, _LOG, _signal_hooks)
+from wrapitup._requests import request, requested
+from wrapitup._timer import Timer
+
+
+__all__ = ['catch_signals_escalating', 'Phase']
+
+
+Phase = typing.NamedTuple('Phase', [
+	('name', str),
+	('limit', float),
+	('action', typing.Optional[typing.Callable[[], None]]),
+])
+Phase.__new__.__defaults__ = (None,)
+Phase.__doc__ = """One phase of an escalating shut down.
+
+.. attribute:: name
+
+	The phase's name, for :meth:`catch_signals_escalating.reached` and logging.
+
+.. attribute:: limit
+
+	How many seconds the phase may last before the next one begins.
+
+.. attribute:: action
+
+	Called with no arguments when the phase begins, or :const:`None`. Optional.
+
+.. versionadded:: 0.4.0
+"""
+
+
+class catch_signals_escalating(catch_signals):
+	r"""Return a context manager that escalates shut down with each signal.
+
+	Where :func:`catch_signals` handles only the first signal and then restores
+	the old handlers, :func:`catch_signals_escalating` keeps its handlers
+	installed until the :keyword:`with` block exits, and moves through
+	``phases`` one at a time. The first phase begins when one of ``signals``
+	arrives or :func:`request` is called, and calls :func:`request` if
+	necessary. Each subsequent phase begins when another signal arrives or the
+	current phase's time limit runs out, whichever comes first. When the last
+	phase ends the same way, the process exits immediately via :func:`os._exit`
+	with status ``exit_code``. Thus the sum of the phases' limits bounds the
+	time between the first signal and the process's exit.
+
+	.. code-block:: python
+
+		with wrapitup.catch_signals_escalating([
+			wrapitup.Phase('drain', 30),
+			wrapitup.Phase('abort', 5, abort_current_batch),
+			wrapitup.Phase('exit', 1, flush_logs),
+		]) as escalation:
+			for batch in batches:
+				for item in batch:
+					if escalation.reached('abort'):
+						break
+					...
+				if wrapitup.requested():
+					break
+
+	Each phase's :attr:`~Phase.action` runs in the thread that started the
+	phase: the main thread, inside the signal handler, if a signal started it,
+	or a background thread if :func:`request` or a time limit started it. Each
+	phase's beginning is logged at the :const:`logging.WARNING` level to the
+	logger whose name is this module's :const:`__package__`.
+
+	Entrance to the context manager returns the context manager itself. Unlike
+	:func:`catch_signals`, :func:`catch_signals_escalating` is reusable but not
+	reentrant.
+
+	:param phases: A non-empty sequence of :class:`Phase`\ s, or of tuples
+		to convert to :class:`Phase`\ s.
+	:param signals: Same as for :func:`catch_signals`.
+	:param callback: Same as for :func:`catch_signals`, except that it is
+		called for every signal, and the default does nothing because every
+		phase's beginning is logged anyway.
+	:param int exit_code: The exit status when the last phase ends.
+	:raises KeyError: Same as for :func:`catch_signals`.
+	:raises TypeError: Same as for :func:`catch_signals`.
+	:raises ValueError: Same as for :func:`catch_signals`, or if ``phases`` is
+		empty or has duplicate names.
+	:raises RuntimeError: On entrance, if the context manager is already in use.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		phases: typing.Iterable[typing.Union[Phase, typing.Tuple]],
+		signals: typing.Iterable[
+			typing.Union[signal.Signals, int, str]] = catch_signals._DEFAULT_SIGS,
+		callback: typing.Optional[
+			typing.Callable[[signal.Signals, typing.Optional[FrameType]], None]] = None,
+		exit_code: int = 1,
+	):
+		super().__init__(signals, callback)
+		self._phases = tuple(Phase(*phase) for phase in phases)
+		if not self._phases:
+			raise ValueError('No phases')
+		names = [phase.name for phase in self._phases]
+		if len(set(names)) != len(names):
+			raise ValueError('Duplicate phase names: %r' % (names,))
+		self._exit_code = exit_code
+		# Reentrant because signal handlers may advance the phase in the main
+		# thread while it already holds the lock.
+		self._cond = threading.Condition(threading.RLock())
+		self._index = -1
+		self._timer = None  # type: typing.Optional[Timer]
+		# Whether request() was called since the block began.
+		self._requested = False
+		self._watchdog = None  # type: typing.Optional[threading.Thread]
+
+	@property
+	def phase(self) -> typing.Optional[Phase]:
+		"""The current phase, or :const:`None` before the first phase."""
+		index = self._index
+		return self._phases[index] if index >= 0 else None
+
+	@property
+	def timer(self) -> typing.Optional[Timer]:
+		"""The current phase's :class:`Timer`, or :const:`None` before it.
+
+		The timer does not listen for requests to shut down, so its
+		:meth:`Timer.remaining` is the time left in the current phase.
+		"""
+		return self._timer
+
+	def reached(self, name: str) -> bool:
+		"""Return whether the phase called ``name`` or a later one has begun.
+
+		:raises KeyError: if no phase is called ``name``.
+		"""
+		for index, phase in enumerate(self._phases):
+			if phase.name == name:
+				return self._index >= index
+		raise KeyError(name)
+
+	def __enter__(self) -> 'catch_signals_escalating':  # type: ignore
+		"""Install signal handlers and log at :const:`logging.INFO` level."""
+		if self._depth:
+			raise RuntimeError('catch_signals_escalating is not reentrant')
+		with self._cond:
+			self._index = -1
+			self._timer = None
+			self._requested = False
+			# Before installing the handlers, which need it to begin phases.
+			self._watchdog = threading.Thread(
+				target=self._watch, name='wrapitup.catch_signals_escalating',
+				daemon=True)
+			self._watchdog.start()
+		try:
+			super().__enter__()
+		except BaseException:
+			self._stop_watchdog()
+			raise
+		if _requests._root._add_callback(self._on_request):
+			self._on_request()
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> bool:
+		"""Stop escalating and uninstall signal handlers."""
+		_requests._root._remove_callback(self._on_request)
+		self._stop_watchdog()
+		return super().__exit__(exc_type, exc_value, traceback)
+
+	def _stop_watchdog(self) -> None:
+		"""Stop the background thread, and wait for it unless it is this one."""
+		with self._cond:
+			watchdog, self._watchdog = self._watchdog, None
+			self._timer = None
+			self._cond.notify_all()
+		if watchdog is not None and watchdog is not threading.current_thread():
+			watchdog.join()
+
+	def _make_handler(
+		self,
+		intended_signal: signal.Signals,
+		callback: typing.Callable[[signal.Signals, FrameType], None],
+	) -> typing.Callable[[signal.Signals, FrameType], None]:
+		"""Return the escalation handler for ``intended_signal``."""
+		def handler(signum: signal.Signals, stack_frame: FrameType) -> None:
+			signum = signal.Signals(signum)
+			for hook in tuple(_signal_hooks):
+				hook(signum)
+			self._advance(self._index)
+			callback(signum, stack_frame)
+		return handler
+
+	def _default_callback(
+		self,
+		signum: signal.Signals,
+		stack_frame: typing.Optional[FrameType]
+	) -> None:
+		"""Do nothing, since :meth:`_advance` logs every phase."""
+
+	def _on_request(self) -> None:
+		"""Have the background thread begin the first phase.
+
+		:func:`request` calls this while it holds the lock guarding the token
+		tree, possibly in a signal handler, so the phase's action, which may do
+		anything, must not run here.
+		"""
+		with self._cond:
+			self._requested = True
+			self._cond.notify_all()
+
+	def _advance(self, current: int) -> None:
+		"""Begin the phase after ``current`` unless another thread already did."""
+		with self._cond:
+			if self._index != current or self._index == len(self._phases) or (
+				self._watchdog is None
+			):
+				return
+			self._index += 1
+			if self._index == len(self._phases):
+				_LOG.critical(
+					'Shut down phases exhausted. Exiting immediately. (Process %d.)',
+					os.getpid())
+				self._cond.notify_all()
+				os._exit(self._exit_code)
+				return  # Only if os._exit is mocked.
+			phase = self._phases[self._index]
+			self._timer = Timer(phase.limit, listen=False)
+			self._cond.notify_all()
+		_LOG.warning(
+			'Commencing shut down phase %r, limited to %g seconds. (Process %d.)',
+			phase.name, phase.limit, os.getpid())
+		if not requested():
+			request()
+		if phase.action is not None:
+			phase.action()
+
+	def _watch(self) -> None:
+		"""Begin the first phase upon request, and the next when time runs out."""
+		me = threading.current_thread()
+		while True:
+			with self._cond:
+				while True:
+					if self._watchdog is not me or self._index == len(self._phases):
+						return
+					if self._index < 0:
+						if self._requested:
+							current = -1
+							break
+						self._cond.wait()
+						continue
+					assert self._timer is not None
+					remaining = self._timer.remaining()
+					if remaining <= 0:
+						current = self._index
+						break
+					self._cond.wait(min(remaining, threading.TIMEOUT_MAX))
+			self._advance(current)
@@ -0,0 +1,178 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the shutdown-aware executor API."""
+
+from concurrent import futures
+import math
+import threading
+import typing
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+from wrapitup._timer import Timer, _budget
+
+
+__all__ = ['ShutdownAwareExecutor', 'DrainReport']
+
+
+DrainReport = typing.NamedTuple('DrainReport', [
+	('cancelled', typing.List[futures.Future]),
+	('completed', typing.List[futures.Future]),
+	('abandoned', typing.List[futures.Future]),
+])
+DrainReport.__doc__ = """What happened to the futures when an executor drained.
+
+.. attribute:: cancelled
+
+	Futures cancelled before they started running.
+
+.. attribute:: completed
+
+	Futures that were running when the executor began draining, and finished
+	in time.
+
+.. attribute:: abandoned
+
+	Futures still running when the time limit ran out.
+
+.. versionadded:: 0.4.0
+"""
+
+
+class ShutdownAwareExecutor(futures.Executor):
+	"""Wrap a :class:`concurrent.futures.Executor` to stop work on shut down.
+
+	As soon as a shut down is requested, e.g., by a signal that
+	:func:`catch_signals` caught, the wrapper stops accepting new work, so
+	:meth:`submit` and :meth:`~concurrent.futures.Executor.map` raise
+	:exc:`RuntimeError`, and cancels every future that has not started
+	running. Call :meth:`drain` to wait for the futures already running, up to
+	a time limit, and learn which were abandoned.
+
+	.. code-block:: python
+
+		pool = wrapitup.ShutdownAwareExecutor(ThreadPoolExecutor(100))
+		with wrapitup.catch_signals():
+			results = pool.map(work, jobs)
+			...
+		report = pool.drain(30)
+		for future in report.abandoned:
+			...
+
+	Futures that a :class:`~concurrent.futures.ProcessPoolExecutor` already
+	sent to a worker process cannot be cancelled, so they count as running.
+
+	The wrapper owns ``executor``: shutting down the wrapper shuts down
+	``executor``.
+
+	:param executor: The executor to wrap.
+	:param token: The :class:`Token` whose requests to shut down to obey. The
+		default, used if the argument is :const:`None`, obeys :func:`request`.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		executor: futures.Executor,
+		token: typing.Optional[Token] = None,
+	):
+		self._executor = executor
+		self._token = _requests._root if token is None else token
+		# Reentrant because request() may call _on_request from a signal handler
+		# in a thread that already holds the lock.
+		self._lock = threading.RLock()
+		self._pending = set()  # type: typing.Set[futures.Future]
+		self._cancelled = []  # type: typing.List[futures.Future]
+		self._accepting = True
+		self._token._add_callback(self._on_request)
+
+	def submit(
+		self,
+		__fn: typing.Callable[..., typing.Any],
+		*args: typing.Any,
+		**kwargs: typing.Any
+	) -> futures.Future:
+		"""Schedule ``fn(*args, **kwargs)`` unless a shut down was requested.
+
+		Like :meth:`Executor.submit <concurrent.futures.Executor.submit>`, takes
+		``fn`` only positionally, so that ``kwargs`` may include ``fn``. Before
+		Python 3.8, the standard library's executors do not, so wrapping them
+		still rejects ``fn`` in ``kwargs``.
+
+		:raises RuntimeError: if a shut down was requested, or if the executor
+			was shut down or drained.
+		"""
+		with self._lock:
+			if not self._accepting or self._token.requested():
+				raise RuntimeError(
+					'cannot schedule new futures after a shut down request')
+			future = self._executor.submit(__fn, *args, **kwargs)
+			self._pending.add(future)
+		future.add_done_callback(self._discard)
+		return future
+
+	def drain(
+		self, limit: typing.Union[Timer, float, None] = None,
+	) -> DrainReport:
+		"""Stop accepting work, cancel pending work, & wait for running work.
+
+		Draining does not wait for a request to shut down; it starts shutting
+		down right away.
+
+		:param limit: How long to wait for running futures to finish, in
+			seconds, or a :class:`Timer` to share with the rest of the shut
+			down. The default, used if the argument is :const:`None`, waits until
+			all running futures finish.
+		:return: The futures cancelled since the executor was created, and the
+			futures that finished or were abandoned while draining.
+		"""
+		self._stop()
+		with self._lock:
+			running = list(self._pending)
+			cancelled = list(self._cancelled)
+		remaining = max(_budget(limit).remaining(), 0.0)
+		# futures.wait can't wait an infinite time.
+		timeout = None if math.isinf(remaining) else remaining
+		try:
+			done, not_done = futures.wait(running, timeout)
+		finally:
+			self._executor.shutdown(wait=False)
+		return DrainReport(
+			cancelled=cancelled,
+			completed=[f for f in running if f in done],
+			abandoned=[f for f in running if f in not_done])
+
+	def shutdown(self, wait: bool = True, **kwargs: typing.Any) -> None:
+		"""Stop accepting work and shut down the wrapped executor.
+
+		Unlike :meth:`drain`, pending futures are not cancelled unless a shut
+		down was requested. Keyword arguments are passed to the wrapped
+		executor's :meth:`~concurrent.futures.Executor.shutdown`.
+		"""
+		with self._lock:
+			self._accepting = False
+		self._unlisten()
+		self._executor.shutdown(wait=wait, **kwargs)
+
+	def _stop(self) -> None:
+		"""Stop accepting work and cancel pending futures."""
+		with self._lock:
+			self._accepting = False
+			pending = list(self._pending)
+		self._unlisten()
+		for future in pending:
+			if future.cancel():
+				with self._lock:
+					self._cancelled.append(future)
+
+	def _on_request(self) -> None:
+		"""Respond to a request to shut down. :func:`request` calls this."""
+		self._stop()
+
+	def _unlisten(self) -> None:
+		self._token._remove_callback(self._on_request)
+
+	def _discard(self, future: futures.Future) -> None:
+		with self._lock:
+			self._pending.discard(future)
@@ -0,0 +1,303 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the shut down hook runner."""
+
+import heapq
+import logging
+import math
+import os
+import queue
+import threading
+from time import monotonic
+import typing
+
+from wrapitup._timer import Timer, _budget
+
+
+__all__ = ['ShutdownHooks', 'HookResult']
+
+_LOG = logging.getLogger(__package__)
+_Hook = typing.Callable[[Timer], typing.Any]
+# A hook's duration and the exception it raised, if any.
+_Outcome = typing.Tuple[float, typing.Optional[BaseException]]
+
+
+HookResult = typing.NamedTuple('HookResult', [
+	('name', str),
+	('budget', typing.Optional[float]),
+	('duration', typing.Optional[float]),
+	('overran', bool),
+	('error', typing.Optional[BaseException]),
+])
+HookResult.__doc__ = """What happened to a hook when :class:`ShutdownHooks` ran.
+
+.. attribute:: name
+
+	The hook's name.
+
+.. attribute:: budget
+
+	Seconds the hook was allotted when it started, or :const:`None` if it never
+	started because the overall time limit ran out first.
+
+.. attribute:: duration
+
+	Seconds the hook ran, or :const:`None` if it was still running when the
+	overall time limit ran out, or never started.
+
+.. attribute:: overran
+
+	Whether the hook ran longer than its budget, or was still running when the
+	overall time limit ran out.
+
+.. attribute:: error
+
+	The exception the hook raised, or :const:`None`.
+
+.. versionadded:: 0.4.0
+"""
+
+
+class _Registration:
+	__slots__ = ('name', 'hook', 'after', 'priority', 'order')
+
+	def __init__(
+		self,
+		name: str,
+		hook: _Hook,
+		after: typing.Tuple[str, ...],
+		priority: int,
+		order: int,
+	):
+		self.name = name
+		self.hook = hook
+		self.after = after
+		self.priority = priority
+		self.order = order
+
+
+class ShutdownHooks:
+	"""Run clean-up functions concurrently, in dependency order, on a deadline.
+
+	:meth:`register` each hook with the names of the hooks it must run after,
+	then :meth:`run` them all within an overall :class:`Timer`.
+	Hooks run on a thread pool as soon as all their dependencies finish,
+	independent hooks concurrently, so the whole takes about as long as the
+	slowest chain of dependencies rather than the sum of all hooks. When more
+	hooks are ready than there are threads, those with higher ``priority`` start
+	first.
+
+	.. code-block:: python
+
+		hooks = wrapitup.ShutdownHooks()
+
+		@hooks.register
+		def flush_cache(timer):
+			cache.flush(timeout=timer.remaining())
+
+		@hooks.register(after=['flush_cache'], priority=10)
+		def commit_offsets(timer):
+			consumer.commit()
+
+		with wrapitup.catch_signals():
+			serve()
+		for result in hooks.run(25):
+			if result.overran:
+				...
+
+	Each hook receives a :class:`Timer`, which does not listen for requests to
+	shut down, holding its budget: when it starts, the time remaining on the
+	overall timer divided by the number of hooks in the longest chain of
+	dependents starting with it. Thus a hook that takes no more than its budget
+	leaves its dependents at least as much time each. Hooks are not stopped when
+	their budgets run out; :meth:`run` logs at the :const:`logging.WARNING`
+	level, to the logger whose name is this module's :const:`__package__`, which
+	hooks overran. When the overall timer expires, :meth:`run` starts no more
+	hooks and returns without waiting for those still running. Hooks run on
+	daemon threads, so those still running do not delay the interpreter's exit
+	either.
+
+	A hook that raises an exception, even one such as :exc:`SystemExit` that
+	does not derive from :exc:`Exception`, does not prevent its dependents from
+	running; the exception is logged and reported.
+
+	:param max_workers: The most hooks to run at once. The default, used if the
+		argument is :const:`None`, is the number of processors plus four, but no
+		more than 32, like :class:`~concurrent.futures.ThreadPoolExecutor`'s.
+	:raises ValueError: if ``max_workers`` is less than 1.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, max_workers: typing.Optional[int] = None):
+		if max_workers is None:
+			max_workers = min(32, (os.cpu_count() or 1) + 4)
+		if max_workers < 1:
+			raise ValueError('max_workers must be at least 1: %r' % (max_workers,))
+		self._max_workers = max_workers
+		self._hooks = {}  # type: typing.Dict[str, _Registration]
+
+	def register(
+		self,
+		hook: typing.Optional[_Hook] = None,
+		*,
+		name: typing.Optional[str] = None,
+		after: typing.Iterable[str] = (),
+		priority: int = 0
+	) -> typing.Any:
+		"""Add a hook. Use as a function or a decorator, with or without arguments.
+
+		:param hook: A callable taking a :class:`Timer` holding its budget.
+		:param name: The name other hooks use to depend on this one. The
+			default, used if the argument is :const:`None`, is the hook's
+			:attr:`~definition.__name__`.
+		:param after: Names of hooks that must finish before this one starts.
+			They need not be registered yet, but must be by the time
+			:meth:`run` is called.
+		:param int priority: Among hooks ready to start, those with higher
+			priority start first.
+		:return: ``hook``, or, if ``hook`` is :const:`None`, a decorator that
+			registers its argument and returns it.
+		:raises ValueError: if a hook of the same name is already registered.
+		"""
+		if hook is None:
+			return lambda hook: self.register(
+				hook, name=name, after=after, priority=priority)
+		if name is None:
+			name = getattr(hook, '__name__', None) or repr(hook)
+		if name in self._hooks:
+			raise ValueError('A hook named %r is already registered' % (name,))
+		self._hooks[name] = _Registration(
+			name, hook, tuple(after), priority, len(self._hooks))
+		return hook
+
+	def run(
+		self, limit: typing.Union[Timer, float, None] = None,
+	) -> typing.List[HookResult]:
+		"""Run every hook, and report how each went, in order of registration.
+
+		:param limit: How long to take in all, in seconds, or a :class:`Timer`
+			to share with the rest of the shut down. The default, used if the
+			argument is :const:`None`, waits for every hook and gives each an
+			infinite budget.
+		:raises ValueError: if a hook depends on a hook that is not registered,
+			or if dependencies form a cycle. No hook runs in that case.
+		"""
+		timer = _budget(limit)
+		hooks = self._hooks
+		dependents = {
+			name: [] for name in hooks}  # type: typing.Dict[str, typing.List[str]]
+		waiting_on = {}  # type: typing.Dict[str, int]
+		for registration in hooks.values():
+			for dependency in registration.after:
+				if dependency not in hooks:
+					raise ValueError('Hook %r depends on unregistered hook %r' % (
+						registration.name, dependency))
+				dependents[dependency].append(registration.name)
+			waiting_on[registration.name] = len(registration.after)
+		chains = _chain_lengths(dependents)
+		ready = [
+			(-r.priority, r.order, r.name)
+			for r in hooks.values() if not r.after]
+		heapq.heapify(ready)
+		budgets = {}  # type: typing.Dict[str, float]
+		outcomes = {}  # type: typing.Dict[str, _Outcome]
+		running = 0
+		# Hooks' names and outcomes, as they finish.
+		finished = queue.Queue()  # type: queue.Queue[typing.Tuple[str, _Outcome]]
+		while True:
+			while ready and running < self._max_workers and timer.remaining() > 0:
+				name = heapq.heappop(ready)[2]
+				budgets[name] = timer.remaining() / chains[name]
+				# Not a concurrent.futures executor, whose threads the interpreter
+				# joins at exit, so that overrunning hooks cannot block the exit.
+				threading.Thread(
+					target=_call,
+					args=(name, hooks[name].hook, budgets[name], finished.put),
+					name='wrapitup.ShutdownHooks', daemon=True).start()
+				running += 1
+			if not running:
+				break
+			timeout = None  # type: typing.Optional[float]
+			remaining = max(timer.remaining(), 0.0)
+			if not math.isinf(remaining):
+				timeout = min(remaining, threading.TIMEOUT_MAX)
+			try:
+				name, outcome = finished.get(True, timeout)
+			except queue.Empty:
+				break
+			outcomes[name] = outcome
+			running -= 1
+			for dependent in dependents[name]:
+				waiting_on[dependent] -= 1
+				if not waiting_on[dependent]:
+					registration = hooks[dependent]
+					heapq.heappush(ready, (
+						-registration.priority, registration.order, dependent))
+		results = []
+		for name in hooks:
+			budget = budgets.get(name)
+			duration, error = outcomes.get(name, (None, None))
+			results.append(HookResult(
+				name=name, budget=budget, duration=duration,
+				overran=(
+					budget is not None and (duration is None or duration > budget)),
+				error=error))
+		overran = [r.name for r in results if r.overran]
+		if overran:
+			_LOG.warning(
+				'Shut down hooks overran their budgets: %s. (Process %d.)',
+				', '.join(overran), os.getpid())
+		return results
+
+
+def _chain_lengths(
+	dependents: typing.Dict[str, typing.List[str]],
+) -> typing.Dict[str, int]:
+	"""Return how many hooks are in the longest chain starting with each hook.
+
+	:raises ValueError: if the dependencies form a cycle.
+	"""
+	lengths = {}  # type: typing.Dict[str, int]
+	for root in dependents:
+		if root in lengths:
+			continue
+		# A depth-first search without recursion, so that long chains cannot
+		# exceed the recursion limit. The stack holds the hooks being visited,
+		# each with its dependents yet to visit.
+		stack = [(root, iter(dependents[root]))]
+		visiting = {root}
+		while stack:
+			name, unvisited = stack[-1]
+			for dependent in unvisited:
+				if dependent in visiting:
+					raise ValueError('Hook %r depends on itself' % (dependent,))
+				if dependent not in lengths:
+					visiting.add(dependent)
+					stack.append((dependent, iter(dependents[dependent])))
+					break
+			else:
+				stack.pop()
+				visiting.discard(name)
+				lengths[name] = 1 + max(
+					(lengths[dependent] for dependent in dependents[name]), default=0)
+	return lengths
+
+
+def _call(
+	name: str,
+	hook: _Hook,
+	budget: float,
+	report: typing.Callable[[typing.Tuple[str, _Outcome]], None],
+) -> None:
+	"""Run ``hook`` with ``budget``. Report its duration and any exception."""
+	start = monotonic()
+	try:
+		hook(Timer(budget, listen=False))
+	except BaseException as e:
+		# Even SystemExit, which would end only this thread, must be reported, or
+		# run() would wait for the hook forever.
+		_LOG.exception('Shut down hook %r failed', hook)
+		report((name, (monotonic() - start, e)))
+	else:
+		report((name, (monotonic() - start, None)))
@@ -0,0 +1,327 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the thread interrupter."""
+
+import logging
+import os
+import queue
+import sys
+import threading
+from time import monotonic, sleep
+from types import FrameType, TracebackType
+import typing
+
+try:
+	import ctypes
+except ImportError:  # pragma: no cover
+	ctypes = None  # type: ignore
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+from wrapitup._timer import Timer
+
+
+__all__ = ['Interrupter', 'Interrupted']
+
+_LOG = logging.getLogger(__package__)
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+# Seconds to wait before retrying to interrupt threads entering or leaving.
+_RETRY = 0.001
+# Whether the interpreter can raise exceptions in other threads where the
+# block's handlers catch them. CPython 3.13 can raise them at the backward jump
+# that ends a loop, which no handler covers, so they escape the block.
+_SUPPORTED = hasattr(ctypes, 'pythonapi') and (
+	sys.implementation.name == 'cpython' and sys.version_info < (3, 13))
+
+
+class Interrupted(BaseException):
+	"""Raised in a thread enrolled with :meth:`Interrupter.enroll` to stop it.
+
+	Like :exc:`KeyboardInterrupt`, it derives from :exc:`BaseException` so that
+	``except Exception`` clauses in code that does not expect it let it through.
+
+	.. versionadded:: 0.4.0
+	"""
+
+
+def _set_async_exc(ident: int, exception: typing.Optional[type]) -> int:
+	"""Schedule ``exception`` in the thread ``ident``, or cancel if None."""
+	count = int(ctypes.pythonapi.PyThreadState_SetAsyncExc(
+		ctypes.c_ulong(ident),
+		None if exception is None else ctypes.py_object(exception)))
+	if count > 1:  # pragma: no cover
+		# The C API documents this as a bug; undo the damage.
+		ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident), None)
+		raise SystemError('PyThreadState_SetAsyncExc modified %d threads' % count)
+	return count
+
+
+class _Enrollment:
+	"""Context manager :meth:`Interrupter.enroll` returns.
+
+	The enrolled thread and the interrupter's thread each try to pop the
+	enrollment from :attr:`Interrupter._enrolled`, so exactly one of them wins
+	without a lock. Locks are unsafe here, because the exception could arrive
+	just after the enrolled thread acquired one, and then never release it.
+	"""
+
+	def __init__(self, interrupter: 'Interrupter'):
+		self._interrupter = interrupter
+		self._ident = None  # type: typing.Optional[int]
+		# Whether the interrupter's call to _set_async_exc returned.
+		self._delivered = False
+		self.interrupted = False
+
+	def __enter__(self) -> '_Enrollment':
+		interrupter = self._interrupter
+		if interrupter._closed:
+			raise RuntimeError('Interrupter is closed')
+		local = interrupter._local
+		if getattr(local, 'enrollment', None) in interrupter._enrolled:
+			raise RuntimeError('Thread is already enrolled')
+		self._ident = threading.get_ident()
+		self.interrupted = self._delivered = False
+		try:
+			local.enrollment = self
+			interrupter._enrolled[self] = self._ident
+			if interrupter._expired:
+				interrupter._wakeup.put(None)  # Interrupt the thread right away.
+		except BaseException:
+			# E.g., an enclosing block's exception arrived. Don't stay enrolled.
+			self._leave(None)
+			raise
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> bool:
+		self._leave(exc_type)
+		return self.interrupted and exc_type is self._interrupter._exception
+
+	def _leave(self, exc_type: typing.Optional[type]) -> None:
+		"""Unenroll, and make sure the exception does not arrive afterward."""
+		interrupter = self._interrupter
+		try:
+			if interrupter._enrolled.pop(self, None) is not None:
+				return  # The interrupter never will claim the block now.
+			if exc_type is interrupter._exception:
+				return  # It already arrived.
+			# The interrupter claimed the block, but its exception has yet to arrive.
+			while not self._delivered:
+				sleep(0)
+			assert self._ident is not None
+			_set_async_exc(self._ident, None)
+		except interrupter._exception:
+			pass  # It arrived just now, after the block.
+
+
+# The code of the methods during which an enrolled thread must not receive the
+# exception, because it would escape the block or leave the thread enrolled.
+_BUSY = frozenset([
+	_Enrollment.__enter__.__code__, _Enrollment.__exit__.__code__,
+	_Enrollment._leave.__code__])
+
+
+def _busy(frame: typing.Optional[FrameType]) -> bool:
+	"""Return whether the thread running ``frame`` is entering or leaving."""
+	while frame is not None:
+		if frame.f_code in _BUSY:
+			return True
+		frame = frame.f_back
+	return False
+
+
+class Interrupter:
+	"""Raise an exception in enrolled threads that ignore a shut down.
+
+	Some threads run code that never checks whether a shut down was requested,
+	such as a third-party library's CPU-bound loop. A thread can opt in to being
+	interrupted by running such code in a :meth:`enroll` block. When
+	:func:`request` is called, or ``timer`` expires, the interrupter waits
+	``grace`` seconds for the threads to leave their blocks on their own, and
+	then raises ``exception`` in every thread still enrolled, with
+	:c:func:`PyThreadState_SetAsyncExc`. The exception ends the block, which
+	absorbs it, so the thread carries on after the block.
+
+	.. code-block:: python
+
+		interrupter = wrapitup.Interrupter(grace=10)
+
+		def worker():
+			with interrupter.enroll() as enrollment:
+				third_party.fit(model)
+			if enrollment.interrupted:
+				...
+
+	The interrupter logs how many threads it interrupts at the
+	:const:`logging.WARNING` level, to the logger whose name is this module's
+	:const:`__package__`. Once the grace period ends, it also interrupts threads
+	as soon as they enroll, even after :func:`reset`; :meth:`close` it and make
+	a new one to start over.
+
+	The exception arrives only between Python bytecode instructions, so it
+	cannot interrupt a thread blocked in C code, such as one waiting for a lock
+	or a socket. It can arrive at any instruction in the block, so code in the
+	block should clean up in ``finally`` clauses or ``with`` statements, and it
+	can arrive as the block exits, in which case it propagates from the
+	``with`` statement.
+
+	:class:`Interrupter` instances are context managers that :meth:`close`
+	themselves on exit.
+
+	Availability: CPython 3.12 and earlier.
+
+	:param float grace: Seconds to wait after the request or the timer's expiry
+		before interrupting.
+	:param timer: A :class:`Timer` whose expiry also triggers interruption.
+	:param token: The :class:`Token` whose requests to shut down trigger
+		interruption. The default, used if the argument is :const:`None`, is the
+		root of the tree, which :func:`request` reaches.
+	:param exception: The exception class to raise. It must be a subclass of
+		:exc:`BaseException`.
+	:raises ValueError: if ``grace`` is negative.
+	:raises TypeError: if ``exception`` is not an exception class.
+	:raises RuntimeError: if the Python implementation cannot raise exceptions
+		in other threads where the block absorbs them.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		grace: float = 5.0,
+		*,
+		timer: typing.Optional[Timer] = None,
+		token: typing.Optional[Token] = None,
+		exception: typing.Type[BaseException] = Interrupted
+	):
+		if grace < 0:
+			raise ValueError('grace must not be negative: %r' % (grace,))
+		is_class = isinstance(exception, type)
+		if not (is_class and issubclass(exception, BaseException)):
+			raise TypeError('exception must be an exception class: %r' % (
+				exception,))
+		if not _SUPPORTED:
+			raise RuntimeError(
+				'Cannot raise exceptions in other threads on %s %s' % (
+					sys.implementation.name, sys.version.split()[0]))
+		self._grace = grace
+		self._timer = timer
+		self._token = _requests._root if token is None else token
+		self._exception = exception
+		# Wakes the interrupter's thread. SimpleQueue.put is safe to call from
+		# signal handlers; Queue.put is the fallback for Python < 3.7.
+		self._wakeup = getattr(
+			queue, 'SimpleQueue', queue.Queue)()  # type: typing.Any
+		# Enrollments the interrupter has yet to claim, and their threads.
+		self._enrolled = {}  # type: typing.Dict[_Enrollment, int]
+		# Each thread's latest enrollment.
+		self._local = threading.local()
+		self._triggered = None  # type: typing.Optional[float]
+		# Whether the grace period is over.
+		self._expired = False
+		self._closed = False
+		if self._token._add_callback(self._on_request):
+			self._triggered = monotonic()
+		self._thread = threading.Thread(
+			target=self._run, name='wrapitup.Interrupter', daemon=True)
+		self._thread.start()
+
+	def enroll(self) -> _Enrollment:
+		"""Return a context manager that enrolls the current thread.
+
+		The context manager's ``interrupted`` attribute tells whether the
+		interrupter raised the exception in the thread during the block.
+
+		:raises RuntimeError: On entry, if the interrupter is closed or the
+			thread is already enrolled.
+		"""
+		return _Enrollment(self)
+
+	def close(self) -> None:
+		"""Stop watching and wait for the thread to exit. Idempotent.
+
+		Enrolled threads are no longer interrupted.
+		"""
+		self._closed = True
+		self._wakeup.put(None)
+		self._token._remove_callback(self._on_request)
+		if self._thread is not threading.current_thread():
+			self._thread.join()
+
+	def __enter__(self) -> 'Interrupter':
+		"""Return the interrupter itself."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Call :meth:`close`."""
+		self.close()
+
+	def _on_request(self) -> None:
+		# No lock, because request() may call it from a signal handler, or from
+		# an enrolled thread.
+		if self._triggered is None:
+			self._triggered = monotonic()
+		self._wakeup.put(None)
+
+	def _run(self) -> None:
+		while not self._closed:
+			timeout = self._check()
+			try:
+				self._wakeup.get(True, timeout)
+			except queue.Empty:
+				pass
+
+	def _check(self) -> typing.Optional[float]:
+		"""Interrupt if the grace period is over.
+
+		Return how many seconds to wait before checking again, or None to wait
+		for a wake up.
+		"""
+		if self._triggered is None:
+			if self._timer is None:
+				return None
+			remaining = self._timer.remaining()
+			if remaining > 0:
+				return min(remaining, threading.TIMEOUT_MAX)
+			self._triggered = monotonic()
+		remaining = self._triggered + self._grace - monotonic()
+		if remaining > 0:
+			return min(remaining, threading.TIMEOUT_MAX)
+		self._expired = True
+		return None if self._interrupt() else _RETRY
+
+	def _interrupt(self) -> bool:
+		"""Raise the exception in enrolled threads.
+
+		Return whether every thread was interrupted. Threads entering or leaving
+		their blocks are skipped, to be tried again.
+		"""
+		frames = sys._current_frames()
+		count = 0
+		skipped = False
+		for enrollment, ident in list(self._enrolled.items()):
+			if _busy(frames.get(ident)):
+				skipped = True
+				continue
+			if self._enrolled.pop(enrollment, None) is None:
+				continue  # The thread left its block in the meantime.
+			enrollment.interrupted = True
+			try:
+				if _set_async_exc(ident, self._exception):
+					count += 1
+			finally:
+				enrollment._delivered = True
+		if count:
+			_LOG.warning(
+				'Interrupting %d threads that did not stop within %g seconds. '
+				'(Process %d.)', count, self._grace, os.getpid())
+		return not skipped
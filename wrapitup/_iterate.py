@@ -0,0 +1,89 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the shutdown-aware iteration API."""
+
+from itertools import islice
+import typing
+
+from wrapitup._timer import Timer
+
+
+__all__ = ['iterate']
+
+_T = typing.TypeVar('_T')
+
+
+class iterate(typing.Generic[_T]):
+	"""Iterate over ``iterable`` until it runs out or ``timer`` expires.
+
+	:func:`iterate` encapsulates the loop in this package's example:
+
+	.. code-block:: python
+
+		items = wrapitup.iterate(data, timer, check_every=100)
+		for datum in items:
+			do_work(datum)
+		if items.stopped:
+			log.info('Stopped early after %d items', items.count)
+
+	Before every batch of ``check_every`` items, and once more when ``iterable``
+	runs out, :func:`iterate` calls :meth:`Timer.expired`, and stops if it
+	returns :const:`True`. Within a batch, the only overhead per item is
+	incrementing :attr:`count`. Thus :func:`iterate` notices expiration or a
+	request to shut down at most ``check_every`` items late.
+
+	:param iterable: The items to iterate over.
+	:param timer: The :class:`Timer` to check. The default, used if the
+		argument is :const:`None`, is a new :class:`Timer` without a time limit,
+		so that iteration stops only if a shut down is requested.
+	:param int check_every: How many items to yield between checks of
+		``timer``.
+	:raises TypeError: if ``check_every`` is not an :class:`int`.
+	:raises ValueError: if ``check_every`` is less than 1.
+	:return: An iterable with attributes :attr:`count` and :attr:`stopped`.
+
+	.. attribute:: count
+
+		How many items have been yielded so far.
+
+	.. attribute:: stopped
+
+		Whether ``timer`` had expired when iteration ended, even if ``iterable``
+		ran out at the same time.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		iterable: typing.Iterable[_T],
+		timer: typing.Optional[Timer] = None,
+		check_every: int = 1,
+	):
+		if not isinstance(check_every, int) or isinstance(check_every, bool):
+			raise TypeError('check_every must be an integer: %r' % (check_every,))
+		if check_every < 1:
+			raise ValueError('check_every must be at least 1: %d' % check_every)
+		self._iterable = iterable
+		self._timer = Timer() if timer is None else timer
+		self._check_every = check_every
+		self.count = 0
+		self.stopped = False
+
+	def __iter__(self) -> typing.Iterator[_T]:
+		"""Yield items from ``iterable`` until it runs out or ``timer`` expires."""
+		iterator = iter(self._iterable)
+		check_every = self._check_every
+		expired = self._timer.expired
+		while True:
+			if expired():
+				self.stopped = True
+				return
+			start = self.count
+			for item in islice(iterator, check_every):
+				self.count += 1
+				yield item
+			if self.count - start < check_every:
+				# Don't miss a request that arrived during the last batch.
+				self.stopped = expired()
+				return
@@ -0,0 +1,292 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement shut down latency instrumentation."""
+
+import atexit
+import math
+import os
+import signal
+import sys
+import threading
+from time import perf_counter
+import types
+import typing
+
+from wrapitup import _catch_signals, _requests
+
+
+__all__ = ['Histogram', 'LatencyRecorder']
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Only these functions' calls to is_set count as listeners observing requests.
+# Other calls, e.g., from Token bookkeeping, do not.
+_OBSERVERS = frozenset([
+	_requests.requested.__code__, _requests.Token.requested.__code__])
+# The is_set methods of flags that wrap other flags. When wrappers are stacked,
+# their frames lie between the observer and the innermost wrapper.
+_WRAPPERS = set()  # type: typing.Set[types.CodeType]
+
+
+def _observer(frame: types.FrameType) -> typing.Optional[types.FrameType]:
+	"""Return the observer's frame if ``frame`` called a wrapper for one.
+
+	``frame`` is the caller of a wrapper's is_set. Skip the frames of any other
+	wrappers stacked on top of it.
+	"""
+	while frame.f_code in _WRAPPERS:
+		frame = frame.f_back  # type: ignore
+	return frame if frame.f_code in _OBSERVERS else None
+
+
+def _call_site(frame: typing.Optional[types.FrameType]) -> str:
+	"""Describe the innermost frame outside this package, starting at ``frame``."""
+	while frame is not None:
+		filename = frame.f_code.co_filename
+		if os.path.dirname(os.path.abspath(filename)) != _PACKAGE_DIR:
+			return '%s:%d (%s)' % (filename, frame.f_lineno, frame.f_code.co_name)
+		frame = frame.f_back
+	return '<unknown>'  # pragma: no cover
+
+
+class Histogram:
+	"""Log-linear histogram of durations.
+
+	Durations are counted in buckets whose width is about 4% of their lower
+	bound, so recording costs the same no matter how many durations are
+	recorded, and :meth:`percentile` is accurate to within about 4%.
+
+	.. attribute:: count
+
+		How many durations were recorded.
+
+	.. attribute:: min
+
+		The shortest duration recorded, in seconds, or :const:`None`.
+
+	.. attribute:: max
+
+		The longest duration recorded, in seconds, or :const:`None`.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	#: Buckets per doubling of duration.
+	_SUBBUCKETS = 16
+
+	def __init__(self) -> None:
+		self._counts = {}  # type: typing.Dict[int, int]
+		self.count = 0
+		self.min = None  # type: typing.Optional[float]
+		self.max = None  # type: typing.Optional[float]
+
+	def record(self, seconds: float) -> None:
+		"""Count one duration of ``seconds`` seconds."""
+		nanoseconds = max(seconds * 1e9, 1.0)
+		bucket = int(math.log2(nanoseconds) * self._SUBBUCKETS)
+		self._counts[bucket] = self._counts.get(bucket, 0) + 1
+		self.count += 1
+		if self.min is None or seconds < self.min:
+			self.min = seconds
+		if self.max is None or seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, q: float) -> typing.Optional[float]:
+		r"""Return the ``q``\ th percentile duration in seconds, or :const:`None`.
+
+		:param float q: Between 0 and 100 inclusive.
+		:raises ValueError: if ``q`` is out of range.
+		"""
+		if not 0 <= q <= 100:
+			raise ValueError('percentile out of range: %r' % (q,))
+		if not self.count:
+			return None
+		assert self.min is not None and self.max is not None
+		if q == 0:
+			return self.min
+		rank = max(math.ceil(self.count * q / 100), 1)
+		seen = 0
+		for bucket in sorted(self._counts):
+			seen += self._counts[bucket]
+			if seen >= rank:
+				upper = 2 ** ((bucket + 1) / self._SUBBUCKETS) / 1e9
+				return min(max(upper, self.min), self.max)
+		return self.max  # pragma: no cover
+
+	def summary(self) -> str:
+		"""Return the count, median, 99th percentile, and maximum as a string."""
+		if not self.count:
+			return 'count=0'
+		return 'count=%d p50=%s p99=%s max=%s' % (
+			self.count, _format(self.percentile(50)), _format(self.percentile(99)),
+			_format(self.max))
+
+
+def _format(seconds: typing.Optional[float]) -> str:
+	if seconds is None:  # pragma: no cover
+		return '-'
+	if seconds < 1e-3:
+		return '%.1fus' % (seconds * 1e6)
+	if seconds < 1:
+		return '%.2fms' % (seconds * 1e3)
+	return '%.3fs' % seconds
+
+
+class LatencyRecorder:
+	r"""Measure how long shut down requests take to reach listeners.
+
+	While installed with :meth:`install`, the recorder timestamps
+
+	#. receipt of each signal by a handler that :func:`catch_signals` or
+		:func:`catch_signals_async` installed,
+	#. each :func:`request` that finds no request already active, and
+	#. the first time after each such request that each call site observes it
+		through :func:`requested`, or through :meth:`Timer.remaining` or
+		:meth:`Timer.expired` of a timer without a token. A call site is the
+		innermost line of code outside this package, so the site is where your
+		code calls into WrapItUp.
+
+	and records the differences in :class:`Histogram`\ s that :meth:`histograms`
+	returns:
+
+	``'signal_to_request'``
+		From signal receipt to :func:`request`, i.e., how slow the handler was.
+	``'request_to_observation'``
+		From :func:`request` to first observation, at all call sites.
+	``'request_to_observation:SITE'``
+		From :func:`request` to first observation, at call site ``SITE``.
+
+	The recorder wraps whichever flag backs the request API, like
+	:meth:`SharedFlag.install` does, so when the recorder is not installed it
+	costs nothing, and while installed it costs nothing until a shut down is
+	requested. Requests from other processes sharing a :class:`SharedFlag` are
+	not timed. Observations through a :class:`Token` other than the
+	module-level request API, including by a :class:`Timer` given such a token,
+	are not recorded.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.RLock()
+		self._histograms = {}  # type: typing.Dict[str, Histogram]
+		self._flag = None  # type: typing.Any
+		self._installed = False
+		self._signal_time = None  # type: typing.Optional[float]
+		self._request_time = None  # type: typing.Optional[float]
+		self._observed = set()  # type: typing.Set[str]
+		self._at_exit = None  # type: typing.Optional[typing.Callable[[], None]]
+
+	def install(self) -> None:
+		"""Start recording.
+
+		:raises RuntimeError: if already installed.
+		"""
+		if self._installed:
+			raise RuntimeError('LatencyRecorder is already installed')
+		self._flag = _requests._flag
+		self._installed = True
+		_requests._set_flag(self)
+		_catch_signals._signal_hooks.append(self._signal_received)
+
+	def uninstall(self) -> None:
+		"""Stop recording, but keep what was recorded.
+
+		:raises RuntimeError: if not installed, or if another flag, such as a
+			:class:`SharedFlag`, was installed after this recorder and is still
+			installed.
+		"""
+		if not self._installed or _requests._flag is not self:
+			raise RuntimeError('LatencyRecorder is not installed')
+		_catch_signals._signal_hooks.remove(self._signal_received)
+		# Keep self._flag: threads that read the request API's flag just before
+		# this call may still call through this recorder.
+		_requests._set_flag(self._flag)
+		self._installed = False
+
+	def histograms(self) -> typing.Dict[str, Histogram]:
+		"""Return a copy of the mapping from names to histograms."""
+		with self._lock:
+			return dict(self._histograms)
+
+	def report(self) -> str:
+		"""Return a summary of every histogram, one per line, worst first."""
+		histograms = self.histograms()
+		names = sorted(
+			histograms, key=lambda name: histograms[name].max or 0, reverse=True)
+		return ''.join(
+			'%s: %s\n' % (name, histograms[name].summary()) for name in names)
+
+	def dump(self, file: typing.Optional[typing.TextIO] = None) -> None:
+		"""Write :meth:`report` to ``file``, by default :data:`sys.stderr`."""
+		(sys.stderr if file is None else file).write(self.report())
+
+	def dump_at_exit(self, path: typing.Optional[str] = None) -> None:
+		"""Call :meth:`dump` when the interpreter exits.
+
+		:param path: File to write to. The default, used if the argument is
+			:const:`None`, is :data:`sys.stderr`.
+		"""
+		if self._at_exit is not None:
+			atexit.unregister(self._at_exit)
+
+		def at_exit() -> None:
+			if path is None:
+				self.dump()
+			else:
+				with open(path, 'w') as file:
+					self.dump(file)
+		self._at_exit = at_exit
+		atexit.register(at_exit)
+
+	def _record(self, name: str, seconds: float) -> None:
+		"""Add to the histogram called ``name``. Hold ``_lock``."""
+		histogram = self._histograms.get(name)
+		if histogram is None:
+			histogram = self._histograms[name] = Histogram()
+		histogram.record(seconds)
+
+	def _signal_received(self, signum: signal.Signals) -> None:
+		self._signal_time = perf_counter()
+
+	# threading.Event's interface, wrapping the flag this recorder replaced.
+
+	def set(self) -> None:
+		"""Set the wrapped flag, timing the request if it is new."""
+		now = perf_counter()
+		signal_time, self._signal_time = self._signal_time, None
+		if not self._flag.is_set():
+			with self._lock:
+				self._request_time = now
+				self._observed = set()
+				if signal_time is not None:
+					self._record('signal_to_request', now - signal_time)
+		self._flag.set()
+
+	def clear(self) -> None:
+		"""Clear the wrapped flag."""
+		self._flag.clear()
+
+	def is_set(self) -> bool:
+		"""Return whether the wrapped flag is set, timing first observations."""
+		if not self._flag.is_set():
+			return False
+		request_time = self._request_time
+		if request_time is None:
+			return True
+		observer = _observer(sys._getframe(1))
+		if observer is not None:
+			now = perf_counter()
+			site = _call_site(observer)
+			with self._lock:
+				if site not in self._observed and request_time == self._request_time:
+					self._observed.add(site)
+					self._record('request_to_observation', now - request_time)
+					self._record('request_to_observation:' + site, now - request_time)
+		return True
+
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block on the wrapped flag."""
+		return bool(self._flag.wait(timeout))
+
+
+_WRAPPERS.add(LatencyRecorder.is_set.__code__)
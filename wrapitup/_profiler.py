@@ -0,0 +1,257 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the poll frequency profiler."""
+
+import atexit
+import os
+import sys
+import threading
+from time import perf_counter
+import types
+import typing
+
+from wrapitup import _requests
+from wrapitup._latency import (
+	_observer, _PACKAGE_DIR, _WRAPPERS, _format, Histogram)
+
+
+__all__ = ['PollProfiler', 'SiteProfile']
+
+# A call site: the id of the code object and the line number of the innermost
+# frame outside this package. Hashing code objects themselves is slow.
+_Site = typing.Tuple[int, int]
+
+
+SiteProfile = typing.NamedTuple('SiteProfile', [
+	('site', str),
+	('calls', int),
+	('rate', float),
+	('gaps', Histogram),
+])
+SiteProfile.__doc__ = """How often one call site checked for a shut down.
+
+.. attribute:: site
+
+	The file, line, and function of the call site.
+
+.. attribute:: calls
+
+	How many checks the site made.
+
+.. attribute:: rate
+
+	Checks per second, between the site's first and last checks.
+
+.. attribute:: gaps
+
+	A :class:`Histogram` of the time between consecutive checks by the same
+	thread. Its maximum is the worst delay the site would have added to a shut
+	down.
+
+.. versionadded:: 0.4.0
+"""
+
+
+class _Stats:
+	__slots__ = ('code', 'calls', 'first', 'last', 'gaps')
+
+	def __init__(self, code: types.CodeType, now: float):
+		# Keeps the code object, and so its id, alive.
+		self.code = code
+		self.calls = 0
+		self.first = self.last = now
+		self.gaps = Histogram()
+
+
+class PollProfiler:
+	"""Measure how often each call site checks for requests to shut down.
+
+	While installed with :meth:`install`, the profiler counts every call to
+	:func:`requested`, :meth:`Token.requested`, :meth:`Timer.remaining`, and
+	:meth:`Timer.expired` that consults whether a shut down was requested, and
+	times the gaps between consecutive calls from the same call site in the same
+	thread. A call site is the innermost line of code outside this package.
+	Calls to :meth:`Timer.expired` that ``poll_every`` lets skip the check are
+	not counted.
+
+	Sites that check too often waste CPU; sites whose gaps are long delay shut
+	down by up to their longest gap. :meth:`report` ranks sites by that worst
+	case.
+
+	The profiler wraps whichever flag backs the request API, like
+	:class:`LatencyRecorder` does, so it costs nothing when it is not installed.
+	While installed it adds a few microseconds to each check, little enough for
+	staging but perhaps not for production.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self) -> None:
+		self._lock = threading.RLock()
+		self._flag = None  # type: typing.Any
+		self._installed = False
+		# Each thread records into its own dict, so recording needs no lock.
+		self._local = threading.local()
+		self._stats = []  # type: typing.List[typing.Dict[_Site, _Stats]]
+		# Whether each code object, by id, belongs to this package. Holds the
+		# code objects to keep their ids unique.
+		self._internal = {}  # type: typing.Dict[int, typing.Tuple[bool, typing.Any]]
+		self._at_exit = None  # type: typing.Optional[typing.Callable[[], None]]
+
+	def install(self) -> None:
+		"""Start profiling.
+
+		:raises RuntimeError: if already installed.
+		"""
+		if self._installed:
+			raise RuntimeError('PollProfiler is already installed')
+		self._flag = _requests._flag
+		self._installed = True
+		_requests._set_flag(self)
+
+	def uninstall(self) -> None:
+		"""Stop profiling, but keep what was recorded.
+
+		:raises RuntimeError: if not installed, or if another flag, such as a
+			:class:`SharedFlag`, was installed after this profiler and is still
+			installed.
+		"""
+		if not self._installed or _requests._flag is not self:
+			raise RuntimeError('PollProfiler is not installed')
+		_requests._set_flag(self._flag)
+		# Keep the wrapped flag: other threads may still be calling this one.
+		self._installed = False
+
+	def profiles(self) -> typing.List[SiteProfile]:
+		"""Return a :class:`SiteProfile` per call site, longest gap first."""
+		with self._lock:
+			per_thread = list(self._stats)
+		merged = {}  # type: typing.Dict[_Site, _Stats]
+		for stats_by_site in per_thread:
+			# Copying a dict is atomic, so the thread may keep recording.
+			for site, stats in stats_by_site.copy().items():
+				total = merged.get(site)
+				if total is None:
+					total = merged[site] = _Stats(stats.code, stats.first)
+				total.calls += stats.calls
+				total.first = min(total.first, stats.first)
+				total.last = max(total.last, stats.last)
+				_merge(total.gaps, stats.gaps)
+		profiles = [
+			SiteProfile(
+				site='%s:%d (%s)' % (
+					stats.code.co_filename, lineno, stats.code.co_name),
+				calls=stats.calls,
+				rate=(
+					(stats.calls - 1) / (stats.last - stats.first)
+					if stats.last > stats.first else 0.0),
+				gaps=stats.gaps)
+			for (_, lineno), stats in merged.items()]
+		profiles.sort(key=lambda p: (p.gaps.max or 0, -p.calls), reverse=True)
+		return profiles
+
+	def report(self) -> str:
+		"""Return a summary of every call site, one per line, worst first."""
+		return ''.join(
+			'%s: calls=%d rate=%.1f/s gaps %s\n' % (
+				p.site, p.calls, p.rate, _summary(p.gaps))
+			for p in self.profiles())
+
+	def dump(self, file: typing.Optional[typing.TextIO] = None) -> None:
+		"""Write :meth:`report` to ``file``, by default :data:`sys.stderr`."""
+		(sys.stderr if file is None else file).write(self.report())
+
+	def dump_at_exit(self, path: typing.Optional[str] = None) -> None:
+		"""Call :meth:`dump` when the interpreter exits.
+
+		:param path: File to write to. The default, used if the argument is
+			:const:`None`, is :data:`sys.stderr`.
+		"""
+		if self._at_exit is not None:
+			atexit.unregister(self._at_exit)
+
+		def at_exit() -> None:
+			if path is None:
+				self.dump()
+			else:
+				with open(path, 'w') as file:
+					self.dump(file)
+		self._at_exit = at_exit
+		atexit.register(at_exit)
+
+	def _record(self, frame: types.FrameType) -> None:
+		"""Count a check whose innermost frame in this package is ``frame``."""
+		now = perf_counter()
+		internal = self._internal
+		code = frame.f_code
+		while True:
+			known = internal.get(id(code))
+			if known is None:
+				filename = os.path.abspath(code.co_filename)
+				known = internal[id(code)] = (
+					os.path.dirname(filename) == _PACKAGE_DIR, code)
+			if not known[0]:
+				break
+			if frame.f_back is None:  # pragma: no cover
+				return
+			frame = frame.f_back
+			code = frame.f_code
+		site = (id(code), frame.f_lineno)
+		try:
+			stats_by_site = self._local.stats
+		except AttributeError:
+			stats_by_site = self._local.stats = {}
+			with self._lock:
+				self._stats.append(stats_by_site)
+		stats = stats_by_site.get(site)
+		if stats is None:
+			stats = stats_by_site[site] = _Stats(code, now)
+		else:
+			stats.gaps.record(now - stats.last)
+		stats.calls += 1
+		stats.last = now
+
+	# threading.Event's interface, wrapping the flag this profiler replaced.
+
+	def set(self) -> None:
+		"""Set the wrapped flag."""
+		self._flag.set()
+
+	def clear(self) -> None:
+		"""Clear the wrapped flag."""
+		self._flag.clear()
+
+	def is_set(self) -> bool:
+		"""Return whether the wrapped flag is set, counting the check."""
+		observer = _observer(sys._getframe(1))
+		if observer is not None:
+			self._record(observer)
+		return bool(self._flag.is_set())
+
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block on the wrapped flag."""
+		return bool(self._flag.wait(timeout))
+
+
+def _merge(total: Histogram, histogram: Histogram) -> None:
+	"""Add the durations ``histogram`` recorded to ``total``."""
+	for bucket, count in histogram._counts.copy().items():
+		total._counts[bucket] = total._counts.get(bucket, 0) + count
+	total.count += histogram.count
+	for seconds in (histogram.min, histogram.max):
+		if seconds is not None:
+			if total.min is None or seconds < total.min:
+				total.min = seconds
+			if total.max is None or seconds > total.max:
+				total.max = seconds
+
+
+def _summary(gaps: Histogram) -> str:
+	if not gaps.count:
+		return '-'
+	return 'p50=%s p99=%s max=%s' % (
+		_format(gaps.percentile(50)), _format(gaps.percentile(99)),
+		_format(gaps.max))
+
+
+_WRAPPERS.add(PollProfiler.is_set.__code__)
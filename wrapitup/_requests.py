@@ -3,24 +3,218 @@
 """Implement the requests API."""
 
 import threading
+from time import monotonic
+import typing
+import weakref
 
 
-__all__ = ['request', 'reset', 'requested']
+__all__ = ['request', 'reset', 'requested', 'sleep', 'Token']
 
 
-_flag = threading.Event()
+# Any object with threading.Event's interface. SharedFlag.install replaces it
+# through _set_flag.
+_flag = threading.Event()  # type: typing.Any
+# Called with no arguments after every request, possibly from a signal handler.
+_callbacks = []  # type: typing.List[typing.Callable[[], None]]
+# Seconds between checks in Token.wait of a root flag that another process may
+# set, unless the flag has its own poll_interval.
+_POLL_INTERVAL = 0.01
+# Guards the token tree. Reentrant because signal handlers call request() in
+# the main thread, which might already hold the lock.
+_lock = threading.RLock()
+
+
+class Token:
+	"""Scope for requests to shut down a subset of listeners.
+
+	Tokens form a tree. Requesting that a token shut down via :meth:`request`
+	also requests that all its descendants shut down, but not its ancestors, so
+	one subsystem can drain while the rest of the process keeps working. The
+	root of the tree is the module-level request API: :func:`request` reaches
+	every token, and :meth:`requested` returns :const:`True` for every token
+	after :func:`request` is called.
+
+	Checking a token with :meth:`requested` costs the same no matter how deep
+	the token is in the tree; the cost of a request falls instead on
+	:meth:`request` and :meth:`reset`, which update all descendants.
+
+	Pass tokens to :class:`Timer` to make the timer listen for requests to
+	shut down the token's scope rather than the whole process.
+
+	:param parent: The new token's parent. The default, used if the argument is
+		:const:`None`, is the root of the tree. If the parent already requested
+		that its descendants shut down, so does the new token.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, parent: 'typing.Optional[Token]' = None):
+		self._flag = threading.Event()  # type: typing.Any
+		self._own = False
+		self._children = weakref.WeakSet()  # type: weakref.WeakSet
+		self._callbacks = []  # type: typing.List[typing.Callable[[], None]]
+		if parent is None:
+			parent = _root
+		self._parent = parent  # type: typing.Optional[Token]
+		with _lock:
+			parent._children.add(self)
+			if parent._flag.is_set():
+				self._flag.set()
+
+	def request(self) -> None:
+		"""Request listeners of this token and its descendants to shut down."""
+		with _lock:
+			self._own = True
+			self._flag.set()
+			for callback in tuple(self._callbacks):
+				callback()
+			for child in tuple(self._children):
+				child._refresh()
+
+	def reset(self) -> None:
+		"""Withdraw this token's request to shut down.
+
+		Descendants that did not request shut down themselves stop being
+		requested to shut down, unless an ancestor of this token still requests
+		it.
+		"""
+		with _lock:
+			self._own = False
+			self._refresh()
+
+	def requested(self) -> bool:
+		"""Return whether listeners of this token should shut down."""
+		return bool(self._flag.is_set() or _flag.is_set())
+
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block until shut down is requested or ``timeout`` seconds pass.
+
+		:return: Whether listeners of this token should shut down.
+		"""
+		if type(_flag) is threading.Event:
+			return self._flag.wait(timeout) or self.requested()
+		# E.g., a SharedFlag that another process sets without setting this
+		# token's flag.
+		interval = getattr(_flag, 'poll_interval', _POLL_INTERVAL)
+		deadline = float('inf') if timeout is None else monotonic() + timeout
+		while not self.requested():
+			remaining = deadline - monotonic()
+			if remaining <= 0:
+				return False
+			self._flag.wait(min(remaining, interval))
+		return True
+
+	def _add_callback(self, callback: typing.Callable[[], None]) -> bool:
+		"""Call ``callback`` with no arguments whenever this token is requested.
+
+		It may run in a signal handler, or in whichever thread called
+		:meth:`request`, while that thread holds ``_lock``.
+
+		:return: Whether listeners of this token should already shut down, in
+			which case ``callback`` missed that request.
+		"""
+		with _lock:
+			self._callbacks.append(callback)
+			return self.requested()
+
+	def _remove_callback(self, callback: typing.Callable[[], None]) -> None:
+		"""Stop calling ``callback``. Does nothing if it is not registered.
+
+		Once this returns, no request is still calling ``callback``, except one
+		in the current thread.
+		"""
+		with _lock:
+			try:
+				self._callbacks.remove(callback)
+			except ValueError:
+				pass
+
+	def _refresh(self) -> None:
+		"""Recompute whether the flag is set, and propagate any change down.
+
+		The caller must hold ``_lock``.
+		"""
+		was_set = self._flag.is_set()
+		if self._own or self._parent is not None and self._parent._flag.is_set():
+			if not was_set:
+				self._flag.set()
+				for callback in tuple(self._callbacks):
+					callback()
+			else:
+				return
+		elif was_set:
+			self._flag.clear()
+		else:
+			return
+		for child in tuple(self._children):
+			child._refresh()
+
+
+def _make_root() -> Token:
+	root = Token.__new__(Token)
+	root._flag = _flag
+	root._own = False
+	root._children = weakref.WeakSet()
+	root._callbacks = _callbacks
+	root._parent = None
+	return root
+
+
+_root = _make_root()
+
+
+def _set_flag(flag: typing.Any) -> None:
+	"""Replace the root's flag with ``flag``, e.g., a :class:`SharedFlag`."""
+	global _flag
+	with _lock:
+		_flag = _root._flag = flag
+		for child in tuple(_root._children):
+			child._refresh()
 
 
 def request() -> None:
-	"""Request all listeners running in this process to shut down."""
-	_flag.set()
+	"""Request all listeners running in this process to shut down.
+
+	If a :class:`SharedFlag` is installed, the request reaches listeners in all
+	processes sharing it.
+	"""
+	_root.request()
 
 
 def reset() -> None:
-	"""Stop requesting listeners running in this process to shut down."""
-	_flag.clear()
+	r"""Stop requesting listeners running in this process to shut down.
+
+	Listeners of :class:`Token`\ s that requested shut down themselves are
+	still requested to shut down.
+	"""
+	_root.reset()
 
 
 def requested() -> bool:
 	"""Return whether listeners should shut down."""
-	return _flag.is_set()
+	return bool(_flag.is_set())
+
+
+def sleep(seconds: float) -> bool:
+	"""Sleep until ``seconds`` pass or a shut down is requested.
+
+	Use :func:`sleep` in place of :func:`time.sleep` in backoff loops and idle
+	workers. It blocks without using CPU, but returns as soon as :func:`request`
+	is called from any thread or signal handler.
+
+	:param float seconds: Maximum time to sleep, in seconds.
+	:raises ValueError: if ``seconds`` is negative.
+	:return: Whether a shut down is requested, which is also whether
+		:func:`sleep` returned early.
+
+	.. versionadded:: 0.4.0
+	"""
+	if seconds < 0:
+		raise ValueError('sleep length must be non-negative: %r' % (seconds,))
+	deadline = monotonic() + seconds
+	while True:
+		remaining = deadline - monotonic()
+		if remaining <= 0:
+			return requested()
+		if _flag.wait(min(remaining, threading.TIMEOUT_MAX)):
+			return True
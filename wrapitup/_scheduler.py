@@ -0,0 +1,242 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the deadline scheduler API."""
+
+import heapq
+import itertools
+import logging
+import threading
+from time import monotonic
+from types import TracebackType
+import typing
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+from wrapitup._timer import Timer
+
+
+__all__ = ['Scheduler']
+
+_LOG = logging.getLogger(__package__)
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+_Callback = typing.Callable[[Timer], None]
+
+
+class _Entry:
+	"""A timer the scheduler is tracking. Opaque to users."""
+
+	__slots__ = ('timer', 'callback', 'generation', 'active')
+
+	def __init__(self, timer: Timer, callback: _Callback):
+		self.timer = timer
+		self.callback = callback
+		self.generation = 0
+		self.active = True
+
+
+class Scheduler:
+	r"""Fire callbacks when many :class:`Timer`\ s expire, using one thread.
+
+	Instead of sweeping through thousands of timers to find the expired ones,
+	hand each timer to :meth:`schedule` with a callback. The scheduler keeps the
+	timers' deadlines in a heap, and a single background thread sleeps until the
+	earliest deadline, calls that timer's callback with the timer as the only
+	argument, and moves on to the next. Scheduling, :meth:`cancel`\ ing, and
+	:meth:`restart`\ ing a timer cost *O*\ (log *n*) or less.
+
+	When a shut down is requested, the scheduler expires every scheduled timer
+	at once, and timers scheduled while the request lasts fire immediately.
+
+	Callbacks run in the scheduler's thread, one at a time, so they should be
+	quick. Exceptions they raise are logged to the logger whose name is this
+	module's :const:`__package__` and otherwise ignored.
+
+	:class:`Scheduler` instances are context managers that :meth:`close`
+	themselves on exit.
+
+	:param token: The :class:`Token` whose requests to shut down expire every
+		timer. The default, used if the argument is :const:`None`, is the
+		module-level request API, :func:`request`.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, token: typing.Optional[Token] = None):
+		self._token = _requests._root if token is None else token
+		# Reentrant because request() may run the callback from a signal handler
+		# in a thread that already holds the lock.
+		self._cond = threading.Condition(threading.RLock())
+		# Items are (deadline, tie breaker, generation, entry). Entries whose
+		# generation has moved on or that are inactive are stale.
+		self._heap = []  # type: typing.List[typing.Tuple[float, int, int, _Entry]]
+		self._stale = 0
+		self._pending = 0
+		self._counter = itertools.count()
+		self._thread = None  # type: typing.Optional[threading.Thread]
+		self._closed = False
+		self._token._add_callback(self._wake)
+
+	def __len__(self) -> int:
+		"""Return how many timers are scheduled and have not fired."""
+		return self._pending
+
+	def __enter__(self) -> 'Scheduler':
+		"""Return the scheduler itself."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Call :meth:`close`."""
+		self.close()
+
+	def schedule(self, timer: Timer, callback: _Callback) -> typing.Hashable:
+		"""Call ``callback(timer)`` when ``timer`` expires.
+
+		The deadline is computed once, from :meth:`Timer.remaining`. If you
+		restart ``timer`` yourself, call :meth:`restart` instead so the scheduler
+		learns the new deadline.
+
+		:return: An opaque handle for :meth:`cancel` and :meth:`restart`.
+		:raises RuntimeError: if the scheduler is closed.
+		"""
+		entry = _Entry(timer, callback)
+		with self._cond:
+			if self._closed:
+				raise RuntimeError('Scheduler is closed')
+			self._pending += 1
+			self._push(entry)
+			if self._thread is None:
+				self._thread = threading.Thread(
+					target=self._run, name='wrapitup.Scheduler', daemon=True)
+				self._thread.start()
+		return entry
+
+	def cancel(self, handle: typing.Hashable) -> bool:
+		"""Stop tracking the timer that :meth:`schedule` returned ``handle`` for.
+
+		:return: Whether the timer was still scheduled, i.e., its callback had
+			not been called yet.
+		"""
+		assert isinstance(handle, _Entry)
+		with self._cond:
+			if not handle.active:
+				return False
+			handle.active = False
+			self._pending -= 1
+			self._stale += 1
+			self._compact()
+			return True
+
+	def restart(
+		self, handle: typing.Hashable, limit: float = float('inf')
+	) -> None:
+		"""Restart the timer for ``handle`` with :meth:`Timer.start` & reschedule it.
+
+		The timer is rescheduled even if its callback was already called or it
+		was cancelled.
+
+		:raises RuntimeError: if the scheduler is closed.
+		"""
+		assert isinstance(handle, _Entry)
+		handle.timer.start(limit)
+		with self._cond:
+			if self._closed:
+				raise RuntimeError('Scheduler is closed')
+			if handle.active:
+				self._stale += 1
+			else:
+				handle.active = True
+				self._pending += 1
+			handle.generation += 1
+			self._push(handle)
+			self._compact()
+
+	def close(self) -> None:
+		"""Stop the background thread without calling any more callbacks.
+
+		Closing is idempotent.
+		"""
+		with self._cond:
+			if self._closed:
+				return
+			self._closed = True
+			self._cond.notify()
+		self._token._remove_callback(self._wake)
+		thread = self._thread
+		if thread is not None and thread is not threading.current_thread():
+			thread.join()
+
+	def _push(self, entry: _Entry) -> None:
+		"""Add ``entry`` to the heap and wake the thread. Hold ``_cond``."""
+		deadline = monotonic() + entry.timer.remaining()
+		item = (deadline, next(self._counter), entry.generation, entry)
+		heapq.heappush(self._heap, item)
+		if self._heap[0] is item:
+			self._cond.notify()
+
+	def _compact(self) -> None:
+		"""Drop stale heap items once they are the majority. Hold ``_cond``."""
+		if self._stale > 64 and self._stale * 2 > len(self._heap):
+			self._heap = [
+				item for item in self._heap
+				if item[3].active and item[2] == item[3].generation]
+			heapq.heapify(self._heap)
+			self._stale = 0
+
+	def _wake(self) -> None:
+		"""Wake the thread to expire everything. :func:`request` calls this."""
+		with self._cond:
+			self._cond.notify()
+
+	def _due(self) -> typing.List[_Entry]:
+		"""Wait for, remove, and return the next entries to fire. Hold ``_cond``."""
+		while not self._closed:
+			if self._token.requested():
+				due = [
+					item[3] for item in self._heap
+					if item[3].active and item[2] == item[3].generation]
+				self._heap.clear()
+				self._stale = 0
+			else:
+				due = []
+				now = monotonic()
+				while self._heap and self._heap[0][0] <= now:
+					_, _, generation, entry = heapq.heappop(self._heap)
+					if entry.active and generation == entry.generation:
+						due.append(entry)
+					else:
+						self._stale -= 1
+			if due:
+				for entry in due:
+					entry.active = False
+				self._pending -= len(due)
+				return due
+			while self._heap:
+				_, _, generation, entry = self._heap[0]
+				if entry.active and generation == entry.generation:
+					break
+				heapq.heappop(self._heap)
+				self._stale -= 1
+			if self._heap:
+				timeout = min(self._heap[0][0] - monotonic(), threading.TIMEOUT_MAX)
+				self._cond.wait(timeout)
+			else:
+				self._cond.wait()
+		return []
+
+	def _run(self) -> None:
+		"""Fire callbacks until closed. Runs in the background thread."""
+		while True:
+			with self._cond:
+				due = self._due()
+			if not due:
+				return
+			for entry in due:
+				try:
+					entry.callback(entry.timer)
+				except Exception:
+					_LOG.exception('Scheduler callback %r failed', entry.callback)
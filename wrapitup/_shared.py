@@ -0,0 +1,184 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the cross-process request flag."""
+
+import mmap
+import os
+import sys
+import tempfile
+import threading
+from time import monotonic
+import typing
+import uuid
+import weakref
+
+from wrapitup import _requests
+
+
+__all__ = ['SharedFlag']
+
+
+class SharedFlag:
+	"""Request flag in shared memory that is visible to other processes.
+
+	By default, :func:`request`, :func:`reset`, and :func:`requested` affect
+	only the process that calls them. A :class:`SharedFlag` is a single byte of
+	shared memory that can take the place of the process-local flag. Once
+	installed with :meth:`install`, calling :func:`request` in any process
+	sharing the flag makes :func:`requested` return :const:`True` in all of
+	them, at the cost of a single memory read per call to :func:`requested`.
+
+	Create the flag in the parent process and hand it to child processes,
+	e.g., as an argument to :class:`multiprocessing.Process`. Children started
+	with the ``fork`` start method inherit the installed flag; children started
+	with ``spawn`` or ``forkserver`` receive a pickled copy attached to the
+	same memory, and must call :meth:`install` themselves.
+
+	.. code-block:: python
+
+		def worker(flag):
+			flag.install()
+			timer = wrapitup.Timer()
+			while not timer.expired():
+				do_work()
+
+		flag = wrapitup.SharedFlag()
+		flag.install()
+		with wrapitup.catch_signals():
+			procs = [multiprocessing.Process(target=worker, args=(flag,))
+				for _ in range(10)]
+			...
+
+	:class:`SharedFlag` implements the same :meth:`set`, :meth:`clear`,
+	:meth:`is_set`, and :meth:`wait` methods as :class:`threading.Event`.
+	:meth:`wait` wakes immediately when the flag is set in the same process,
+	but notices when another process sets the flag only every
+	:attr:`poll_interval` seconds.
+
+	Availability: Unix, Windows.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	#: Seconds between checks of shared memory in :meth:`wait`.
+	poll_interval = 0.01
+
+	def __init__(self) -> None:
+		self._owner = os.getpid()  # type: typing.Optional[int]
+		self._path = None  # type: typing.Optional[str]
+		self._tagname = None  # type: typing.Optional[str]
+		if os.name == 'posix':
+			fd, self._path = tempfile.mkstemp(prefix='wrapitup-', dir=_directory())
+			# Remove the file even if the owner never calls close.
+			weakref.finalize(self, _unlink, self._path, self._owner)
+			try:
+				os.write(fd, b'\0')
+				self._mmap = mmap.mmap(fd, 1)
+			finally:
+				os.close(fd)
+		elif sys.platform == 'win32':  # pragma: no cover
+			# sys.platform, unlike os.name, tells mypy that tagname exists here.
+			self._tagname = 'wrapitup-%s' % uuid.uuid4().hex
+			self._mmap = mmap.mmap(-1, 1, tagname=self._tagname)
+		else:  # pragma: no cover
+			raise NotImplementedError('unsupported operating system: %s' % os.name)
+		self._local = threading.Event()
+		self._previous = []  # type: typing.List[typing.Any]
+
+	def __getstate__(self) -> typing.Dict[str, typing.Any]:
+		"""Pickle only the name of the shared memory."""
+		return {'path': self._path, 'tagname': self._tagname}
+
+	def __setstate__(self, state: typing.Dict[str, typing.Any]) -> None:
+		"""Attach to the shared memory named in ``state``."""
+		self._owner = None
+		self._path = state['path']
+		self._tagname = state['tagname']
+		if self._path is not None:
+			fd = os.open(self._path, os.O_RDWR)
+			try:
+				self._mmap = mmap.mmap(fd, 1)
+			finally:
+				os.close(fd)
+		elif sys.platform == 'win32':  # pragma: no cover
+			self._mmap = mmap.mmap(-1, 1, tagname=self._tagname)
+		else:  # pragma: no cover
+			raise NotImplementedError('unsupported operating system: %s' % os.name)
+		self._local = threading.Event()
+		self._previous = []
+
+	def set(self) -> None:
+		"""Set the flag in every process sharing it."""
+		self._mmap[0] = 1
+		self._local.set()
+
+	def clear(self) -> None:
+		"""Clear the flag in every process sharing it."""
+		self._mmap[0] = 0
+		self._local.clear()
+
+	def is_set(self) -> bool:
+		"""Return whether the flag is set."""
+		return self._mmap[0] != 0
+
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block until the flag is set or ``timeout`` seconds pass.
+
+		:return: Whether the flag is set.
+		"""
+		deadline = float('inf') if timeout is None else monotonic() + timeout
+		while not self.is_set():
+			remaining = deadline - monotonic()
+			if remaining <= 0:
+				return False
+			self._local.wait(min(remaining, self.poll_interval))
+		return True
+
+	def install(self) -> None:
+		"""Make :func:`request`, :func:`reset`, and :func:`requested` use this flag.
+
+		The state of the flag replaced is not copied. Installations nest:
+		:meth:`uninstall` restores whichever flag this call replaced.
+		"""
+		self._previous.append(_requests._flag)
+		_requests._set_flag(self)
+
+	def uninstall(self) -> None:
+		"""Restore the flag that the most recent :meth:`install` replaced.
+
+		:raises RuntimeError: if this flag is not installed.
+		"""
+		if _requests._flag is not self or not self._previous:
+			raise RuntimeError('SharedFlag is not installed')
+		_requests._set_flag(self._previous.pop())
+
+	def close(self) -> None:
+		"""Release the shared memory.
+
+		Only the process that created the flag removes its backing file, which
+		it also does when the flag is garbage collected or the interpreter exits
+		if :meth:`close` was never called. The flag must not be installed.
+		"""
+		self._mmap.close()
+		if self._path is not None and self._owner is not None:
+			_unlink(self._path, self._owner)
+
+
+def _directory() -> typing.Optional[str]:
+	"""Return where to create the backing file, or None for the default.
+
+	On Linux, /dev/shm keeps the file in memory, so the flag never touches disk.
+	"""
+	if sys.platform.startswith('linux') and os.path.isdir('/dev/shm'):
+		return '/dev/shm'
+	return None
+
+
+def _unlink(path: str, owner: int) -> None:
+	"""Remove ``path`` if this is the ``owner`` process, e.g., not a fork."""
+	if owner != os.getpid():
+		return
+	try:
+		os.unlink(path)
+	except FileNotFoundError:
+		pass
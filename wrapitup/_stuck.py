@@ -0,0 +1,235 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the stuck listener detector."""
+
+import logging
+import os
+import sys
+import threading
+from time import monotonic
+import traceback
+import typing
+
+from wrapitup import _requests
+from wrapitup._latency import _observer, _WRAPPERS
+
+
+__all__ = ['StuckListenerDetector']
+
+_LOG = logging.getLogger(__package__)
+
+
+class StuckListenerDetector:
+	"""Find threads that never check whether a shut down was requested.
+
+	While installed with :meth:`install`, the detector notes which threads
+	observe each request to shut down, through :func:`requested`,
+	:meth:`Timer.remaining`, :meth:`Timer.expired`, :func:`sleep`, or
+	:meth:`Timer.wait`. If a request lasts ``grace`` seconds, the detector
+	writes the stack of every thread that has not observed it to ``file``, and
+	logs at the :const:`logging.WARNING` level, to the logger whose name is
+	this module's :const:`__package__`, how many there were. The stacks show
+	where to add a check for a shut down.
+
+	.. code-block:: python
+
+		detector = wrapitup.StuckListenerDetector(grace=10, file='stuck.txt')
+		detector.install()
+		with wrapitup.catch_signals():
+			run_workers()
+
+	Daemon threads, which usually are not listeners, are ignored unless
+	``include_daemon`` is true. Observations through a :class:`Token` other
+	than the module-level request API are not noticed, so threads listening
+	only through such tokens are reported as stuck.
+
+	The detector wraps whichever flag backs the request API, like
+	:class:`LatencyRecorder` does, so it costs nothing until a shut down is
+	requested.
+
+	:param float grace: Seconds a request may last before threads that have not
+		observed it count as stuck.
+	:param file: Path of a file to append the stacks to, or a text file object.
+		The default, used if the argument is :const:`None`, is
+		:data:`sys.stderr`.
+	:param bool include_daemon: Whether to check daemon threads, too.
+	:raises ValueError: if ``grace`` is negative.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		grace: float = 5.0,
+		file: typing.Union[str, typing.TextIO, None] = None,
+		include_daemon: bool = False,
+	):
+		if grace < 0:
+			raise ValueError('grace must not be negative: %r' % (grace,))
+		self._grace = grace
+		self._file = file
+		self._include_daemon = include_daemon
+		self._cond = threading.Condition()
+		self._flag = None  # type: typing.Any
+		self._installed = False
+		self._observed = set()  # type: typing.Set[int]
+		# Incremented on each new request, reset, and uninstall.
+		self._generation = 0
+		self._request_time = None  # type: typing.Optional[float]
+		self._thread = None  # type: typing.Optional[threading.Thread]
+
+	def install(self) -> None:
+		"""Start watching for stuck listeners.
+
+		:raises RuntimeError: if already installed.
+		"""
+		if self._installed:
+			raise RuntimeError('StuckListenerDetector is already installed')
+		self._flag = _requests._flag
+		self._installed = True
+		self._thread = threading.Thread(
+			target=self._run, name='wrapitup.StuckListenerDetector', daemon=True)
+		self._thread.start()
+		_requests._set_flag(self)
+
+	def uninstall(self) -> None:
+		"""Stop watching for stuck listeners.
+
+		:raises RuntimeError: if not installed, or if another flag, such as a
+			:class:`SharedFlag`, was installed after this detector and is still
+			installed.
+		"""
+		if not self._installed or _requests._flag is not self:
+			raise RuntimeError('StuckListenerDetector is not installed')
+		_requests._set_flag(self._flag)
+		# Keep the wrapped flag: other threads may still be calling this one.
+		with self._cond:
+			self._installed = False
+			self._generation += 1
+			self._cond.notify_all()
+		assert self._thread is not None
+		self._thread.join()
+		self._thread = None
+
+	def stuck(self) -> typing.List[threading.Thread]:
+		"""Return the threads that have not observed the current request.
+
+		Return an empty list if no shut down is requested.
+		"""
+		if not self._installed or not self._flag.is_set():
+			return []
+		with self._cond:
+			observed = set(self._observed)
+		me = threading.current_thread()
+		return [
+			thread for thread in threading.enumerate()
+			if thread.ident not in observed
+			if thread is not self._thread and thread is not me
+			if self._include_daemon or not thread.daemon]
+
+	def dump(self, file: typing.Union[str, typing.TextIO, None] = None) -> int:
+		"""Write the stacks of the threads that :meth:`stuck` returns.
+
+		:param file: Same as for :class:`StuckListenerDetector`. The default,
+			used if the argument is :const:`None`, is the file the detector was
+			constructed with.
+		:return: How many threads' stacks were written.
+		"""
+		threads = self.stuck()
+		if not threads:
+			return 0
+		frames = sys._current_frames()
+		request_time = self._request_time
+		elapsed = 0.0 if request_time is None else monotonic() - request_time
+		lines = [
+			'Shut down requested %.3f seconds ago in process %d; %d threads have '
+			'not checked for it:\n' % (elapsed, os.getpid(), len(threads))]
+		for thread in threads:
+			frame = frames.get(thread.ident)  # type: ignore
+			lines.append('\nThread %r (ident %s):\n' % (thread.name, thread.ident))
+			if frame is not None:  # pragma: no branch
+				lines.extend(traceback.format_stack(frame))
+		text = ''.join(lines)
+		file = self._file if file is None else file
+		if file is None:
+			sys.stderr.write(text)
+		elif isinstance(file, str):
+			with open(file, 'a') as f:
+				f.write(text)
+		else:
+			file.write(text)
+		return len(threads)
+
+	def _run(self) -> None:
+		with self._cond:
+			generation = self._generation
+			while True:
+				while self._generation == generation:
+					self._cond.wait()
+				generation = self._generation
+				if not self._installed:
+					return
+				if self._request_time is None:
+					continue
+				deadline = self._request_time + self._grace
+				while self._generation == generation:
+					remaining = deadline - monotonic()
+					if remaining <= 0:
+						break
+					self._cond.wait(min(remaining, threading.TIMEOUT_MAX))
+				if self._generation != generation:
+					continue  # Reset, uninstalled, or requested again.
+				self._cond.release()
+				try:
+					count = self.dump()
+				finally:
+					self._cond.acquire()
+				if count:
+					_LOG.warning(
+						'%d threads did not observe the request to shut down within '
+						'%g seconds. (Process %d.)', count, self._grace, os.getpid())
+
+	def _observe(self) -> None:
+		ident = threading.get_ident()
+		if ident not in self._observed:
+			with self._cond:
+				self._observed.add(ident)
+
+	# threading.Event's interface, wrapping the flag this detector replaced.
+
+	def set(self) -> None:
+		"""Set the wrapped flag, starting the grace period if the request is new."""
+		with self._cond:
+			if not self._flag.is_set():
+				self._observed = set()
+				self._request_time = monotonic()
+				self._generation += 1
+				self._cond.notify_all()
+		self._flag.set()
+
+	def clear(self) -> None:
+		"""Clear the wrapped flag, ending the grace period."""
+		with self._cond:
+			if self._flag.is_set():
+				self._request_time = None
+				self._generation += 1
+				self._cond.notify_all()
+		self._flag.clear()
+
+	def is_set(self) -> bool:
+		"""Return whether the wrapped flag is set, noting who observed it."""
+		if not self._flag.is_set():
+			return False
+		if _observer(sys._getframe(1)) is not None:
+			self._observe()
+		return True
+
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block on the wrapped flag, noting who observed it."""
+		if self._flag.wait(timeout):
+			self._observe()
+			return True
+		return False
+
+
+_WRAPPERS.add(StuckListenerDetector.is_set.__code__)
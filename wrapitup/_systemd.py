@@ -0,0 +1,272 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the systemd notifier."""
+
+import math
+import os
+import socket
+import threading
+from time import monotonic
+from types import TracebackType
+import typing
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+from wrapitup._timer import Timer
+
+
+__all__ = ['SystemdNotifier']
+
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+# Seconds between the messages that extend_timeout keeps sending.
+_EXTEND_INTERVAL = 1.0
+
+
+class SystemdNotifier:
+	"""Tell systemd when the service is ready, alive, and stopping.
+
+	For services with ``Type=notify`` in their unit files, the notifier sends
+	messages to the socket named by the :envvar:`NOTIFY_SOCKET` environment
+	variable, as :manpage:`sd_notify(3)` does. Inside a :keyword:`with` block,
+	it
+
+	* sends ``READY=1`` on entrance, unless ``ready`` is false, in which case
+		call :meth:`notify` with ``'READY=1'`` yourself;
+	* sends ``STOPPING=1`` as soon as a shut down is requested, e.g., by a
+		signal that :func:`catch_signals` caught, together with
+		``EXTEND_TIMEOUT_USEC`` if ``stop_timeout`` is given; and
+	* if the unit sets ``WatchdogSec``, sends ``WATCHDOG=1`` from a background
+		thread twice per watchdog interval, including while draining; and
+	* once :meth:`extend_timeout` is called with the drain's :class:`Timer`,
+		sends ``EXTEND_TIMEOUT_USEC`` with the time remaining on it from the
+		same thread until it expires.
+
+	Thus systemd waits for the drain instead of killing the service when
+	``TimeoutStopSec`` runs out. To ask for time before the drain's timer
+	exists, pass the time draining may take as ``stop_timeout``.
+
+	.. code-block:: python
+
+		with wrapitup.SystemdNotifier(stop_timeout=5) as notifier:
+			with wrapitup.catch_signals():
+				serve()
+			timer = wrapitup.Timer(120, listen=False)
+			notifier.extend_timeout(timer)
+			drain(timer)
+
+	Without :envvar:`NOTIFY_SOCKET`, e.g., when not run by systemd, the
+	notifier does nothing. Failures to send are ignored, as by
+	:manpage:`sd_notify(3)`, because messages may be sent from signal handlers.
+
+	Availability: Unix.
+
+	:param bool ready: Whether to send ``READY=1`` on entrance to the
+		:keyword:`with` block.
+	:param token: The :class:`Token` whose requests to shut down send
+		``STOPPING=1``. The default, used if the argument is :const:`None`, is
+		the root of the tree, which :func:`request` reaches.
+	:param stop_timeout: Seconds to ask systemd to wait for the service to stop
+		once a shut down is requested, or :const:`None` not to ask.
+	:raises ValueError: if ``stop_timeout`` is negative or not a number.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		*,
+		ready: bool = True,
+		token: typing.Optional[Token] = None,
+		stop_timeout: typing.Optional[float] = None
+	):
+		if stop_timeout is not None and not stop_timeout >= 0:
+			raise ValueError(
+				'stop_timeout must be a non-negative number: %r' % (stop_timeout,))
+		self._ready = ready
+		self._token = _requests._root if token is None else token
+		self._stop_timeout = stop_timeout
+		self._address = _address(os.environ.get('NOTIFY_SOCKET', ''))
+		# Open only inside the with block, so that it is always closed.
+		self._socket = None  # type: typing.Optional[socket.socket]
+		self._interval = _watchdog_interval(
+			os.environ.get('WATCHDOG_USEC', ''), os.environ.get('WATCHDOG_PID'))
+		self._entered = False
+		self._closed = threading.Event()
+		# Guards starting and stopping the background thread.
+		self._lock = threading.Lock()
+		self._thread = None  # type: typing.Optional[threading.Thread]
+		# The timer whose remaining time the background thread sends, and when
+		# to send it next. Sent only under _lock, so that messages about one
+		# timer arrive in order.
+		self._extending = None  # type: typing.Optional[Timer]
+		self._extend_due = 0.0
+
+	@property
+	def enabled(self) -> bool:
+		"""Whether :envvar:`NOTIFY_SOCKET` named a socket to notify."""
+		return self._address is not None
+
+	@property
+	def watchdog_interval(self) -> typing.Optional[float]:
+		"""Seconds between ``WATCHDOG=1`` messages, or :const:`None` if none."""
+		return self._interval if self.enabled else None
+
+	def notify(self, *assignments: str) -> bool:
+		"""Send ``assignments``, such as ``'STATUS=Draining'``, in one message.
+
+		Safe to call from a signal handler. Sends nothing outside the
+		:keyword:`with` block.
+
+		:return: Whether the message was sent.
+		"""
+		sock, address = self._socket, self._address
+		if sock is None or address is None:
+			return False
+		try:
+			sock.sendto('\n'.join(assignments).encode(), address)
+		except OSError:
+			return False
+		return True
+
+	def extend_timeout(self, timer: Timer) -> bool:
+		"""Keep asking systemd to wait for the time remaining on ``timer``.
+
+		Send ``EXTEND_TIMEOUT_USEC`` with :meth:`Timer.remaining`, rounded up
+		to the microsecond. systemd then waits at least that long before
+		killing the service, even if its start or stop timeout runs out sooner.
+		Until ``timer`` expires or the :keyword:`with` block exits, a background
+		thread sends the time remaining again every second, so that systemd
+		follows the timer if it is restarted. Calling it again with another
+		timer follows that timer instead. Does nothing if ``timer`` never
+		expires.
+
+		:return: Whether the first message was sent.
+		"""
+		with self._lock:
+			assignment = _extend_timeout(timer.remaining())
+			if assignment is None:
+				return False
+			self._extending = timer
+			self._extend_due = monotonic() + _EXTEND_INTERVAL
+			sent = self.notify(assignment)
+		self._start()
+		return sent
+
+	def __enter__(self) -> 'SystemdNotifier':
+		"""Start notifying and return the notifier itself.
+
+		:raises RuntimeError: if the notifier is already in use or closed.
+		"""
+		if self._entered or self._closed.is_set():
+			raise RuntimeError('SystemdNotifier is not reusable')
+		self._entered = True
+		if self.enabled:
+			self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+		if self._interval is not None:
+			self._start()
+		if self._ready:
+			self.notify('READY=1')
+		if self._token._add_callback(self._on_request):
+			self._on_request()
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Stop notifying, and close the socket."""
+		self._token._remove_callback(self._on_request)
+		with self._lock:
+			self._closed.set()
+			thread = self._thread
+		if thread is not None:
+			thread.join()
+		if self._socket is not None:
+			self._socket.close()
+			self._socket = None
+
+	def _on_request(self) -> None:
+		assignment = None  # type: typing.Optional[str]
+		if self._stop_timeout is not None:
+			assignment = _extend_timeout(self._stop_timeout)
+		if assignment is None:
+			self.notify('STOPPING=1')
+		else:
+			self.notify('STOPPING=1', assignment)
+
+	def _start(self) -> None:
+		"""Start the background thread inside the block, unless it is running."""
+		with self._lock:
+			if self._socket is None or self._closed.is_set():
+				return
+			if self._thread is None:
+				self._thread = threading.Thread(
+					target=self._run, name='wrapitup.SystemdNotifier', daemon=True)
+				self._thread.start()
+
+	def _run(self) -> None:
+		interval = self._interval
+		while True:
+			wait = _EXTEND_INTERVAL if interval is None else interval
+			with self._lock:
+				assignments = []  # type: typing.List[str]
+				if interval is not None:
+					assignments.append('WATCHDOG=1')
+				timer = self._extending
+				if timer is not None:
+					due = self._extend_due - monotonic()
+					remaining = timer.remaining()
+					if remaining <= 0:
+						self._extending = None  # The timer expired.
+					elif due <= 0:
+						extension = _extend_timeout(remaining)
+						assert extension is not None  # extend_timeout checked.
+						assignments.append(extension)
+						self._extend_due = monotonic() + _EXTEND_INTERVAL
+						wait = min(wait, _EXTEND_INTERVAL)
+					else:
+						wait = min(wait, due)
+				if assignments:
+					self.notify(*assignments)
+				if interval is None and self._extending is None:
+					self._thread = None
+					return
+			if self._closed.wait(wait):
+				return
+
+
+def _address(notify_socket: str) -> typing.Optional[str]:
+	"""Return the address to send to, or None if there is none."""
+	if not notify_socket or not hasattr(socket, 'AF_UNIX'):
+		return None
+	if notify_socket.startswith('@'):
+		return '\0' + notify_socket[1:]  # Linux's abstract namespace.
+	if not notify_socket.startswith('/'):
+		return None  # E.g., vsock:, which this notifier does not support.
+	return notify_socket
+
+
+def _extend_timeout(seconds: float) -> typing.Optional[str]:
+	"""Return the assignment to extend the timeout, or None if it's infinite."""
+	seconds = max(seconds, 0.0)
+	if math.isinf(seconds):
+		return None
+	return 'EXTEND_TIMEOUT_USEC=%d' % math.ceil(seconds * 1000000)
+
+
+def _watchdog_interval(
+	usec: str,
+	pid: typing.Optional[str],
+) -> typing.Optional[float]:
+	"""Return the seconds between watchdog pings, or None for no watchdog."""
+	if pid is not None and pid != str(os.getpid()):
+		return None  # The watchdog is for another process.
+	try:
+		microseconds = int(usec)
+	except ValueError:
+		return None
+	if microseconds <= 0:
+		return None
+	return microseconds / 2000000
@@ -5,17 +5,74 @@
 
 from math import isnan
 import signal
+import threading
 from time import monotonic
 import typing
 
-from wrapitup._requests import requested
+from wrapitup import _requests
+from wrapitup._requests import requested, Token
 
 
 __all__ = ['Timer']
 
+# Never set. Timers that don't listen for requests wait on it.
+_never = threading.Event()
+
+
+def _never_requested() -> bool:
+	return False
+
+
+def _listener(
+	token: typing.Optional[Token],
+	listen: bool,
+) -> typing.Tuple[typing.Optional[Token], typing.Callable[[], bool]]:
+	"""Return the token given, if any, and the function to check for requests.
+
+	The root token is not returned, so that timers listening to it can be
+	pickled; :func:`_listened` finds it.
+	"""
+	if not listen:
+		if token is not None:
+			raise ValueError('Timers that do not listen cannot take a token')
+		return None, _never_requested
+	elif token is None:
+		return None, requested
+	elif isinstance(token, Token):
+		return token, token.requested
+	raise TypeError('token must be a Token: %r' % (token,))
+
+
+def _listened(
+	token: typing.Optional[Token],
+	requested: typing.Callable[[], bool],
+) -> typing.Optional[Token]:
+	"""Return the token that :func:`_listener` returned ``token`` for."""
+	if requested is _never_requested:
+		return None
+	return _requests._root if token is None else token
+
+
+def _token_of(timer: 'Timer') -> typing.Optional[Token]:
+	"""Return the token ``timer`` listens to, or None if it does not listen."""
+	return _listened(
+		timer._Timer__token, timer._Timer__requested)  # type: ignore
+
+
+def _clock_of(timer: 'Timer') -> typing.Callable[[], float]:
+	"""Return the clock ``timer`` measures time with."""
+	return timer._Timer__clock  # type: ignore
+
+
+def _check_limit(limit: float) -> None:
+	if not isinstance(limit, (float, int)):
+		raise TypeError('limit must be a number: %r' % (limit,))
+	if isnan(limit):
+		raise ValueError('limit is NaN (not a number)')
+
 
 class Timer:
-	"""Countdown timer that goes to zero while a request to shut down is active.
+	r"""Countdown timer that goes to zero while a request to shut down is active.
 
 	The timer starts with a time limit in seconds. Pass a time limit to the
 	class's constructor or :meth:`start`; in both places, the time limit
@@ -26,17 +83,83 @@ class Timer:
 	(which :func:`catch_signals` uses). However, the timer can continue as if
 	nothing happened if :func:`reset` is called.
 
+	For use in tight loops, :meth:`expired` can amortize its cost over many
+	calls. With ``poll_every`` set to *N*, only every *N*\ th call to
+	:meth:`expired` actually consults the clock and :func:`requested`; the
+	calls in between just decrement a counter and return :const:`False`. Thus
+	:meth:`expired` observes an expiration or a request to shut down at most
+	*N* - 1 calls late. Once :meth:`expired` returns :const:`True`, every
+	subsequent call consults the clock again until the timer is restarted, so
+	:func:`reset` is still honored promptly. :meth:`remaining` is never
+	amortized.
+
+	To listen for requests to shut down a narrower scope than the whole
+	process, pass a :class:`Token`. The timer then acts as though it ran into
+	its time limit when :meth:`Token.requested` returns :const:`True` rather
+	than when :func:`requested` does. To ignore requests to shut down entirely,
+	e.g., to budget the time a shut down itself may take, pass ``listen=False``.
+
+	By default the timer measures wall time with :func:`time.monotonic`. To
+	budget work instead, pass another ``clock``, such as
+	:func:`time.process_time` for the process's CPU time or
+	:func:`time.thread_time` for the calling thread's. A timer using
+	:func:`time.thread_time` must be started, checked, and stopped in one
+	thread. :meth:`wait`, :meth:`alarm`, and :class:`Scheduler` wait in wall
+	time, so with another clock they treat each second :meth:`remaining`
+	returns as a second of wall time.
+
 	:param float limit: Time limit after which this timer expires, in
 		seconds.
-	:raises TypeError: if ``limit`` is not a :class:`float` or :class:`int`.
-	:raises ValueError: if ``limit`` is not a number (NaN).
+	:param int poll_every: How many calls to :meth:`expired` share a single
+		check of the clock and of :func:`requested`. The default, 1, checks on
+		every call.
+	:param token: The :class:`Token` to listen to. The default, used if the
+		argument is :const:`None`, listens to :func:`requested`.
+	:param bool listen: Whether to act as though the time limit ran out when a
+		shut down is requested.
+	:param clock: A function taking no arguments and returning a time in
+		seconds that never decreases.
+	:raises TypeError: if ``limit`` is not a :class:`float` or :class:`int`, if
+		``poll_every`` is not an :class:`int`, if ``token`` is not a
+		:class:`Token`, or if ``clock`` is not callable.
+	:raises ValueError: if ``limit`` is not a number (NaN), if ``poll_every``
+		is less than 1, or if ``token`` is given but ``listen`` is false.
 
 	.. versionchanged:: 0.2.0
 		Renamed from ``Shutter``. Constructor argument name changed from
 		``timeout``.
+
+	.. versionadded:: 0.4.0
+		The *poll_every*, *token*, *listen*, and *clock* parameters.
+
+	.. versionchanged:: 0.4.0
+		Instances have no :attr:`~object.__dict__`, to save memory. Store
+		timers for many jobs in a :class:`TimerArray` to save more.
 	"""
 
-	def __init__(self, limit: float = float('inf')):
+	__slots__ = (
+		'__poll_every', '__token', '__requested', '__start_time', '__limit',
+		'__running_time', '__shutdown_requested', '__countdown', '__clock',
+		'__weakref__')
+
+	def __init__(
+		self,
+		limit: float = float('inf'),
+		*,
+		poll_every: int = 1,
+		token: typing.Optional[Token] = None,
+		listen: bool = True,
+		clock: typing.Callable[[], float] = monotonic
+	):
+		if not callable(clock):
+			raise TypeError('clock must be callable: %r' % (clock,))
+		self.__clock = clock
+		if not isinstance(poll_every, int) or isinstance(poll_every, bool):
+			raise TypeError('poll_every must be an integer: %r' % (poll_every,))
+		if poll_every < 1:
+			raise ValueError('poll_every must be at least 1: %d' % poll_every)
+		self.__poll_every = poll_every
+		self.__token, self.__requested = _listener(token, listen)
 		self.start(limit)
 
 	def start(self, limit: float = float('inf')) -> None:
@@ -51,14 +174,14 @@ class Timer:
 			Renamed from ``start_timer``, and argument name changed from
 			``timeout``.
 		"""
-		self.__start_time = monotonic()
-		if not isinstance(limit, (float, int)):
-			raise TypeError('limit must be a number: %r' % (limit,))
-		if isnan(limit):
-			raise ValueError('limit is NaN (not a number)')
+		self.__start_time = self.__clock()
+		_check_limit(limit)
 		self.__limit = float('inf') if limit is None else limit
 		self.__running_time = None  # type: typing.Optional[float]
 		self.__shutdown_requested = False
+		# Calls to expired left before the next real check. Starting at 1 means
+		# the first call always checks.
+		self.__countdown = 1
 
 	def stop(self) -> float:
 		"""Stop and return elapsed time.
@@ -71,7 +194,8 @@ class Timer:
 			Renamed from ``stop_timer``.
 		"""
 		if self.__running_time is None:
-			self.__running_time = monotonic() - self.__start_time
+			self.__running_time = self.__clock() - self.__start_time
+			self.__countdown = 0
 		return self.__running_time
 
 	def remaining(self) -> float:
@@ -85,10 +209,10 @@ class Timer:
 			Renamed from ``time_left``.
 		"""
 		if self.__running_time is None:
-			if requested():
+			if self.__requested():
 				self.__shutdown_requested = True
 				return 0.0
-			return self.__limit - monotonic() + self.__start_time
+			return self.__limit - self.__clock() + self.__start_time
 		return 0.0
 
 	def expired(self) -> bool:
@@ -104,13 +228,51 @@ class Timer:
 				if the total running time exceeded the time limit. This *cannot*
 				change if :func:`reset` is called later.
 
+			If the timer was constructed with ``poll_every`` greater than 1,
+			calls that skip the check return :const:`False`.
+
 		.. versionchanged:: 0.2.0
 			Renamed from ``timedout``.
 		"""
+		if self.__countdown > 1:
+			self.__countdown -= 1
+			return False
 		if self.__running_time is None:
-			return self.remaining() <= 0.0
+			if self.remaining() <= 0.0:
+				return True
+			self.__countdown = self.__poll_every
+			return False
 		return self.__shutdown_requested or self.__running_time > self.__limit
 
+	def wait(self, timeout: typing.Optional[float] = None) -> bool:
+		"""Block until the timer expires or ``timeout`` seconds pass.
+
+		Waiting uses no CPU, but returns as soon as :func:`request` is called,
+		because that makes the timer expire.
+
+		:param timeout: Maximum time to wait, in seconds. The default,
+			:const:`None`, waits as long as it takes for the timer to expire.
+		:return: Whether the timer expired, in the same sense as :meth:`expired`.
+			If :meth:`stop` was already called, return immediately.
+
+		.. versionadded:: 0.4.0
+		"""
+		if self.__running_time is not None:
+			return self.expired()
+		deadline = float('inf') if timeout is None else monotonic() + timeout
+		while True:
+			remaining = self.remaining()
+			if remaining <= 0.0:
+				# Make the next call to expired check rather than count down.
+				self.__countdown = 1
+				return True
+			wait_for = min(remaining, deadline - monotonic())
+			if wait_for <= 0.0:
+				return False
+			token = _listened(self.__token, self.__requested)
+			flag = _never if token is None else token._flag
+			flag.wait(min(wait_for, threading.TIMEOUT_MAX))
+
 	if hasattr(signal, "setitimer"):  # pragma: no branch
 		def alarm(self) -> typing.Tuple[float, float]:
 			"""Send the :const:`signal.SIGALRM` signal when the time limit expires.
@@ -143,3 +305,15 @@ class Timer:
 				raise ValueError(
 					'Time limit has expired: time remaining is %f' % self.remaining())
 			return seconds, interval
+
+
+def _budget(limit: typing.Union[Timer, float, None]) -> Timer:
+	"""Return ``limit`` if it is a :class:`Timer`, or else a timer for it.
+
+	A timer made from seconds, or from :const:`None` for no limit, does not
+	listen for requests to shut down, because it budgets time for a shut down
+	that a request already began.
+	"""
+	if isinstance(limit, Timer):
+		return limit
+	return Timer(float('inf') if limit is None else limit, listen=False)
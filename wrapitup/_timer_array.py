@@ -0,0 +1,223 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the timer array API."""
+
+from array import array
+import importlib
+from math import isnan
+from time import monotonic
+import typing
+
+from wrapitup._requests import Token
+from wrapitup._timer import _check_limit, _listener
+
+# Imported by name so that mypy passes whether or not NumPy is installed.
+try:
+	numpy = importlib.import_module('numpy')  # type: typing.Any
+except ImportError:  # pragma: no cover
+	numpy = None
+
+
+__all__ = ['TimerArray']
+
+_NAN = float('nan')
+_Indices = typing.Optional[typing.Iterable[int]]
+
+
+class TimerArray:
+	r"""Compact collection of countdown timers queried all at once.
+
+	A :class:`TimerArray` behaves like a list of :class:`Timer`\ s, each
+	identified by its index, but stores only each timer's start time, time
+	limit, and running time, in :class:`array.array` columns, for about 25
+	bytes per timer. Its methods act on every timer at once, or on just the
+	timers whose indices are in ``indices``, and return one result per timer
+	selected, in order.
+
+	.. code-block:: python
+
+		timers = wrapitup.TimerArray(job.limit for job in jobs)
+		while not all(done):
+			for index in numpy.flatnonzero(timers.expired()):
+				...
+
+	If `NumPy <https://numpy.org>`_ is installed, the methods compute with it,
+	``indices`` may also be any NumPy index, such as a boolean mask, and results
+	are :class:`numpy.ndarray`\ s. Otherwise results are :class:`array.array`\
+	s of type code ``'d'``, or, from :meth:`expired`, of type code ``'B'`` with
+	ones for :const:`True`.
+
+	As for :class:`Timer`, every timer acts as though it ran into its time limit
+	while a shut down is requested.
+
+	:param limits: The time limit, in seconds, of each timer to start with.
+	:param token: Same as for :class:`Timer`.
+	:param bool listen: Same as for :class:`Timer`.
+	:param clock: Same as for :class:`Timer`.
+	:raises TypeError: if a limit is not a :class:`float` or :class:`int`, if
+		``token`` is not a :class:`Token`, or if ``clock`` is not callable.
+	:raises ValueError: if a limit is not a number (NaN), or if ``token`` is
+		given but ``listen`` is false.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		limits: typing.Iterable[float] = (),
+		*,
+		token: typing.Optional[Token] = None,
+		listen: bool = True,
+		clock: typing.Callable[[], float] = monotonic
+	):
+		if not callable(clock):
+			raise TypeError('clock must be callable: %r' % (clock,))
+		self._clock = clock
+		_, self._requested = _listener(token, listen)
+		self._start_times = array('d')
+		self._limits = array('d')
+		# NaN while running.
+		self._running_times = array('d')
+		# Whether a shut down was requested when each timer stopped.
+		self._stop_requested = array('B')
+		self.extend(limits)
+
+	def __len__(self) -> int:
+		"""Return the number of timers."""
+		return len(self._limits)
+
+	def append(self, limit: float = float('inf')) -> int:
+		"""Start a new timer with time limit ``limit`` and return its index."""
+		self.extend((limit,))
+		return len(self) - 1
+
+	def extend(self, limits: typing.Iterable[float]) -> range:
+		"""Start a new timer for each time limit and return their indices."""
+		limits = array('d', _checked(limits))
+		first = len(self)
+		self._start_times.extend(array('d', [self._clock()]) * len(limits))
+		self._limits.extend(limits)
+		self._running_times.extend(array('d', [_NAN]) * len(limits))
+		self._stop_requested.extend(array('B', [0]) * len(limits))
+		return range(first, len(self))
+
+	def start(
+		self, indices: _Indices = None, limit: float = float('inf')
+	) -> None:
+		"""(Re)start the timers, replacing their time limits with ``limit``."""
+		_check_limit(limit)
+		now = self._clock()
+		if numpy is not None and len(self):
+			selected = self._select(indices)
+			start_times, limits, running_times, stop_requested = self._columns()
+			start_times[selected] = now
+			limits[selected] = limit
+			running_times[selected] = _NAN
+			stop_requested[selected] = 0
+			return
+		for i in self._select(indices):
+			self._start_times[i] = now
+			self._limits[i] = limit
+			self._running_times[i] = _NAN
+			self._stop_requested[i] = 0
+
+	def stop(self, indices: _Indices = None) -> typing.Sequence[float]:
+		"""Stop the timers & return their running times, like :meth:`Timer.stop`."""
+		now = self._clock()
+		requested = self._requested()
+		if numpy is not None and len(self):
+			selected = self._select(indices)
+			start_times, _, running_times, stop_requested = self._columns()
+			# Copy so that the result is not a view of the column.
+			running = numpy.array(running_times[selected])
+			newly = numpy.isnan(running)
+			running[newly] = now - start_times[selected][newly]
+			running_times[selected] = running
+			if requested:
+				stop_requested[numpy.arange(len(self))[selected][newly]] = 1
+			return typing.cast(typing.Sequence[float], running)
+		result = array('d')
+		for i in self._select(indices):
+			if isnan(self._running_times[i]):
+				self._running_times[i] = now - self._start_times[i]
+				self._stop_requested[i] = requested
+			result.append(self._running_times[i])
+		return result
+
+	def remaining(self, indices: _Indices = None) -> typing.Sequence[float]:
+		"""Return the timers' time remaining, like :meth:`Timer.remaining`."""
+		now = self._clock()
+		requested = self._requested()
+		if numpy is not None and len(self):
+			selected = self._select(indices)
+			start_times, limits, running_times, _ = self._columns()
+			remaining = limits[selected] - (now - start_times[selected])
+			if requested:
+				remaining[:] = 0.0
+			remaining[~numpy.isnan(running_times[selected])] = 0.0
+			return typing.cast(typing.Sequence[float], remaining)
+		result = array('d')
+		for i in self._select(indices):
+			if requested or not isnan(self._running_times[i]):
+				result.append(0.0)
+			else:
+				result.append(self._limits[i] - now + self._start_times[i])
+		return result
+
+	def expired(self, indices: _Indices = None) -> typing.Sequence[bool]:
+		"""Return whether each timer expired, like :meth:`Timer.expired`."""
+		now = self._clock()
+		requested = self._requested()
+		if numpy is not None and len(self):
+			selected = self._select(indices)
+			start_times, limits, running_times, stop_requested = self._columns()
+			limits = limits[selected]
+			running = running_times[selected]
+			stopped = ~numpy.isnan(running)
+			# NaN compares false, so running timers are not expired here.
+			expired = (stop_requested[selected] != 0) | (running > limits)
+			if requested:
+				expired[~stopped] = True
+			else:
+				expired[~stopped] = (
+					now - start_times[selected][~stopped] >= limits[~stopped])
+			return typing.cast(typing.Sequence[bool], expired)
+		result = array('B')
+		for i in self._select(indices):
+			running_time = self._running_times[i]
+			if isnan(running_time):
+				result.append(
+					requested or now - self._start_times[i] >= self._limits[i])
+			else:
+				result.append(
+					self._stop_requested[i] or running_time > self._limits[i])
+		return typing.cast(typing.Sequence[bool], result)
+
+	def _select(self, indices: _Indices) -> typing.Any:
+		"""Return what to index the columns with to select ``indices``."""
+		if numpy is not None and len(self):
+			if indices is None:
+				return slice(None)
+			if isinstance(indices, numpy.ndarray):
+				return indices
+			return numpy.fromiter(indices, numpy.intp)
+		if indices is None:
+			return range(len(self))
+		return indices
+
+	def _columns(self) -> typing.Tuple[typing.Any, ...]:
+		"""Return NumPy views of the columns, which must not be empty.
+
+		Arrays cannot grow while viewed, so don't keep the views.
+		"""
+		return (
+			numpy.frombuffer(self._start_times),
+			numpy.frombuffer(self._limits),
+			numpy.frombuffer(self._running_times),
+			numpy.frombuffer(self._stop_requested, numpy.uint8))
+
+
+def _checked(limits: typing.Iterable[float]) -> typing.Iterator[float]:
+	for limit in limits:
+		_check_limit(limit)
+		yield limit
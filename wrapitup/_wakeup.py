@@ -0,0 +1,145 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the wakeup file descriptor API."""
+
+import os
+import socket
+from types import TracebackType
+import typing
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+
+
+__all__ = ['WakeupFD']
+
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+
+
+class WakeupFD:
+	"""File descriptor that becomes readable when a shut down is requested.
+
+	Event loops built on :mod:`selectors`, :mod:`select`, or epoll can't call
+	:func:`requested` while they block waiting for I/O. Register a
+	:class:`WakeupFD` with the loop instead: as soon as :func:`request` is
+	called, from any thread or from a signal handler that
+	:func:`catch_signals` installed, the descriptor becomes readable and the
+	loop wakes up.
+
+	.. code-block:: python
+
+		with wrapitup.WakeupFD() as wakeup:
+			selector.register(wakeup, selectors.EVENT_READ)
+			while not wrapitup.requested():
+				for key, events in selector.select():
+					...
+
+	The descriptor stays readable until :meth:`drain` is called, even if
+	:func:`reset` is called first. If a shut down was already requested when the
+	:class:`WakeupFD` was created, it starts out readable.
+
+	On Linux with Python 3.10 or later, the descriptor is an eventfd. On other
+	Unix systems it is the read end of a pipe, and on Windows, where
+	:func:`select.select` accepts only sockets, one end of a socket pair.
+
+	.. note::
+
+		If a :class:`SharedFlag` is installed, only requests made in this
+		process make the descriptor readable.
+
+	:class:`WakeupFD` instances are context managers that :meth:`close`
+	themselves on exit.
+
+	:param token: The :class:`Token` whose requests to listen for. The
+		default, used if the argument is :const:`None`, listens for
+		:func:`request`.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(self, token: typing.Optional[Token] = None):
+		self._token = _requests._root if token is None else token
+		self._sockets = None  # type: typing.Optional[typing.Sequence[socket.socket]]
+		self._eventfd = hasattr(os, 'eventfd')
+		if self._eventfd:
+			self._read_fd = self._write_fd = os.eventfd(
+				0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+		elif os.name == 'posix':
+			self._read_fd, self._write_fd = os.pipe()
+			os.set_blocking(self._read_fd, False)
+			os.set_blocking(self._write_fd, False)
+		elif os.name == 'nt':
+			self._sockets = socket.socketpair()
+			for sock in self._sockets:
+				sock.setblocking(False)
+			self._read_fd = self._sockets[0].fileno()
+			self._write_fd = self._sockets[1].fileno()
+		else:
+			raise NotImplementedError('unsupported operating system: %s' % os.name)
+		self._closed = False
+		if self._token._add_callback(self._notify):
+			self._notify()
+
+	def fileno(self) -> int:
+		"""Return the descriptor to register with the event loop."""
+		return self._read_fd
+
+	def drain(self) -> None:
+		"""Consume all pending notifications so the descriptor is not readable."""
+		try:
+			if self._eventfd:
+				os.eventfd_read(self._read_fd)
+				return
+			while True:
+				if self._sockets is not None:
+					data = self._sockets[0].recv(4096)
+				else:
+					data = os.read(self._read_fd, 4096)
+				if not data:  # pragma: no cover
+					return
+		except (BlockingIOError, InterruptedError):
+			pass
+
+	def close(self) -> None:
+		"""Stop listening and close the descriptors. Closing is idempotent."""
+		# Hold the lock that request() holds while it runs callbacks, so that
+		# _notify never writes to a descriptor number that was closed and reused.
+		with _requests._lock:
+			if self._closed:
+				return
+			self._closed = True
+			self._token._remove_callback(self._notify)
+			if self._sockets is not None:
+				for sock in self._sockets:
+					sock.close()
+			else:
+				os.close(self._read_fd)
+				if not self._eventfd:
+					os.close(self._write_fd)
+
+	def __enter__(self) -> 'WakeupFD':
+		"""Return the :class:`WakeupFD` itself."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Call :meth:`close`."""
+		self.close()
+
+	def _notify(self) -> None:
+		"""Make the descriptor readable. Safe to call from a signal handler."""
+		try:
+			if self._sockets is not None:
+				self._sockets[1].send(b'\0')
+			elif self._eventfd:
+				os.eventfd_write(self._write_fd, 1)
+			else:
+				os.write(self._write_fd, b'\0')
+		except (BlockingIOError, InterruptedError):
+			pass  # Already readable; the buffer is full.
+		except OSError:  # pragma: no cover
+			pass  # Closed by another thread.
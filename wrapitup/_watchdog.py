@@ -0,0 +1,163 @@
+# © 2018, William Schwartz. All rights reserved. See the LICENSE file.
+
+"""Implement the resource watchdog API."""
+
+import logging
+import os
+import threading
+from types import TracebackType
+import typing
+
+from wrapitup import _requests
+from wrapitup._requests import Token
+
+
+__all__ = ['ResourceWatchdog']
+
+_LOG = logging.getLogger(__package__)
+_ExcType = typing.TypeVar('_ExcType', bound=BaseException)
+# Resource name, sampling function, and limit.
+_Limit = typing.Tuple[str, typing.Callable[[], typing.Any], typing.Any]
+
+
+def _rss() -> typing.Optional[int]:
+	"""Return the resident set size in bytes, or None if unavailable."""
+	try:
+		with open('/proc/self/statm', 'rb') as statm:
+			pages = int(statm.read().split()[1])
+	except (OSError, IndexError, ValueError):
+		return None
+	return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def _open_fds() -> typing.Optional[int]:
+	"""Return how many file descriptors are open, or None if unavailable."""
+	for path in ('/proc/self/fd', '/dev/fd'):
+		try:
+			# Listing the directory opens one more descriptor.
+			return len(os.listdir(path)) - 1
+		except OSError:
+			pass
+	return None
+
+
+def _load() -> typing.Optional[float]:
+	"""Return the one-minute load average, or None if unavailable."""
+	try:
+		return os.getloadavg()[0]
+	except (AttributeError, OSError):
+		return None
+
+
+class ResourceWatchdog:
+	"""Request a shut down when the process runs short of resources.
+
+	A background thread samples the resources for which you set limits every
+	``interval`` seconds. When a sample exceeds its limit, the watchdog logs
+	which resource ran short at the :const:`logging.WARNING` level, to the
+	logger whose name is this module's :const:`__package__`, and calls
+	:func:`request`. Thus listeners already checking :meth:`Timer.expired` stop
+	gracefully before, say, the kernel kills the process for using too much
+	memory.
+
+	.. code-block:: python
+
+		with wrapitup.ResourceWatchdog(max_rss=8 * 2**30):
+			for batch in wrapitup.iterate(batches):
+				...
+
+	The watchdog does not sample while a shut down is requested, and resumes
+	if :func:`reset` is called.
+
+	:class:`ResourceWatchdog` instances are context managers that :meth:`close`
+	themselves on exit.
+
+	Availability: Linux; Unix other than Linux without ``max_rss``.
+
+	.. attribute:: reason
+
+		Why the watchdog most recently requested a shut down, or :const:`None`.
+
+	:param max_rss: Most bytes of resident memory, per
+		:file:`/proc/self/statm`, to allow.
+	:param max_fds: Most open file descriptors to allow.
+	:param max_load: Highest one-minute load average, per :func:`os.getloadavg`,
+		to allow.
+	:param float interval: Seconds between samples.
+	:param token: The :class:`Token` to request a shut down from. The default,
+		used if the argument is :const:`None`, calls :func:`request`.
+	:raises ValueError: if no limit is set, if ``interval`` is not positive, or
+		if a resource with a limit cannot be measured on this system.
+
+	.. versionadded:: 0.4.0
+	"""
+
+	def __init__(
+		self,
+		*,
+		max_rss: typing.Optional[int] = None,
+		max_fds: typing.Optional[int] = None,
+		max_load: typing.Optional[float] = None,
+		interval: float = 1.0,
+		token: typing.Optional[Token] = None
+	):
+		if not interval > 0:
+			raise ValueError('interval must be positive: %r' % (interval,))
+		self._limits = []  # type: typing.List[_Limit]
+		for name, sample, limit in (
+			('RSS bytes', _rss, max_rss),
+			('open file descriptors', _open_fds, max_fds),
+			('load average', _load, max_load),
+		):
+			if limit is None:
+				continue
+			if sample() is None:
+				raise ValueError('Cannot measure %s on this system' % name)
+			self._limits.append((name, sample, limit))
+		if not self._limits:
+			raise ValueError('No limits set')
+		self._interval = interval
+		self._token = _requests._root if token is None else token
+		self.reason = None  # type: typing.Optional[str]
+		self._closed = threading.Event()
+		self._thread = threading.Thread(
+			target=self._run, name='wrapitup.ResourceWatchdog', daemon=True)
+		self._thread.start()
+
+	def close(self) -> None:
+		"""Stop watching and wait for the thread to exit. Idempotent."""
+		self._closed.set()
+		if self._thread is not threading.current_thread():
+			self._thread.join()
+
+	def __enter__(self) -> 'ResourceWatchdog':
+		"""Return the watchdog itself."""
+		return self
+
+	def __exit__(
+		self,
+		exc_type: typing.Optional[typing.Type[_ExcType]],
+		exc_value: typing.Optional[_ExcType],
+		traceback: typing.Optional[TracebackType]
+	) -> None:
+		"""Call :meth:`close`."""
+		self.close()
+
+	def _check(self) -> typing.Optional[str]:
+		"""Return why to shut down, or None if every resource is within limits."""
+		for name, sample, limit in self._limits:
+			value = sample()
+			if value is not None and value > limit:
+				return '%s at %s exceeds limit of %s' % (name, value, limit)
+		return None
+
+	def _run(self) -> None:
+		while not self._closed.wait(self._interval):
+			if self._token.requested():
+				continue
+			reason = self._check()
+			if reason is not None:
+				self.reason = reason
+				_LOG.warning(
+					'Requesting shut down: %s. (Process %d.)', reason, os.getpid())
+				self._token.request()